@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from os import getenv, path
 from pathlib import Path
 from django.core.management.utils import get_random_secret_key
@@ -53,9 +54,15 @@ INSTALLED_APPS = [
     'django_extensions',
     'notes',
     'users',
+    'search',
+    'sync',
+    'workspace',
+    'metrics',
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the stack
+    'metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -99,11 +106,69 @@ DATABASES = {
         'PASSWORD': getenv('DATABASE_PASSWORD'),
         'HOST': getenv('DATABASE_HOST'),
         'PORT': getenv('DATABASE_PORT'),
-        'ATOMIC_REQUESTS': True
+        # Views with notes.transactions.AtomicWritesMixin only wrap writes
+        'ATOMIC_REQUESTS': True,
+        # Seconds to keep a connection open for later requests on the same
+        # thread; 0 closes it after every request
+        'CONN_MAX_AGE': int(getenv('DATABASE_CONN_MAX_AGE', '60')),
+        # Check a reused connection before its first query in a request, so
+        # a database restart costs a reconnect instead of a failed request
+        'CONN_HEALTH_CHECKS': getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 
 }
 
+# Read replicas, comma separated: HOST or HOST:PORT of servers that share the
+# primary's other settings, or database files for SQLite (a copy of the
+# primary's file stands in for a replica locally). They become the aliases
+# replica1, replica2, ... and serve list and retrieve requests; see
+# notes/replicas.py
+REPLICA_DATABASES = []
+for replica in filter(None, (entry.strip() for entry in getenv('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica{len(REPLICA_DATABASES) + 1}'
+    # Replicas only serve reads, which run outside request transactions. Under
+    # test they mirror the primary rather than getting empty databases of their own.
+    DATABASES[alias] = dict(DATABASES['default'], ATOMIC_REQUESTS=False, TEST={'MIRROR': 'default'})
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias].update(HOST=host, PORT=port or DATABASES['default']['PORT'])
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['notes.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write, to cover
+# replication lag
+REPLICA_PIN_SECONDS = int(getenv('REPLICA_PIN_SECONDS', '10'))
+
+# Cache
+# Redis when REDIS_URL is set, otherwise a per-process in-memory cache
+
+if getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached list response is kept; writes invalidate it sooner. Like
+# the user cache below, invalidation only reaches other processes through a
+# shared cache, so it stays off unless Redis is configured.
+LIST_CACHE_TIMEOUT = int(getenv('LIST_CACHE_TIMEOUT', '300' if getenv('REDIS_URL') else '0'))
+
+# Seconds an authenticated user is cached per token. Saving the user
+# invalidates it, which only reaches other processes through a shared cache,
+# so it stays off unless Redis is configured.
+AUTH_USER_CACHE_TTL = int(getenv('AUTH_USER_CACHE_TTL', '60' if getenv('REDIS_URL') else '0'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -219,5 +284,70 @@ USE_SES_V2 = True
 DOMAIN = getenv('DOMAIN')
 SITE_NAME = getenv('SITE_NAME')
 
+# Every Nth NoteVersion keeps a full copy, the rest are reverse diffs
+NOTE_VERSION_SNAPSHOT_INTERVAL = int(getenv('NOTE_VERSION_SNAPSHOT_INTERVAL', '10'))
+
+# Autosaves by the same user less than NOTE_VERSION_COALESCE_WINDOW seconds
+# apart update the newest version instead of adding one (0 disables this);
+# a new version is forced once the newest is NOTE_VERSION_CHECKPOINT_INTERVAL old
+NOTE_VERSION_COALESCE_WINDOW = int(getenv('NOTE_VERSION_COALESCE_WINDOW', '120'))
+NOTE_VERSION_CHECKPOINT_INTERVAL = int(getenv('NOTE_VERSION_CHECKPOINT_INTERVAL', '900'))
+
+# Version diffs are keyed by content hash, so entries never go stale
+VERSION_DIFF_CACHE_TIMEOUT = 24 * 3600
+
+# Retention (manage.py apply_retention): trashed notes are purged after
+# TRASH_RETENTION_DAYS; versions are thinned by (max age, keep one per) tiers
+TRASH_RETENTION_DAYS = int(getenv('TRASH_RETENTION_DAYS', '30'))
+NOTE_VERSION_RETENTION = [
+    (timedelta(days=1), None),
+    (timedelta(weeks=1), timedelta(hours=1)),
+    (None, timedelta(days=1)),
+]
+
+# Note, version and snippet bodies of at least this many UTF-8 bytes are
+# stored compressed with this codec ('zstd' or 'zlib') and level;
+# manage.py compress_text applies changes to existing rows
+TEXT_COMPRESSION_THRESHOLD = int(getenv('TEXT_COMPRESSION_THRESHOLD', '1024'))
+TEXT_COMPRESSION_CODEC = getenv('TEXT_COMPRESSION_CODEC', 'zstd')
+TEXT_COMPRESSION_LEVEL = int(getenv('TEXT_COMPRESSION_LEVEL', '1'))
+
+# How far the /api/sync/ cursor trails the clock, to cover in-flight transactions
+SYNC_CURSOR_LAG_SECONDS = 5
+# Rows per /api/sync/ page, and how long deletions are remembered for it;
+# apply_retention purges older tombstones and older cursors must resync
+SYNC_PAGE_SIZE = int(getenv('SYNC_PAGE_SIZE', '500'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '90'))
+
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+
+# Part files for resumable uploads; must be shared by every app server.
+# UPLOAD_MAX_SIZE caps direct and resumable uploads alike; apply_retention
+# removes sessions idle for UPLOAD_SESSION_EXPIRY
+UPLOAD_SESSION_DIR = getenv('UPLOAD_SESSION_DIR', str(BASE_DIR / 'upload_sessions'))
+UPLOAD_MAX_SIZE = int(getenv('UPLOAD_MAX_SIZE', str(50 * 1024 * 1024)))
+UPLOAD_SESSION_EXPIRY = timedelta(hours=int(getenv('UPLOAD_SESSION_EXPIRY_HOURS', '24')))
+
+# Widths rendered for ?w= on /api/images/, by a pool of THUMBNAIL_WORKERS
+# processes in each server process; 0 leaves it to generate_thumbnails
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+THUMBNAIL_WORKERS = int(getenv('THUMBNAIL_WORKERS', '2'))
+
+# Pygments style for server-rendered snippet HTML (?render=html)
+SNIPPET_HIGHLIGHT_STYLE = getenv('SNIPPET_HIGHLIGHT_STYLE', 'default')
+
+# Estimated Jaccard similarity of code shingles for /api/snippets/<id>/similar/,
+# and the higher bar for flagging a newly created snippet as a likely duplicate
+SNIPPET_SIMILARITY_THRESHOLD = float(getenv('SNIPPET_SIMILARITY_THRESHOLD', '0.5'))
+SNIPPET_DUPLICATE_THRESHOLD = float(getenv('SNIPPET_DUPLICATE_THRESHOLD', '0.8'))
+
+# Request metrics, served in the Prometheus text format at /metrics to
+# requests bearing METRICS_TOKEN as a bearer token or coming from
+# METRICS_ALLOWED_IPS (comma separated addresses or networks, e.g.
+# 10.0.0.0/8); with neither set nobody can read them. SLOW_REQUEST_MS > 0
+# logs requests slower than that, with their slowest SQL.
+METRICS_ENABLED = getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [entry.strip() for entry in getenv('METRICS_ALLOWED_IPS', '').split(',') if entry.strip()]
+SLOW_REQUEST_MS = int(getenv('SLOW_REQUEST_MS', '0'))
@@ -9,4 +9,8 @@ urlpatterns = [
     path('api/', include('users.urls')),
     path('api/', include('notes.urls')),
     path('api/', include('snippets.urls')),
+    path('api/', include('search.urls')),
+    path('api/', include('sync.urls')),
+    path('api/', include('workspace.urls')),
+    path('', include('metrics.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
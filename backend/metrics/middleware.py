@@ -0,0 +1,140 @@
+"""
+Per-request timing, query counts and an opt-in slow-request log.
+
+The stats for the request in flight live in a context variable, so they
+follow async views into the threads their database work runs on. Every
+connection gets ``record_query`` as a permanent execute wrapper (the hook
+behind ``connection.execute_wrapper``); outside a request it only passes the
+query through.
+"""
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import registry
+
+logger = logging.getLogger(__name__)
+
+# Slowest statements quoted in a slow-request log entry
+SLOW_LOG_STATEMENTS = 10
+
+current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializing', 'sql')
+
+    def __init__(self, keep_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.sql = [] if keep_sql else None
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.sql is not None:
+            stats.sql.append((elapsed, sql))
+
+
+def instrument(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """Record every request into the histograms in metrics.registry.
+
+    Streaming responses are measured up to the view returning, not to the
+    last chunk being sent.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = settings.SLOW_REQUEST_MS / 1000 if settings.SLOW_REQUEST_MS else None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, stats, perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.finish(request, response, stats, perf_counter() - start)
+        return response
+
+    def begin(self):
+        # Connections opened before this module was loaded missed connection_created
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        stats = RequestStats(keep_sql=self.slow_seconds is not None)
+        return stats, current.set(stats), perf_counter()
+
+    def finish(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unresolved>'
+        registry.REQUEST_DURATION.observe((view, request.method, str(response.status_code)), elapsed)
+        registry.DB_QUERIES.observe((view,), stats.queries)
+        registry.DB_DURATION.observe((view,), stats.db_time)
+        registry.SERIALIZER_DURATION.observe((view,), stats.serializer_time)
+        if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+            self.log_slow(request, response, view, stats, elapsed)
+
+    def log_slow(self, request, response, view, stats, elapsed):
+        slowest = sorted(stats.sql, key=lambda entry: entry[0], reverse=True)[:SLOW_LOG_STATEMENTS]
+        logger.warning(
+            'Slow request %s %s (%s) -> %s in %.0f ms: %d queries, %.0f ms db, %.0f ms serializing%s',
+            request.method, request.get_full_path(), view, response.status_code, elapsed * 1000,
+            stats.queries, stats.db_time * 1000, stats.serializer_time * 1000,
+            ''.join(f'\n  {duration * 1000:.1f} ms  {sql}' for duration, sql in slowest),
+        )
+
+
+class TimedSerializerMixin:
+    """Count time spent in ``to_representation`` towards the request's serializer time.
+
+    Nested serializers are not counted twice.
+    """
+
+    def to_representation(self, instance):
+        stats = current.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        start = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += perf_counter() - start
+            stats.serializing = False
@@ -0,0 +1,84 @@
+"""
+In-process histograms rendered in the Prometheus text format.
+
+Each worker process keeps its own registry, so a scrape reports the worker
+that answered it; scrape every worker (or run one) for complete numbers.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        # Counts per bucket, made cumulative when rendered; the last slot is +Inf
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self.lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(series.items()):
+            pairs = [f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels)]
+            running = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                running += bucket_count
+                le = bound if bound == '+Inf' else format_value(bound)
+                bucket_labels = ','.join(pairs + [f'le="{le}"'])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {running}')
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            lines.append(f'{self.name}_sum{label_text} {format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time from the request entering the middleware to the response.',
+    ('view', 'method', 'status'), LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Database queries run while handling a request.',
+    ('view',), COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'db_duration_seconds', 'Time per request spent waiting on database queries.',
+    ('view',), LATENCY_BUCKETS,
+)
+SERIALIZER_DURATION = Histogram(
+    'serializer_duration_seconds', 'Time per request spent turning objects into response data.',
+    ('view',), LATENCY_BUCKETS,
+)
+HISTOGRAMS = [REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZER_DURATION]
+
+
+def render():
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.collect()) + '\n'
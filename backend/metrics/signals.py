@@ -0,0 +1,7 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .middleware import instrument
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    instrument(connection)
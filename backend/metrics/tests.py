@@ -0,0 +1,64 @@
+from django.test import Client, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from notes.models import Note
+from users.models import UserAccount
+from . import registry
+
+
+@override_settings(METRICS_TOKEN='secret')
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        for i in range(3):
+            Note.objects.create(user=cls.user, title=f'Note {i}', content='text')
+
+    def setUp(self):
+        for histogram in registry.HISTOGRAMS:
+            histogram.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.get('/api/notes/')
+        self.client.get('/api/notes/')
+        self.client.get('/api/async/notes/')
+
+        counts, _, count = registry.REQUEST_DURATION.series['note-list', 'GET', '200']
+        self.assertEqual(count, 2)
+        _, queries, _ = registry.DB_QUERIES.series['note-list',]
+        self.assertGreater(queries, 0)
+        _, serializing, _ = registry.SERIALIZER_DURATION.series['note-list',]
+        self.assertGreater(serializing, 0)
+        # Async views run their queries on another thread
+        _, queries, _ = registry.DB_QUERIES.series['async-note-list',]
+        self.assertGreater(queries, 0)
+
+        body = Client(HTTP_AUTHORIZATION='Bearer secret').get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="note-list",method="GET",status="200"} 2', body)
+        self.assertIn('db_queries_per_request_bucket{view="note-list",le="+Inf"} 2', body)
+
+    def test_token_protects_the_endpoint(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = Client(HTTP_AUTHORIZATION='Bearer secret').get('/metrics')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_closed_without_a_token_or_allowed_addresses(self):
+        self.assertEqual(Client().get('/metrics').status_code, 403)
+        self.assertEqual(Client(REMOTE_ADDR='10.1.2.3').get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['10.0.0.0/8', '::1'])
+    def test_allowed_addresses_need_no_token(self):
+        self.assertEqual(Client(REMOTE_ADDR='10.1.2.3').get('/metrics').status_code, 200)
+        self.assertEqual(Client(REMOTE_ADDR='::1').get('/metrics').status_code, 200)
+        self.assertEqual(Client(REMOTE_ADDR='192.168.1.5').get('/metrics').status_code, 403)
+        self.assertEqual(Client(REMOTE_ADDR='not an address').get('/metrics').status_code, 403)
+
+    @override_settings(SLOW_REQUEST_MS=1)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        # The middleware reads the threshold when the handler is built
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.assertLogs('metrics.middleware', 'WARNING') as logs:
+            self.client.get('/api/notes/?page_size=1000')
+        self.assertIn('notes_note', logs.output[0])
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import metrics
+
+urlpatterns = [
+    path('metrics', metrics, name='metrics'),
+]
@@ -0,0 +1,26 @@
+import ipaddress
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from . import registry
+
+
+def from_allowed_address(request):
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+@require_GET
+def metrics(request):
+    """Prometheus scrape target, for ``Authorization: Bearer METRICS_TOKEN`` or METRICS_ALLOWED_IPS only."""
+    token = settings.METRICS_TOKEN
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not from_allowed_address(request):
+        return HttpResponse(status=401 if token else 403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
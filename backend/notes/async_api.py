@@ -0,0 +1,64 @@
+"""
+Plumbing for plain Django async views.
+
+DRF views are sync, so under ASGI every request holds a worker thread from
+start to finish. The read endpoints under ``/api/async/`` are ``async def``
+views instead: authentication, cache lookups and ORM reads are awaited, pages
+are read with ``aiterator()``, and only serialization runs inline (it touches
+no database once tags are prefetched). Responses are rendered with DRF's JSON renderer so they match
+what the sync endpoints return.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from users.authentication import CustomJWTAuthentication
+from .cache import alist_cache_key
+
+
+def render(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def async_api_view(view):
+    """Authenticate a GET-only async view and hand it a DRF ``Request``."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        authenticator = CustomJWTAuthentication()
+        result = await authenticator.aauthenticate(request)
+        if result is None:
+            response = render({'detail': 'Authentication credentials were not provided.'}, status=401)
+            response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+        drf_request = Request(request)
+        drf_request.user, drf_request.auth = result
+        return await view(drf_request, *args, **kwargs)
+    # ATOMIC_REQUESTS can't wrap a coroutine; these views only read
+    return transaction.non_atomic_requests(wrapper)
+
+
+async def cached_list(name, request, build):
+    """Async ``CachedListMixin.list``, invalidated by the same generations."""
+    if not settings.LIST_CACHE_TIMEOUT:
+        return render(await build())
+    key = await alist_cache_key(name, request)
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, settings.LIST_CACHE_TIMEOUT)
+    return render(data)
+
+
+async def list_data(request, queryset, serializer_class, pagination_class):
+    """Serialized page, paginated the same way as the sync viewsets."""
+    paginator = pagination_class()
+    page = await paginator.apaginate_queryset(queryset, request)
+    context = {'request': request}
+    return paginator.get_paginated_response(serializer_class(page, many=True, context=context).data).data
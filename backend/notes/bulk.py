@@ -0,0 +1,193 @@
+"""
+Batch mutations for notes.
+
+Operations are validated up front, applied to in-memory notes in request
+order, then written with a fixed number of bulk statements inside one
+transaction: one UPDATE per distinct set of changed fields. Per-row signals don't fire for bulk writes, so version rows and
+the search index, tag usage counts and list cache are maintained here
+explicitly.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from search.backends import index_entries, remove_entries, note_entry
+from .cache import invalidate_user
+from .models import Note, NoteVersion, Tag
+from .replicas import pin
+from .tag_usage import adjust
+from .versioning import build_version
+
+MAX_OPERATIONS = 1000
+
+
+class BulkOperationSerializer(serializers.Serializer):
+    OPS = ['create', 'update', 'trash', 'restore', 'tag']
+
+    op = serializers.ChoiceField(choices=OPS)
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=200, required=False)
+    content = serializers.CharField(allow_blank=True, trim_whitespace=False, required=False)
+    favorite = serializers.BooleanField(required=False)
+    tags = serializers.ListField(child=serializers.IntegerField(), required=False)
+    add = serializers.ListField(child=serializers.IntegerField(), required=False)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        op = attrs['op']
+        if op == 'create' and 'title' not in attrs:
+            raise serializers.ValidationError({'title': 'This field is required.'})
+        if op != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'This field is required.'})
+        return attrs
+
+
+def tag_ids_of(op):
+    return set(op.get('tags', [])) | set(op.get('add', [])) | set(op.get('remove', []))
+
+
+def apply_operations(user, operations):
+    """Apply ``operations`` for ``user`` and return one result per operation."""
+    results = [None] * len(operations)
+    valid = []
+    for index, data in enumerate(operations):
+        serializer = BulkOperationSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'status': 'error', 'errors': serializer.errors}
+
+    # Resolve every referenced note and tag with one query each
+    note_ids = {op['id'] for _, op in valid if op['op'] != 'create'}
+    notes = Note.objects.filter(user=user, pk__in=note_ids)
+    # Content is only needed to diff new versions and to reindex
+    if not any(op['op'] == 'restore' or {'title', 'content'} & set(op) for _, op in valid):
+        notes = notes.defer('content')
+    notes = {note.pk: note for note in notes}
+    tag_ids = set().union(*(tag_ids_of(op) for _, op in valid))
+    known_tags = set(Tag.objects.filter(pk__in=tag_ids).values_list('pk', flat=True)) if tag_ids else set()
+
+    now = timezone.now()
+    created = []        # (result index, note, tag ids)
+    changed = {}        # note id -> set of changed fields
+    reindex = set()     # note ids whose searchable fields changed
+    tag_changes = {}    # note id -> list of ('set' | 'add' | 'remove', tag ids)
+    versions = []
+
+    for index, op in valid:
+        missing_tags = tag_ids_of(op) - known_tags
+        if missing_tags:
+            results[index] = {'status': 'error', 'errors': {'tags': [f'Invalid tag id {pk}.' for pk in sorted(missing_tags)]}}
+            continue
+
+        if op['op'] == 'create':
+            note = Note(
+                user=user,
+                title=op['title'],
+                content=op.get('content', ''),
+                favorite=op.get('favorite', False),
+            )
+            created.append((index, note, op.get('tags', [])))
+            continue
+
+        note = notes.get(op['id'])
+        if note is None:
+            results[index] = {'status': 'error', 'errors': {'id': 'Note not found.'}}
+            continue
+        fields = changed.setdefault(note.pk, set())
+        if op['op'] == 'update':
+            if 'content' in op and op['content'] != note.content:
+                versions.append(build_version(note, note.content, op['content'], edited_by=user))
+                note.content = op['content']
+                fields.update({'content', 'version_count', 'last_versioned_at'})
+                reindex.add(note.pk)
+            if 'title' in op and op['title'] != note.title:
+                note.title = op['title']
+                fields.add('title')
+                reindex.add(note.pk)
+            if 'favorite' in op:
+                note.favorite = op['favorite']
+                fields.add('favorite')
+            if 'tags' in op:
+                tag_changes.setdefault(note.pk, []).append(('set', op['tags']))
+        elif op['op'] in ('trash', 'restore'):
+            deleted = op['op'] == 'trash'
+            if note.deleted != deleted:
+                note.deleted = deleted
+                note.stamp_deleted_at(now)
+                fields.update({'deleted', 'deleted_at'})
+                reindex.add(note.pk)
+        elif op['op'] == 'tag':
+            tag_changes.setdefault(note.pk, []).append(('add', op.get('add', [])))
+            tag_changes.setdefault(note.pk, []).append(('remove', op.get('remove', [])))
+        note.updated_at = now
+        fields.add('updated_at')
+        results[index] = {'status': 'ok', 'id': note.pk}
+
+    with transaction.atomic():
+        if created:
+            Note.objects.bulk_create([note for _, note, _ in created])
+            for index, note, tags in created:
+                results[index] = {'status': 'ok', 'id': note.pk}
+                if tags:
+                    tag_changes[note.pk] = [('set', tags)]
+                reindex.add(note.pk)
+                notes[note.pk] = note
+
+        # One UPDATE per set of changed fields, so a batch of trashes or
+        # retags never rewrites titles or content
+        groups = {}
+        for pk, fields in changed.items():
+            groups.setdefault(frozenset(fields), []).append(notes[pk])
+        for fields, group in groups.items():
+            Note.objects.bulk_update(group, sorted(fields), batch_size=500)
+        if versions:
+            NoteVersion.objects.bulk_create(versions, batch_size=500)
+        if tag_changes:
+            apply_tag_changes(tag_changes, user.pk)
+
+        if reindex:
+            entries = [note_entry(notes[pk]) for pk in reindex if not notes[pk].deleted]
+            index_entries(entries)
+            remove_entries('note', [pk for pk in reindex if notes[pk].deleted])
+
+        if created or changed:
+            invalidate_user(user.pk)
+            pin(user.pk)
+
+    return results
+
+
+def apply_tag_changes(tag_changes, user_id):
+    """Fold per-note tag operations into one DELETE and one INSERT."""
+    Through = Note.tags.through
+    current = {pk: set() for pk in tag_changes}
+    for note_id, tag_id in Through.objects.filter(note_id__in=current).values_list('note_id', 'tag_id'):
+        current[note_id].add(tag_id)
+
+    to_add, to_remove = [], []
+    for note_id, ops in tag_changes.items():
+        tags = set(current[note_id])
+        for action, tag_ids in ops:
+            if action == 'set':
+                tags = set(tag_ids)
+            elif action == 'add':
+                tags |= set(tag_ids)
+            else:
+                tags -= set(tag_ids)
+        to_add += [Through(note_id=note_id, tag_id=tag_id) for tag_id in tags - current[note_id]]
+        to_remove += [(note_id, tag_id) for tag_id in current[note_id] - tags]
+
+    if to_remove:
+        removed = Q()
+        for note_id, tag_id in to_remove:
+            removed |= Q(note_id=note_id, tag_id=tag_id)
+        Through.objects.filter(removed).delete()
+    if to_add:
+        Through.objects.bulk_create(to_add, batch_size=500)
+    usage = Counter((user_id, row.tag_id) for row in to_add)
+    usage.subtract((user_id, tag_id) for _, tag_id in to_remove)
+    adjust(usage)
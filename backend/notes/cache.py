@@ -0,0 +1,94 @@
+"""
+Per-user caching of list responses.
+
+Cache keys embed a per-user generation counter and a shared one for tags.
+Model signals bump the counters on every write, which orphans all cached
+lists for that user (or everyone, for tag changes) without having to find
+and delete them; orphaned entries simply expire.
+
+The counters only keep lists fresh if every process sees them, so caching
+is off (LIST_CACHE_TIMEOUT 0) unless a shared cache is configured.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+TAG_GENERATION_KEY = 'list-gen:tags'
+
+
+def user_generation_key(user_id):
+    return f'list-gen:user:{user_id}'
+
+
+def get_generation(key):
+    # A counter that was evicted restarts from the clock rather than from zero,
+    # so it can't land back on a generation that already has cached entries.
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+async def aget_generation(key):
+    await cache.aadd(key, time.time_ns(), timeout=None)
+    return await cache.aget(key)
+
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(key):
+    # Bump now so this request never reads its own stale lists, and again on
+    # commit in case another request cached pre-commit data in between.
+    bump_generation(key)
+    transaction.on_commit(lambda: bump_generation(key))
+
+
+def invalidate_user(user_id):
+    invalidate(user_generation_key(user_id))
+
+
+def invalidate_tags():
+    invalidate(TAG_GENERATION_KEY)
+
+
+def request_digest(request):
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # The path is part of the key because paginated bodies embed absolute links
+    return hashlib.md5(f'{request.get_host()}{request.path}?{params}'.encode()).hexdigest()
+
+
+def list_cache_key(name, request):
+    user_generation = get_generation(user_generation_key(request.user.pk))
+    tag_generation = get_generation(TAG_GENERATION_KEY)
+    return f'list:{name}:{request.user.pk}:{user_generation}:{tag_generation}:{request_digest(request)}'
+
+
+async def alist_cache_key(name, request):
+    user_generation = await aget_generation(user_generation_key(request.user.pk))
+    tag_generation = await aget_generation(TAG_GENERATION_KEY)
+    return f'list:{name}:{request.user.pk}:{user_generation}:{tag_generation}:{request_digest(request)}'
+
+
+class CachedListMixin:
+    """Serve ``list`` from the cache for repeat requests with the same parameters."""
+    list_cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.LIST_CACHE_TIMEOUT:
+            return super().list(request, *args, **kwargs)
+        key = list_cache_key(self.list_cache_name, request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.LIST_CACHE_TIMEOUT)
+        return response
@@ -0,0 +1,142 @@
+"""
+Text columns compressed at rest.
+
+CompressedTextField behaves like a TextField in Python, forms and
+serializers, but its column is binary. A stored value is one header byte
+naming the codec, followed by the UTF-8 text either as it is (RAW) or
+compressed with zstd or zlib. Text is compressed with
+TEXT_COMPRESSION_CODEC once its encoding reaches
+TEXT_COMPRESSION_THRESHOLD bytes, and kept compressed only if that makes it
+smaller; short values such as version deltas aren't worth the CPU. zstd
+is the default, since it decompresses several times faster than zlib at
+a better ratio, and reads happen far more often than writes. Every codec
+stays readable whatever the setting.
+
+Columns converted with CompressTextColumn keep their rows as they were;
+``manage.py compress_text`` rewrites them in batches, and again after the
+codec, threshold or level change. Old rows read back fine in the meantime.
+Because the database only sees bytes, filtering on the text in SQL no
+longer works; nothing here does.
+"""
+import threading
+import zlib
+
+import zstandard
+from django.conf import settings
+from django.db import migrations, models
+
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+CODECS = {'zlib': ZLIB, 'zstd': ZSTD}
+
+# zstd contexts are reused, but can't be shared between threads
+_contexts = threading.local()
+
+
+def zstd_compressor(level):
+    compressors = _contexts.__dict__.setdefault('compressors', {})
+    if level not in compressors:
+        compressors[level] = zstandard.ZstdCompressor(level=level)
+    return compressors[level]
+
+
+def zstd_decompressor():
+    if not hasattr(_contexts, 'decompressor'):
+        _contexts.decompressor = zstandard.ZstdDecompressor()
+    return _contexts.decompressor
+
+
+def compress(text):
+    """Stored form of ``text``."""
+    data = text.encode()
+    if len(data) >= settings.TEXT_COMPRESSION_THRESHOLD:
+        codec = CODECS[settings.TEXT_COMPRESSION_CODEC]
+        if codec == ZSTD:
+            packed = zstd_compressor(settings.TEXT_COMPRESSION_LEVEL).compress(data)
+        else:
+            packed = zlib.compress(data, settings.TEXT_COMPRESSION_LEVEL)
+        if len(packed) < len(data):
+            return bytes([codec]) + packed
+    return bytes([RAW]) + data
+
+
+def decompress(value):
+    """Text of a stored value; text that was never compressed passes through."""
+    if value is None or isinstance(value, str):
+        return value
+    # Slices of a memoryview don't copy
+    value = memoryview(value)
+    if value[0] == ZSTD:
+        return zstd_decompressor().decompress(value[1:]).decode()
+    if value[0] == ZLIB:
+        return zlib.decompress(value[1:]).decode()
+    if value[0] == RAW:
+        return str(value[1:], 'utf-8')
+    raise ValueError(f'Unknown compressed text header {value[0]}.')
+
+
+class CompressedTextField(models.TextField):
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return None
+        return connection.Database.Binary(compress(value))
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+
+class CompressTextColumn(migrations.AlterField):
+    """Turn a TextField into a CompressedTextField without touching its rows.
+
+    SQLite keeps the old values as text, which decompress() passes through.
+    PostgreSQL can't cast text to bytea without reading backslashes as
+    escapes, so each value is converted with convert_to() and given the RAW
+    header instead. Going back stores every row raw first, since compressed
+    rows can't be decoded in SQL.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        table, column = self.quoted_column(to_state, app_label, schema_editor)
+        schema_editor.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+            f"USING '\\x{RAW:02x}'::bytea || convert_to({column}, 'UTF8')"
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        connection = schema_editor.connection
+        postgresql = connection.vendor == 'postgresql'
+        rows = model._base_manager.using(connection.alias).values_list('pk', self.name)
+        with connection.cursor() as cursor:
+            for pk, text in rows.iterator():
+                if text is not None:
+                    stored = connection.Database.Binary(bytes([RAW]) + text.encode()) if postgresql else text
+                    cursor.execute(
+                        f'UPDATE {schema_editor.quote_name(model._meta.db_table)} '
+                        f'SET {schema_editor.quote_name(field.column)} = %s '
+                        f'WHERE {schema_editor.quote_name(model._meta.pk.column)} = %s',
+                        [stored, pk],
+                    )
+        if not postgresql:
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        table, column = self.quoted_column(from_state, app_label, schema_editor)
+        schema_editor.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE text "
+            f"USING convert_from(substring({column} FROM 2), 'UTF8')"
+        )
+
+    def quoted_column(self, state, app_label, schema_editor):
+        model = state.apps.get_model(app_label, self.model_name)
+        column = model._meta.get_field(self.name).column
+        return schema_editor.quote_name(model._meta.db_table), schema_editor.quote_name(column)
+
+    def describe(self):
+        return f'Compress {self.model_name}.{self.name} at rest'
@@ -0,0 +1,58 @@
+"""
+Server-side diffs between note versions.
+
+Version content never changes once written, so a diff is cached under the
+content hashes of its two sides and can be served again without rebuilding
+either version.
+"""
+import difflib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versioning import resolve_content
+
+MODES = ('unified', 'word')
+WORD = re.compile(r'\s+|\w+|[^\w\s]')
+
+
+def unified_diff(old, new, old_label, new_label):
+    return ''.join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile=old_label, tofile=new_label,
+    ))
+
+
+def word_diff(old, new):
+    """Return ``[op, text]`` runs, ``op`` being ``equal``, ``delete`` or ``insert``."""
+    old_words = WORD.findall(old)
+    new_words = WORD.findall(new)
+    runs = []
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            runs.append(['equal', ''.join(old_words[i1:i2])])
+            continue
+        if i2 > i1:
+            runs.append(['delete', ''.join(old_words[i1:i2])])
+        if j2 > j1:
+            runs.append(['insert', ''.join(new_words[j1:j2])])
+    return runs
+
+
+def version_diff(old, new, mode):
+    """Diff two versions loaded with at least their ``content_hash``."""
+    key = f'version-diff:{mode}:{old.content_hash}:{new.content_hash}'
+    if mode == 'unified':
+        # The header lines name the versions
+        key += f':{old.pk}:{new.pk}'
+    diff = cache.get(key) if old.content_hash and new.content_hash else None
+    if diff is None:
+        old_content, new_content = resolve_content(old), resolve_content(new)
+        if mode == 'word':
+            diff = word_diff(old_content, new_content)
+        else:
+            diff = unified_diff(old_content, new_content, f'version {old.pk}', f'version {new.pk}')
+        cache.set(key, diff, settings.VERSION_DIFF_CACHE_TIMEOUT)
+    return diff
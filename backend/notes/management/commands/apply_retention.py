@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from notes.retention import purge_tombstones, purge_trash, thin_versions, tombstone_cutoff, trash_cutoff
+from notes.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Purge notes trashed more than TRASH_RETENTION_DAYS ago, thin version '
+        'history per NOTE_VERSION_RETENTION, remove upload sessions idle for '
+        'UPLOAD_SESSION_EXPIRY and sync tombstones older than '
+        'SYNC_TOMBSTONE_RETENTION_DAYS. Safe to run from cron on a live database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trash-days', type=int,
+                            help='Override TRASH_RETENTION_DAYS for this run.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Notes purged per transaction.')
+        parser.add_argument('--skip-trash', action='store_true', help='Leave the trash alone.')
+        parser.add_argument('--skip-versions', action='store_true', help='Leave version history alone.')
+        parser.add_argument('--skip-uploads', action='store_true', help='Leave upload sessions alone.')
+        parser.add_argument('--skip-tombstones', action='store_true', help='Leave sync tombstones alone.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be reclaimed without writing.')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        verb = 'Would reclaim' if dry_run else 'Reclaimed'
+
+        if not options['skip_trash']:
+            stats = purge_trash(
+                trash_cutoff(options['trash_days']), batch_size=options['batch_size'], dry_run=dry_run,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Trash: {verb.lower()} {stats['notes']} notes and {stats['versions']} versions, "
+                f"{stats['bytes']} bytes."
+            ))
+
+        if not options['skip_versions']:
+            stats = thin_versions(dry_run=dry_run)
+            self.stdout.write(self.style.SUCCESS(
+                f"Versions: {verb.lower()} {stats['versions']} versions across {stats['notes']} notes "
+                f"({stats['reencoded']} re-encoded), {stats['bytes']} bytes."
+            ))
+
+        if not options['skip_uploads']:
+            stats = expire_sessions(dry_run=dry_run)
+            self.stdout.write(self.style.SUCCESS(
+                f"Uploads: {verb.lower()} {stats['sessions']} idle sessions and {stats['files']} files, "
+                f"{stats['bytes']} bytes."
+            ))
+
+        if not options['skip_tombstones']:
+            count = purge_tombstones(tombstone_cutoff(), dry_run=dry_run)
+            self.stdout.write(self.style.SUCCESS(f"Tombstones: {verb.lower()} {count} tombstones."))
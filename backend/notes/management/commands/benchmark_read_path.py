@@ -0,0 +1,110 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+ENDPOINTS = {
+    'notes': ('/api/notes/', '/api/async/notes/'),
+    'snippets': ('/api/snippets/', '/api/async/snippets/'),
+}
+
+
+def run_level(url, headers, concurrency, duration):
+    """Hit ``url`` from ``concurrency`` clients for ``duration`` seconds."""
+    deadline = time.perf_counter() + duration
+
+    def client():
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                # A fresh connection per request, like many independent clients
+                ok = requests.get(url, headers=headers, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(lambda _: client(), range(concurrency)))
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    errors = sum(client_errors for _, client_errors in results)
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else float('inf')
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else float('inf'),
+        'p99_ms': p99 * 1000,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync DRF read endpoints on a WSGI server with the async '
+        'endpoints on an ASGI server: ramp concurrent clients until p99 latency '
+        'exceeds the budget and report the highest level each one sustained. '
+        'Start the servers first, e.g. `gunicorn config.wsgi -w 4 -b :8000` and '
+        '`uvicorn config.asgi:application --workers 4 --port 8001`, against the '
+        'same database, and run this from another machine where possible.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='User whose data is requested; a token is minted for them.')
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001')
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='notes')
+        parser.add_argument('--p99-ms', type=float, default=250.0,
+                            help='Latency budget each level must stay within.')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds spent at each concurrency level.')
+        parser.add_argument('--max-concurrency', type=int, default=512)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+        sync_path, async_path = ENDPOINTS[options['endpoint']]
+        targets = [
+            ('WSGI', options['wsgi_url'].rstrip('/') + sync_path),
+            ('ASGI async', options['asgi_url'].rstrip('/') + async_path),
+        ]
+        best = {}
+        for label, url in targets:
+            self.stdout.write(f'{label}: {url}')
+            concurrency = 1
+            while concurrency <= options['max_concurrency']:
+                level = run_level(url, headers, concurrency, options['duration'])
+                self.stdout.write(
+                    f"  c={level['concurrency']:<4} {level['rps']:8.1f} req/s  "
+                    f"p50 {level['p50_ms']:7.1f} ms  p99 {level['p99_ms']:7.1f} ms  "
+                    f"errors {level['errors']}"
+                )
+                total = level['requests'] + level['errors']
+                if level['p99_ms'] > options['p99_ms'] or level['errors'] > 0.01 * total:
+                    break
+                best[label] = level
+                concurrency *= 2
+
+        self.stdout.write('')
+        for label, _ in targets:
+            level = best.get(label)
+            if level is None:
+                self.stdout.write(f"{label}: p99 over {options['p99_ms']:.0f} ms even with one client")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}: {level['concurrency']} concurrent clients at p99 "
+                    f"{level['p99_ms']:.1f} ms ({level['rps']:.1f} req/s)"
+                ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from notes.models import Note, NoteVersion
+from notes.versioning import lock_note, materialize, reencode
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-encode stored note versions with the current snapshot interval, '
+        'turning full copies into reverse diffs in place.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows written per UPDATE batch.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        rows = saved = 0
+
+        note_ids = (
+            Note.objects.filter(version_count__gt=0)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        for note_id in note_ids.iterator(chunk_size=batch_size):
+            with transaction.atomic():
+                note = lock_note(note_id, 'content')
+                if note is None:
+                    continue
+                versions = materialize(
+                    note, list(NoteVersion.objects.filter(note=note).order_by('-seq'))
+                )
+                before = sum(len(version.content) for version in versions)
+                changed = reencode(note, versions)
+                saved += before - sum(len(version.content) for version in versions)
+                rows += len(changed)
+                if changed and not dry_run:
+                    NoteVersion.objects.bulk_update(
+                        changed, ['content', 'is_delta'], batch_size=batch_size
+                    )
+
+        verb = 'Would re-encode' if dry_run else 'Re-encoded'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {rows} versions, {saved} characters saved.'
+        ))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from notes.compression import RAW, compress
+from notes.models import Note, NoteVersion
+from snippets.models import CodeSnippet
+
+COLUMNS = [(Note, 'content'), (NoteVersion, 'content'), (CodeSnippet, 'code')]
+
+
+class Command(BaseCommand):
+    help = (
+        'Store note, version and snippet bodies in the compressed form the current '
+        'TEXT_COMPRESSION_CODEC, _THRESHOLD and _LEVEL settings give, a batch at a '
+        'time. Rows already stored that way are left alone.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows read and written per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing.')
+
+    def handle(self, *args, **options):
+        for model, field in COLUMNS:
+            rows, before, after = self.compress_column(model, field, options['batch_size'], options['dry_run'])
+            verb = 'would rewrite' if options['dry_run'] else 'rewrote'
+            self.stdout.write(self.style.SUCCESS(
+                f'{model.__name__}.{field}: {verb} {rows} rows, {before} -> {after} bytes stored.'
+            ))
+
+    def compress_column(self, model, field, batch_size, dry_run):
+        # The column as stored: bytes, or text for rows never rewritten on SQLite
+        stored = models.ExpressionWrapper(models.F(field), output_field=models.BinaryField())
+        queryset = model._base_manager.order_by('pk').annotate(stored=stored)
+        rows = before = after = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                # Locked, so an edit can't land between reading and rewriting a row
+                batch = list(queryset.select_for_update().filter(pk__gt=last_pk)
+                             .values_list('pk', field, 'stored')[:batch_size])
+                if not batch:
+                    break
+                changed = []
+                for pk, text, current in batch:
+                    if text is None:
+                        continue
+                    target = compress(text)
+                    if isinstance(current, str):
+                        current = current.encode()
+                        if target[0] == RAW:
+                            # Text left by the column conversion reads back as it is
+                            target = current
+                    else:
+                        current = bytes(current)
+                    before += len(current)
+                    after += len(target)
+                    if target != current:
+                        # A ready-made value, so bulk_update doesn't compress it again
+                        value = models.Value(connection.Database.Binary(target), output_field=models.BinaryField())
+                        changed.append(model(pk=pk, **{field: value}))
+                rows += len(changed)
+                if changed and not dry_run:
+                    model._base_manager.bulk_update(changed, [field], batch_size=batch_size)
+            last_pk = batch[-1][0]
+        return rows, before, after
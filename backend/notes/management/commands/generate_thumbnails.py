@@ -0,0 +1,50 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from notes import thumbnails
+
+
+def walk(directory):
+    """Yield every file path under ``directory`` in storage."""
+    dirs, files = default_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in dirs:
+        yield from walk(f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = 'Render missing WebP/AVIF derivatives for uploaded images in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU).')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        if not default_storage.exists('uploads'):
+            self.stdout.write('No uploads to process.')
+            return
+        images = [path for path in walk('uploads') if thumbnails.is_raster(path)]
+        legacy = [path for path in images if not thumbnails.is_content_addressed(path)]
+        # Checking for existing derivatives here keeps finished images out of the pool
+        paths = [
+            path for path in images
+            if thumbnails.is_content_addressed(path) and (force or thumbnails.missing(path))
+        ]
+        written = 0
+        with thumbnails.make_executor(options['workers']) as executor:
+            for count in executor.map(thumbnails.generate, paths, [force] * len(paths), chunksize=4):
+                written += count
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {written} derivatives for {len(paths)} images.'
+        ))
+        if legacy:
+            self.stdout.write(
+                f'Skipped {len(legacy)} images stored before uploads were content-addressed; '
+                'they are served as uploaded.'
+            )
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from notes import thumbnails, uploads
+
+# Operation -> (relative weight, view name it reports under in /metrics)
+OPERATIONS = {
+    'notes_list': (30, 'note-list'),
+    'snippets_list': (20, 'codesnippet-list'),
+    'versions_list': (20, 'note-version-list'),
+    'version_restore': (5, 'note-version-restore'),
+    'jwt_refresh': (10, 'users.views.CustomTokenRefreshView'),
+    'jwt_create': (5, 'users.views.CustomTokenObtainPairView'),
+    'upload': (5, 'image-upload'),
+}
+WRITES = {'version_restore', 'upload'}
+
+METRIC_LINE = re.compile(r'^db_queries_per_request_(sum|count)\{view="((?:[^"\\]|\\.)*)"\} (\S+)$')
+
+
+def png_bytes(seed):
+    # A distinct image per upload, so content-addressed storage still writes
+    image = Image.new('RGB', (64, 64), ((seed * 37) % 256, (seed * 91) % 256, (seed * 13) % 256))
+    buffer = BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Client:
+    """One simulated user: logs in, then runs weighted random operations."""
+
+    def __init__(self, base_url, email, password, rng, created):
+        self.base_url = base_url
+        self.email = email
+        self.password = password
+        self.rng = rng
+        self.login()
+        notes = self.request('get', '/api/notes/?page_size=100').json()
+        self.note_ids = [note['id'] for note in notes['results']]
+        self.versions = {}
+        # Storage paths this client's uploads added, removed once the run ends
+        self.created = created
+
+    def request(self, method, path, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if getattr(self, 'access', None):
+            headers.setdefault('Authorization', f'Bearer {self.access}')
+        # A fresh connection per request, like many independent clients
+        return requests.request(method, self.base_url + path, headers=headers, timeout=60, **kwargs)
+
+    def login(self):
+        self.access = None
+        response = self.request('post', '/api/jwt/create/', json={'email': self.email, 'password': self.password})
+        if response.status_code != 200:
+            raise CommandError(f'Could not log in as {self.email}: HTTP {response.status_code}')
+        self.access, self.refresh = response.json()['access'], response.json()['refresh']
+        return response
+
+    def run(self, name):
+        """Run operation ``name`` and return its response."""
+        if name == 'notes_list':
+            return self.request('get', '/api/notes/')
+        if name == 'snippets_list':
+            return self.request('get', '/api/snippets/')
+        if name == 'jwt_create':
+            return self.login()
+        if name == 'jwt_refresh':
+            response = requests.post(self.base_url + '/api/jwt/refresh/', json={'refresh': self.refresh}, timeout=60)
+            if response.status_code == 200:
+                self.access = response.json()['access']
+                self.refresh = response.json().get('refresh', self.refresh)
+            return response
+        if name == 'upload':
+            data = png_bytes(self.rng.randrange(1 << 20))
+            filename = f'bench-{self.rng.random()}.png'
+            path = uploads.content_path(hashlib.sha256(data).hexdigest(), filename)
+            # Content-addressed, so only files that weren't there already are ours to remove
+            ours = not default_storage.exists(path)
+            files = {'file': (filename, data, 'image/png')}
+            response = self.request('post', '/api/upload/', files=files)
+            if ours and response.status_code == 200:
+                self.created.add(path)
+            return response
+        note_id = self.rng.choice(self.note_ids) if self.note_ids else 0
+        if name == 'versions_list' or not self.versions.get(note_id):
+            response = self.request('get', f'/api/notes/{note_id}/versions/')
+            if response.status_code == 200:
+                self.versions[note_id] = [version['id'] for version in response.json()['results']]
+            return response
+        version_id = self.rng.choice(self.versions[note_id])
+        response = self.request('post', f'/api/notes/{note_id}/restore/{version_id}/')
+        # Restoring adds a version, so the cached list is stale
+        self.versions.pop(note_id, None)
+        return response
+
+
+def percentile(latencies, q):
+    if len(latencies) < 2:
+        return latencies[0] * 1000 if latencies else None
+    return statistics.quantiles(latencies, n=100, method='inclusive')[q - 1] * 1000
+
+
+def scrape_queries(base_url, token):
+    """``{view: (total queries, requests)}`` from the server's /metrics, or None."""
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    try:
+        response = requests.get(base_url + '/metrics', headers=headers, timeout=10)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for line in response.text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            kind, view, value = match.groups()
+            totals[view][0 if kind == 'sum' else 1] += float(value)
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the real API with a weighted mix of reads and writes from concurrent '
+        'clients logged in as users made by seed_benchmark_data. Reports p50/p95/p99 '
+        'latency, throughput and, when the server exposes /metrics, queries per '
+        'request; optionally saves or checks against a baseline. /metrics is per '
+        'process, so serve with a single worker (e.g. `gunicorn config.wsgi -w 1 '
+        '--threads 8`) for exact query counts. Writes change the data, so point it '
+        'at a throwaway database. Images the uploads add to a server sharing this '
+        'MEDIA_ROOT are deleted afterwards; start a remote server with MEDIA_ROOT set '
+        'to a temporary directory instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--prefix', default='bench', help='Email prefix given to seed_benchmark_data.')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--users', type=int, default=10, help='Seeded users to spread clients over.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8],
+                            help='Concurrency levels to run, one after another.')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per concurrency level.')
+        parser.add_argument('--read-only', action='store_true', help='Leave out restores and uploads.')
+        parser.add_argument('--keep-uploads', action='store_true',
+                            help='Leave the uploaded images and their thumbnails in MEDIA_ROOT.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--metrics-token', default=settings.METRICS_TOKEN,
+                            help="The server's METRICS_TOKEN; defaults to this project's setting.")
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results here as JSON.')
+        parser.add_argument('--baseline', metavar='PATH', help='Fail if results regress from this file.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative slowdown of p95 and throughput against the baseline.')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        operations = {name: spec for name, spec in OPERATIONS.items()
+                      if not (options['read_only'] and name in WRITES)}
+        results = {}
+        created = set()
+        try:
+            for concurrency in options['concurrency']:
+                self.stdout.write(f'{concurrency} concurrent clients for {options["duration"]:.0f}s')
+                level = self.run_level(base_url, operations, concurrency, options, created)
+                results[str(concurrency)] = level
+                for name, row in level.items():
+                    queries = '-' if row['queries'] is None else f"{row['queries']:.1f}"
+                    p = {key: '-' if row[key] is None else f'{row[key]:.1f}' for key in ('p50_ms', 'p95_ms', 'p99_ms')}
+                    self.stdout.write(
+                        f"  {name:<16} {row['requests']:6d} req {row['errors']:4d} err {row['rps']:8.1f} req/s  "
+                        f"p50 {p['p50_ms']:>7} p95 {p['p95_ms']:>7} p99 {p['p99_ms']:>7} ms  {queries:>5} queries"
+                    )
+        finally:
+            if not options['keep_uploads']:
+                self.remove_uploads(created)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump({'base_url': base_url, 'levels': results}, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['save_baseline']}"))
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['levels']
+            regressions = list(self.compare(baseline, results, options['tolerance']))
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def remove_uploads(self, created):
+        # Thumbnails are rendered in the background; let those in flight land first
+        if created and settings.THUMBNAIL_WORKERS:
+            time.sleep(2)
+        for path in created:
+            default_storage.delete(path)
+            for width in settings.THUMBNAIL_WIDTHS:
+                for fmt in thumbnails.formats():
+                    default_storage.delete(thumbnails.derivative_path(path, width, fmt))
+        if created:
+            self.stdout.write(f'Removed {len(created)} uploaded images and their thumbnails.')
+
+    def run_level(self, base_url, operations, concurrency, options, created):
+        names = list(operations)
+        weights = [operations[name][0] for name in names]
+        emails = [f"{options['prefix']}-{i}@example.com" for i in range(options['users'])]
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            try:
+                user = Client(base_url, emails[index % len(emails)], options['password'], rng, created)
+            except Exception:
+                start.abort()
+                raise
+            start.wait()
+            while time.perf_counter() < clock['deadline']:
+                name = rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    ok = user.run(name).status_code < 400
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if ok:
+                        latencies[name].append(elapsed)
+                    else:
+                        errors[name] += 1
+
+        # Log every client in before the clock starts
+        clock = {}
+        start = threading.Barrier(
+            concurrency, action=lambda: clock.update(deadline=time.perf_counter() + options['duration']),
+        )
+        before = scrape_queries(base_url, options['metrics_token'])
+        with ThreadPoolExecutor(concurrency) as executor:
+            futures = [executor.submit(client, index) for index in range(concurrency)]
+            for future in futures:
+                try:
+                    future.result()
+                except threading.BrokenBarrierError:
+                    pass
+        after = scrape_queries(base_url, options['metrics_token'])
+
+        level = {}
+        for name in names:
+            samples = latencies[name]
+            queries = None
+            view = operations[name][1]
+            if before is not None and after is not None and view in after:
+                total = after[view][0] - before.get(view, (0, 0))[0]
+                count = after[view][1] - before.get(view, (0, 0))[1]
+                # Logins while setting up count too; close enough for a per-request average
+                queries = total / count if count else None
+            level[name] = {
+                'requests': len(samples),
+                'errors': errors[name],
+                'rps': len(samples) / options['duration'],
+                'p50_ms': percentile(samples, 50),
+                'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99),
+                'queries': queries,
+            }
+        return level
+
+    def compare(self, baseline, results, tolerance):
+        for concurrency, level in results.items():
+            for name, row in level.items():
+                old = baseline.get(concurrency, {}).get(name)
+                if not old:
+                    continue
+                label = f'c={concurrency} {name}'
+                if old['p95_ms'] and row['p95_ms'] and row['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                    yield f"{label}: p95 {row['p95_ms']:.1f} ms, baseline {old['p95_ms']:.1f} ms"
+                if old['rps'] and row['rps'] < old['rps'] * (1 - tolerance):
+                    yield f"{label}: {row['rps']:.1f} req/s, baseline {old['rps']:.1f} req/s"
+                # List caching makes the average drift a little from run to run
+                if old['queries'] is not None and row['queries'] is not None \
+                        and row['queries'] > old['queries'] * (1 + tolerance) + 0.5:
+                    yield f"{label}: {row['queries']:.1f} queries per request, baseline {old['queries']:.1f}"
@@ -0,0 +1,179 @@
+import math
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from workspace.transfer import FORMAT_VERSION, WorkspaceImporter, dump
+
+WORDS = (
+    'the a of to and in is for on with as by at from this that it be are was or an not we can if '
+    'deploy cache query index latency request server client token schema migration release patch '
+    'review meeting notes todo follow up design draft idea bug fix test build config docker redis '
+    'postgres django react api endpoint version user team project plan budget weekly sprint goal'
+).split()
+
+LANGUAGES = [('python', 30), ('javascript', 25), ('typescript', 15), ('sql', 10), ('bash', 10),
+             ('go', 5), ('css', 5)]
+
+SNIPPET_TEMPLATES = {
+    'python': 'def {name}({arg}):\n    result = []\n    for item in {arg}:\n        if item.{attr}:\n'
+              '            result.append(item.{attr} * {n})\n    return result\n',
+    'javascript': 'const {name} = ({arg}) => {{\n  return {arg}.filter(x => x.{attr}).map(x => x.{attr} * {n});\n}};\n',
+    'typescript': 'export function {name}({arg}: Item[]): number[] {{\n'
+                  '  return {arg}.filter(x => x.{attr}).map(x => x.{attr} * {n});\n}}\n',
+    'sql': 'SELECT {attr}, COUNT(*) AS {name}\nFROM {arg}\nWHERE {attr} > {n}\nGROUP BY {attr}\nORDER BY 2 DESC;\n',
+    'bash': '#!/bin/bash\nfor f in ${arg}/*; do\n  echo "{name} $f"\n  grep -c {attr} "$f" | head -n {n}\ndone\n',
+    'go': 'func {name}({arg} []Item) int {{\n\ttotal := 0\n\tfor _, x := range {arg} {{\n'
+          '\t\ttotal += x.{attr} * {n}\n\t}}\n\treturn total\n}}\n',
+    'css': '.{name} {{\n  display: flex;\n  margin: {n}px;\n}}\n.{name}-{attr} {{\n  color: #{n}{n}{n};\n}}\n',
+}
+
+
+class Generator:
+    """Random workspace records with long-tailed sizes.
+
+    Note counts, note lengths and snippet counts are log-normal, tag usage
+    is Zipf-like over a shared pool, and a share of users are heavy editors
+    with tens to hundreds of versions per note.
+    """
+
+    def __init__(self, rng, options):
+        self.rng = rng
+        self.notes_median = options['notes_median']
+        self.snippets_median = options['snippets_median']
+        self.max_versions = options['max_versions']
+        self.tags = [f'{self.rng.choice(WORDS)}-{i}' for i in range(options['tags'])]
+        self.tag_weights = [1 / rank for rank in range(1, len(self.tags) + 1)]
+        self.now = timezone.now()
+
+    def lognormal(self, median, sigma, cap):
+        return max(1, min(cap, int(self.rng.lognormvariate(math.log(median), sigma))))
+
+    def text(self, chars):
+        lines, size = [], 0
+        while size < chars:
+            line = ' '.join(self.rng.choices(WORDS, k=self.rng.randint(4, 16)))
+            lines.append(line)
+            size += len(line) + 1
+        return '\n'.join(lines) + '\n'
+
+    def pick_tags(self, most):
+        count = self.rng.randint(0, most)
+        return sorted(set(self.rng.choices(self.tags, weights=self.tag_weights, k=count)))
+
+    def edit(self, content):
+        lines = content.splitlines(keepends=True) or ['\n']
+        index = self.rng.randrange(len(lines))
+        roll = self.rng.random()
+        if roll < 0.5:
+            lines.insert(index, self.text(40))
+        elif roll < 0.8 or len(lines) < 2:
+            lines[index] = self.text(40)
+        else:
+            del lines[index]
+        return ''.join(lines)
+
+    def records(self, heavy):
+        yield {'type': 'workspace', 'version': FORMAT_VERSION}
+        for i in range(self.lognormal(self.notes_median, 1.0, 20 * self.notes_median)):
+            created = self.now - timedelta(days=self.rng.uniform(0, 365))
+            if heavy:
+                edits = self.lognormal(30, 0.8, self.max_versions)
+            else:
+                edits = min(int(self.rng.expovariate(1 / 2)), self.max_versions)
+            # Edit forward from the first draft; the export lists versions newest first
+            states = [self.text(self.lognormal(1500, 1.2, 200_000))]
+            for _ in range(edits):
+                states.append(self.edit(states[-1]))
+            deleted = self.rng.random() < 0.05
+            yield {
+                'type': 'note',
+                'title': ' '.join(self.rng.choices(WORDS, k=4)).capitalize(),
+                'content': states[-1],
+                'tags': self.pick_tags(4),
+                'created_at': created,
+                'deleted': deleted,
+                'deleted_at': self.now if deleted else None,
+                'favorite': self.rng.random() < 0.1,
+            }
+            step = (self.now - created) / (len(states) + 1)
+            for seq in range(len(states) - 1, 0, -1):
+                yield {'type': 'version', 'content': states[seq - 1], 'created_at': created + step * seq}
+
+        codes = []
+        for i in range(self.lognormal(self.snippets_median, 1.0, 20 * self.snippets_median)):
+            language = self.rng.choices([name for name, _ in LANGUAGES], weights=[w for _, w in LANGUAGES])[0]
+            if codes and self.rng.random() < 0.1:
+                # Pasted again with a small change
+                language, code = self.rng.choice(codes)
+                code = code.replace(str(self.rng.randint(0, 9)), str(self.rng.randint(0, 9)), 1)
+            else:
+                code = SNIPPET_TEMPLATES[language].format(
+                    name=f'{self.rng.choice(WORDS)}_{i}', arg=self.rng.choice(WORDS),
+                    attr=self.rng.choice(WORDS), n=self.rng.randint(1, 99),
+                )
+            codes.append((language, code))
+            yield {
+                'type': 'snippet',
+                'title': f'{language} {self.rng.choice(WORDS)} {i}',
+                'code': code,
+                # Half leave the language blank and rely on detection
+                'language': language if self.rng.random() < 0.5 else '',
+                'tags': self.pick_tags(3),
+                'created_at': self.now - timedelta(days=self.rng.uniform(0, 365)),
+            }
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users with synthetic notes, versions, tags and snippets for benchmarking. '
+        'Users are <prefix>-<n>@example.com and all share one password, so load_test can '
+        'log in as them. Rows go through the workspace importer, which keeps the search '
+        'index, tag counts and snippet signatures current.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, required=True, help='Users to create.')
+        parser.add_argument('--prefix', default='bench', help='Email prefix for the created users.')
+        parser.add_argument('--password', default='bench-password', help='Password for every created user.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data.')
+        parser.add_argument('--notes-median', type=int, default=40, help='Median notes per user.')
+        parser.add_argument('--snippets-median', type=int, default=15, help='Median snippets per user.')
+        parser.add_argument('--heavy-editors', type=float, default=0.1,
+                            help='Share of users with tens to hundreds of versions per note.')
+        parser.add_argument('--max-versions', type=int, default=300, help='Cap on versions per note.')
+        parser.add_argument('--tags', type=int, default=300, help='Size of the shared tag pool.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        prefix = options['prefix']
+        emails = [f'{prefix}-{i}@example.com' for i in range(options['users'])]
+        if User.objects.filter(email__in=emails).exists():
+            raise CommandError(f'Users named {prefix}-<n>@example.com already exist; pick another --prefix.')
+
+        # Hash once; the hasher is deliberately slow
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(email=email, first_name='Bench', last_name=str(i), password=password)
+            for i, email in enumerate(emails)
+        ])
+
+        rng = random.Random(options['seed'])
+        generator = Generator(rng, options)
+        totals = {}
+        for user in users:
+            importer = WorkspaceImporter(user)
+            for record in generator.records(heavy=rng.random() < options['heavy_editors']):
+                # Same NDJSON path as a real import
+                importer.feed(dump(record))
+            for kind, count in importer.finish().items():
+                totals[kind] = totals.get(kind, 0) + count
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users with {totals.get('notes', 0)} notes, "
+            f"{totals.get('versions', 0)} versions and {totals.get('snippets', 0)} snippets."
+        ))
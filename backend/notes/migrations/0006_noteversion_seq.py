@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_versions(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    NoteVersion = apps.get_model('notes', 'NoteVersion')
+    notes = Note.objects.filter(versions__isnull=False).distinct().only('id')
+    for note in notes.iterator(chunk_size=500):
+        versions = list(
+            NoteVersion.objects.filter(note=note).order_by('created_at', 'id').only('id')
+        )
+        for seq, version in enumerate(versions, start=1):
+            version.seq = seq
+        NoteVersion.objects.bulk_update(versions, ['seq'], batch_size=500)
+        note.version_count = len(versions)
+        note.save(update_fields=['version_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0005_delete_codesnippet'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='version_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='is_delta',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(number_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0006_noteversion_seq'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='noteversion',
+            constraint=models.UniqueConstraint(fields=('note', 'seq'), name='unique_note_version_seq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_trashed_notes(apps, schema_editor):
+    # The trash time was never recorded; the last update is the closest guess
+    Note = apps.get_model('notes', 'Note')
+    Note.objects.filter(deleted=True).update(deleted_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0010_uploadsession'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(stamp_trashed_notes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(('deleted', True)), fields=['deleted_at'], name='note_trashed_at_idx'),
+        ),
+    ]
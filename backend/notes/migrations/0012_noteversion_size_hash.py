@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:41
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def apply_delta(new, delta):
+    # A frozen copy of notes.versioning.apply_delta as of this migration, so
+    # later changes to the live module can't change what it does
+    new_lines = new.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(new_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def describe_versions(apps, schema_editor):
+    # Rebuild each note's chain newest first from the live content
+    Note = apps.get_model('notes', 'Note')
+    NoteVersion = apps.get_model('notes', 'NoteVersion')
+    notes = Note.objects.filter(version_count__gt=0).only('content')
+    for note in notes.iterator(chunk_size=500):
+        versions = list(NoteVersion.objects.filter(note=note).order_by('-seq').only('content', 'is_delta'))
+        content = note.content
+        for version in versions:
+            content = apply_delta(content, version.content) if version.is_delta else version.content
+            data = content.encode()
+            version.size = len(data)
+            version.content_hash = hashlib.sha256(data).hexdigest()
+        NoteVersion.objects.bulk_update(versions, ['size', 'content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0011_note_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='noteversion',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='noteversion',
+            name='size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(describe_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0012_noteversion_size_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='note',
+            name='last_versioned_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
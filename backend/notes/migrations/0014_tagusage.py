@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_tag_usage(apps, schema_editor):
+    Note = apps.get_model('notes', 'Note')
+    CodeSnippet = apps.get_model('snippets', 'CodeSnippet')
+    TagUsage = apps.get_model('notes', 'TagUsage')
+    usage = {}
+    for through, owner in [(Note.tags.through, 'note'), (CodeSnippet.tags.through, 'codesnippet')]:
+        rows = through.objects.values(f'{owner}__user_id', 'tag_id', 'tag__name').annotate(n=Count('pk'))
+        for row in rows.iterator():
+            key = (row[f'{owner}__user_id'], row['tag_id'])
+            name, count = usage.get(key, (row['tag__name'].lower(), 0))
+            usage[key] = (name, count + row['n'])
+    TagUsage.objects.bulk_create([
+        TagUsage(user_id=user_id, tag_id=tag_id, name=name, count=count)
+        for (user_id, tag_id), (name, count) in usage.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0013_note_last_versioned_at'),
+        ('snippets', '0003_snippethighlight'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='notes.tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'name'], name='tagusage_user_name_idx', opclasses=['int8_ops', 'varchar_pattern_ops'])],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tag'), name='tagusage_user_tag_uniq')],
+            },
+        ),
+        migrations.RunPython(count_tag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+import notes.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0014_tagusage'),
+    ]
+
+    operations = [
+        notes.compression.CompressTextColumn(
+            model_name='note',
+            name='content',
+            field=notes.compression.CompressedTextField(blank=True),
+        ),
+        notes.compression.CompressTextColumn(
+            model_name='noteversion',
+            name='content',
+            field=notes.compression.CompressedTextField(),
+        ),
+    ]
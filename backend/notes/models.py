@@ -1,30 +1,173 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.conf import settings
+from django.utils import timezone
+
+from .compression import CompressedTextField
 
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
 
+class TagUsage(models.Model):
+    """How many of a user's notes and snippets carry a tag.
+
+    Kept current by notes.tag_usage so tag suggestions never aggregate the
+    through tables. A row exists only while its count is positive.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tag_usage')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='usage')
+    # Lower-cased tag name, for index-backed prefix lookups
+    name = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='tagusage_user_tag_uniq'),
+        ]
+        indexes = [
+            # varchar_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%'
+            models.Index(fields=['user', 'name'], name='tagusage_user_name_idx',
+                         opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.count})"
+
 class Note(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notes')
     title = models.CharField(max_length=200)
-    content = models.TextField(blank=True)
+    content = CompressedTextField(blank=True)
     tags = models.ManyToManyField(Tag, related_name='notes', blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted = models.BooleanField(default=False)
+    # When the note was last moved to the trash; drives the purge in notes.retention
+    deleted_at = models.DateTimeField(null=True, blank=True)
     favorite = models.BooleanField(default=False)
+    version_count = models.PositiveIntegerField(default=0)
+    # When the newest version was recorded; autosaves coalesce into it until it is old enough
+    last_versioned_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Set by views before a save: who is editing, and whether the save must
+    # start a new version rather than coalesce into the newest one
+    edited_by = None
+    checkpoint = False
+
+    # Fields whose loaded values are remembered so a save can tell what changed
+    tracked_fields = ('title', 'content', 'deleted', 'version_count')
+    # Written only by saves that version the content, under the note's row lock
+    versioned_fields = ('content', 'version_count', 'last_versioned_at')
+
+    class Meta:
+        # Match the list filters so each cursor page is an index range scan
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='note_user_updated_idx'),
+            models.Index(fields=['user', 'deleted', 'updated_at', 'id'], name='note_user_deleted_idx'),
+            models.Index(fields=['user', 'favorite', 'updated_at', 'id'], name='note_user_favorite_idx'),
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted=True), name='note_trashed_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Exposed to signal receivers for the duration of the save
+        self.changed_fields = self.get_changed_fields(kwargs.get('update_fields'))
+        if 'deleted' in self.changed_fields:
+            self.stamp_deleted_at()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'deleted_at'}
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert') \
+                and not self.changed_fields & {'content', 'version_count'}:
+            # Leave the version chain alone: the loaded values may be stale by now,
+            # and writing them back would undo a concurrent save's version
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname in self.__dict__
+                and field.name not in self.versioned_fields
+            ]
+        try:
+            # Versioning locks the stored row in pre_save; hold it until the write lands
+            with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Note, instance=self),
+                                    savepoint=False):
+                super().save(*args, **kwargs)
+        finally:
+            # A later save_base() must not see this save's changes
+            del self.changed_fields
+        self.remember_loaded_values(kwargs.get('update_fields'))
+
+    def stamp_deleted_at(self, now=None):
+        # Keep the original time when an already-trashed note is saved again
+        if not self.deleted:
+            self.deleted_at = None
+        elif self.deleted_at is None:
+            self.deleted_at = now or timezone.now()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.remember_loaded_values(fields)
+
+    def remember_loaded_values(self, fields=None):
+        # Deferred fields are absent from __dict__ and stay untracked
+        loaded = getattr(self, '_loaded_values', {}) if fields is not None else {}
+        for name in self.tracked_fields:
+            if name in self.__dict__ and (fields is None or name in fields):
+                loaded[name] = self.__dict__[name]
+        self._loaded_values = loaded
+
+    def get_changed_fields(self, fields=None):
+        loaded = getattr(self, '_loaded_values', {})
+        changed = set()
+        for name in self.tracked_fields:
+            if fields is not None and name not in fields:
+                continue
+            if name not in self.__dict__:
+                continue
+            # Values that were never loaded can't be compared, so count them as changed
+            if self._state.adding or name not in loaded or loaded[name] != self.__dict__[name]:
+                changed.add(name)
+        return changed
+
 class NoteVersion(models.Model):
     note = models.ForeignKey('Note', on_delete=models.CASCADE, related_name='versions')
-    content = models.TextField()
+    seq = models.PositiveIntegerField(default=0)
+    # Full text for snapshots, a reverse diff against the next version otherwise
+    content = CompressedTextField()
+    is_delta = models.BooleanField(default=False)
+    # Describe the full text, so listings and diff caching never rebuild it
+    size = models.PositiveIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     edited_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['note', 'seq'], name='unique_note_version_seq'),
+        ]
+
+    def __str__(self):
+        return f"Version of {self.note.title} at {self.created_at}"
+
+class UploadSession(models.Model):
+    """A resumable upload whose chunks are appended to a part file."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"Version of {self.note.title} at {self.created_at}"
\ No newline at end of file
+        return f"{self.filename} ({self.received}/{self.size})"
@@ -0,0 +1,93 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class UpdatedAtCursorPagination(CursorPagination):
+    """Keyset pagination over ``(updated_at, id)``, most recently updated first.
+
+    A cursor holds the ``(updated_at, id)`` of the row a page ends on, and the
+    next page starts strictly after it in that order. Rows sharing a timestamp
+    are neither skipped nor repeated, and every page, however deep, is a range
+    scan on the composite ``(user, ..., updated_at, id)`` indexes with no
+    OFFSET. Every list is paged, ``page_size`` at a time unless the client
+    asks for another size.
+    """
+    ordering = ('-updated_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        # A chunk size lets aiterator() run the queryset's prefetches per chunk
+        page = self.page_queryset(queryset, request)
+        return self.finish_page([row async for row in page.aiterator(chunk_size=self.page_size + 1)])
+
+    def page_queryset(self, queryset, request):
+        """The page's rows plus one, which tells whether there are more."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        if self.cursor is not None:
+            updated_at, pk = self.decode_position(self.cursor.position)
+            if reverse:
+                queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk))
+        ordering = ('updated_at', 'id') if reverse else self.ordering
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.cursor is not None and self.cursor.reverse:
+            # Read oldest first to walk backwards; the page itself is newest first
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.page = rows
+        return rows
+
+    def position(self, row):
+        return f'{row.updated_at.isoformat()}|{row.pk}'
+
+    def decode_position(self, position):
+        timestamp, _, pk = (position or '').rpartition('|')
+        try:
+            updated_at = parse_datetime(timestamp)
+            pk = int(pk)
+        except ValueError:
+            updated_at = None
+        if updated_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return updated_at, pk
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.position(self.page[0])))
+
+
+class VersionCursorPagination(CursorPagination):
+    """Keyset pagination over a note's versions, newest first.
+
+    ``seq`` is unique per note, so DRF's cursor, which positions on the first
+    ordering field, never needs its offset, and each page is a range scan on
+    the ``(note, seq)`` constraint's index.
+    """
+    ordering = '-seq'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,94 @@
+"""
+Read replicas with read-your-writes.
+
+ReplicaRouter sends reads to a replica only while a view using
+ReplicaReadsMixin handles a list or retrieve request; everything else,
+every write included, goes to the primary. Replicas lag behind, so a user
+who just wrote could read the old rows back: each write to a user's data
+pins that user to the primary for REPLICA_PIN_SECONDS, which should cover
+normal replication lag. Pins live in the cache, so they hold across
+processes when Redis is configured.
+
+Tags are shared, so other users may list them from a replica that hasn't
+caught up with a new tag yet; they see it once the replica does.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from rest_framework.permissions import SAFE_METHODS
+
+from .transactions import AtomicWritesMixin
+
+# Replica the current request reads from, or None for the primary
+read_alias = ContextVar('replica_read_alias', default=None)
+
+
+def pin_key(user_id):
+    return f'replica-pin:user:{user_id}'
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to the primary for the next REPLICA_PIN_SECONDS."""
+    if not settings.REPLICA_DATABASES:
+        return
+
+    def set_pin():
+        cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+    # Again on commit, so the window starts once the write is visible
+    set_pin()
+    transaction.on_commit(set_pin)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id)) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadsMixin(AtomicWritesMixin):
+    """Read from a replica for ``replica_actions``, unless the user wrote recently.
+
+    Views that aren't viewsets have no action and read from a replica for
+    every safe method. Reads can't share a request transaction with the
+    primary, so this builds on AtomicWritesMixin.
+    """
+    replica_actions = ('list', 'retrieve')
+
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        self.writer_id = None
+        token = read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+            # Covers writes that no model signal pins for, such as new tags
+            if self.writer_id is not None:
+                pin(self.writer_id)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Authentication has run, so the user's pin can be checked
+        user_id = request.user.pk if request.user.is_authenticated else None
+        if request.method not in SAFE_METHODS:
+            self.writer_id = user_id
+            return
+        action = getattr(self, 'action', None)
+        if (settings.REPLICA_DATABASES and (action is None or action in self.replica_actions)
+                and not (user_id is not None and is_pinned(user_id))):
+            read_alias.set(random.choice(settings.REPLICA_DATABASES))
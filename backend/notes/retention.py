@@ -0,0 +1,236 @@
+"""
+Retention: purging old trash and sync tombstones, and thinning version history.
+
+Both passes work in small units so they can run against a live database:
+trash is purged a bounded batch of notes per transaction, and versions are
+thinned one note per transaction with that note's row locked. Deletes here
+skip model signals, so tombstones, the search index, tag usage counts and
+list caches are maintained explicitly, as in notes.bulk.
+"""
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Exists, Func, IntegerField, OuterRef, Q, Sum
+from django.utils import timezone
+
+from search.backends import remove_entries
+from sync.models import Tombstone
+from .cache import invalidate_user
+from .models import Note, NoteVersion
+from .replicas import pin
+from .tag_usage import adjust, negate, usage_of
+from .versioning import lock_note, materialize, reencode
+
+
+class OctetLength(Func):
+    """Stored size of a text column in bytes."""
+    function = 'OCTET_LENGTH'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='LENGTH(CAST(%(expressions)s AS BLOB))',
+                           **extra_context)
+
+
+class Epoch(Func):
+    """Whole seconds since the Unix epoch of a datetime column."""
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Escaped twice: once for this template, once for the query parameters
+        return self.as_sql(compiler, connection, template="CAST(STRFTIME('%%%%s', %(expressions)s) AS INTEGER)",
+                           **extra_context)
+
+
+def stored_bytes(queryset, *fields):
+    totals = queryset.aggregate(**{field: Sum(OctetLength(field)) for field in fields})
+    return sum(total or 0 for total in totals.values())
+
+
+def trashed_before(cutoff):
+    return Note.objects.filter(deleted=True, deleted_at__lt=cutoff)
+
+
+def purge_trash(cutoff, batch_size=500, dry_run=False):
+    """Hard-delete notes trashed before ``cutoff`` and return counts of what went."""
+    stats = Counter()
+    if dry_run:
+        notes = trashed_before(cutoff)
+        versions = NoteVersion.objects.filter(note__in=notes)
+        stats['notes'] = notes.count()
+        stats['versions'] = versions.count()
+        stats['bytes'] = stored_bytes(notes, 'title', 'content') + stored_bytes(versions, 'content')
+        return stats
+
+    while True:
+        with transaction.atomic():
+            # Skip notes another transaction holds, e.g. one being restored right now
+            batch = list(
+                trashed_before(cutoff)
+                .order_by('deleted_at')
+                .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+                .values_list('pk', 'user_id')[:batch_size]
+            )
+            if not batch:
+                break
+            ids = [pk for pk, _ in batch]
+            versions = NoteVersion.objects.filter(note_id__in=ids)
+            notes = Note.objects.filter(pk__in=ids)
+            stats['bytes'] += stored_bytes(notes, 'title', 'content') + stored_bytes(versions, 'content')
+            stats['versions'] += versions.delete()[0]
+            adjust(negate(usage_of(Note.tags.through, note_id__in=ids)))
+            Note.tags.through.objects.filter(note_id__in=ids).delete()
+            # A plain DELETE: QuerySet.delete() would load every note and send
+            # pre_delete and post_delete for each one, redoing per row the tag
+            # counts, tombstones, index entries and caches handled in bulk here.
+            # Versions and tag links, the only rows referencing notes, are gone.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'DELETE FROM {} WHERE {} IN ({})'.format(
+                        connection.ops.quote_name(Note._meta.db_table),
+                        connection.ops.quote_name(Note._meta.pk.column),
+                        ', '.join(['%s'] * len(ids)),
+                    ),
+                    ids,
+                )
+                stats['notes'] += cursor.rowcount
+            Tombstone.objects.bulk_create([
+                Tombstone(user_id=user_id, kind='note', object_id=pk) for pk, user_id in batch
+            ])
+            remove_entries('note', ids)
+            for user_id in {user_id for _, user_id in batch}:
+                invalidate_user(user_id)
+                pin(user_id)
+        if len(batch) < batch_size:
+            break
+    return stats
+
+
+def versions_to_keep(versions, now, policy):
+    """Return the ids of ``versions`` (newest first) that ``policy`` keeps.
+
+    ``policy`` is a sequence of ``(max_age, bucket)`` tiers, youngest first.
+    A version falls in the first tier whose ``max_age`` it is under (``None``
+    means no limit). A ``None`` bucket keeps every version in the tier;
+    otherwise only the newest version per bucket-sized window is kept.
+    Versions older than every tier are dropped. The newest version is
+    always kept.
+    """
+    keep = set()
+    seen = set()
+    for version in versions:
+        age = now - version.created_at
+        tier = next(
+            (index for index, (max_age, _) in enumerate(policy) if max_age is None or age < max_age),
+            None,
+        )
+        if tier is None:
+            continue
+        bucket = policy[tier][1]
+        if bucket is None:
+            keep.add(version.pk)
+            continue
+        window = (tier, int(version.created_at.timestamp() // bucket.total_seconds()))
+        if window not in seen:
+            seen.add(window)
+            keep.add(version.pk)
+    if versions:
+        keep.add(versions[0].pk)
+    return keep
+
+
+def thinnable_notes(now, policy):
+    """Ids of notes ``policy`` would drop a version from, worked out in SQL.
+
+    A version goes when it shares a bucket window with a newer one, or when
+    it is older than every tier and isn't its note's newest.
+    """
+    queries = []
+    lower = None
+    for max_age, bucket in policy:
+        if bucket is not None:
+            versions = NoteVersion.objects.all()
+            if lower is not None:
+                versions = versions.filter(created_at__lte=now - lower)
+            if max_age is not None:
+                versions = versions.filter(created_at__gt=now - max_age)
+            window = Epoch('created_at') / int(bucket.total_seconds())
+            queries.append(
+                versions.annotate(window=window).values('note_id', 'window')
+                .annotate(versions=Count('pk')).filter(versions__gt=1).values('note_id')
+            )
+        if max_age is None:
+            break
+        lower = max_age
+    else:
+        newer = NoteVersion.objects.filter(note_id=OuterRef('note_id'), seq__gt=OuterRef('seq'))
+        queries.append(
+            NoteVersion.objects.filter(Exists(newer), created_at__lte=now - lower).values('note_id')
+        )
+    if not queries:
+        return Note.objects.none().values_list('pk', flat=True)
+    notes = Note.objects.filter(reduce(or_, (Q(pk__in=query) for query in queries)))
+    return notes.order_by('pk').values_list('pk', flat=True)
+
+
+def thin_versions(now=None, policy=None, dry_run=False, chunk_size=500):
+    """Drop versions ``policy`` doesn't keep and re-encode what remains."""
+    now = now or timezone.now()
+    policy = policy or settings.NOTE_VERSION_RETENTION
+    stats = Counter()
+
+    for note_id in thinnable_notes(now, policy).iterator(chunk_size=chunk_size):
+        with transaction.atomic():
+            if dry_run:
+                note = Note.objects.only('content').filter(pk=note_id).first()
+            else:
+                note = lock_note(note_id, 'content')
+            if note is None:
+                continue
+            versions = NoteVersion.objects.filter(note=note).order_by('-seq')
+            # Decide on timestamps alone; bodies are read only if something goes
+            stamps = list(versions.only('pk', 'created_at'))
+            keep = versions_to_keep(stamps, now, policy)
+            if len(keep) == len(stamps):
+                continue
+            versions = list(versions)
+            before = sum(len(version.content.encode()) for version in versions)
+            materialize(note, versions)
+            kept = [version for version in versions if version.pk in keep]
+            changed = reencode(note, kept)
+            stats['notes'] += 1
+            stats['versions'] += len(versions) - len(kept)
+            stats['reencoded'] += len(changed)
+            stats['bytes'] += before - sum(len(version.content.encode()) for version in kept)
+            if not dry_run:
+                NoteVersion.objects.filter(note=note).exclude(pk__in=keep).delete()
+                NoteVersion.objects.bulk_update(changed, ['content', 'is_delta'], batch_size=chunk_size)
+    return stats
+
+
+def trash_cutoff(days=None, now=None):
+    days = settings.TRASH_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def tombstone_cutoff(now=None):
+    """Oldest ``since`` /api/sync/ accepts; tombstones before it can go."""
+    return (now or timezone.now()) - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def purge_tombstones(cutoff, batch_size=5000, dry_run=False):
+    """Delete tombstones older than ``cutoff`` and return how many went."""
+    expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+    if dry_run:
+        return expired.count()
+    purged = 0
+    while True:
+        ids = list(expired.order_by('deleted_at').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += Tombstone.objects.filter(pk__in=ids).delete()[0]
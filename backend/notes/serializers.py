@@ -1,21 +1,43 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from .models import Tag, Note, NoteVersion
+from django.conf import settings
+from metrics.middleware import TimedSerializerMixin
+from .models import Tag, Note, NoteVersion, UploadSession
+from .versioning import resolve_content
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
-class NoteSerializer(serializers.ModelSerializer):
+class ExpandTagsMixin:
+    """Embed tag objects instead of ids when the request has ``?expand=tags``.
+
+    Reads ``instance.tags.all()``, so views should ``prefetch_related('tags')``.
+    """
+
+    def expand_tags(self):
+        request = self.context.get('request')
+        if request is None:
+            return False
+        return 'tags' in request.query_params.get('expand', '').split(',')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.expand_tags():
+            data['tags'] = TagSerializer(instance.tags.all(), many=True).data
+        return data
+
+class NoteSerializer(TimedSerializerMixin, ExpandTagsMixin, serializers.ModelSerializer):
 
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Note
         fields = '__all__'
+        read_only_fields = ['version_count', 'deleted_at']
 
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
@@ -38,7 +60,32 @@ class NoteSerializer(serializers.ModelSerializer):
 
 
 
-class NoteVersionSerializer(serializers.ModelSerializer):
+class NoteVersionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    content = serializers.SerializerMethodField()
+
     class Meta:
         model = NoteVersion
-        fields = ['id', 'note', 'content', 'created_at', 'edited_by']
\ No newline at end of file
+        fields = ['id', 'note', 'content', 'created_at', 'edited_by', 'size', 'content_hash']
+
+    def get_content(self, obj):
+        return resolve_content(obj)
+
+
+class NoteVersionListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Version metadata only; fetch a version's detail for its content."""
+
+    class Meta:
+        model = NoteVersion
+        fields = ['id', 'note', 'created_at', 'edited_by', 'size', 'content_hash']
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'size', 'received']
+        read_only_fields = ['id', 'received']
+
+    def validate_size(self, value):
+        if value > settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes.')
+        return value
@@ -1,14 +1,81 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Note, NoteVersion
+from .cache import invalidate_tags, invalidate_user
+from .models import Note, Tag, TagUsage
+from .replicas import pin
+from .tag_usage import adjust, m2m_changes, negate, usage_of
+from .versioning import build_version, coalesce, lock_note, should_coalesce
 
 @receiver(pre_save, sender=Note)
-def save_note_version(sender, instance, **kwargs):
-    if instance.pk:
-        old_note = Note.objects.get(pk=instance.pk)
-        if old_note.content != instance.content:
-            NoteVersion.objects.create(
-                note=instance,
-                content=old_note.content,
-                # Optionally set edited_by here if you have user context
+def save_note_version(sender, instance, update_fields=None, raw=False, using=None, **kwargs):
+    if raw:
+        # Fixtures load rows as they are, history included
+        return
+    if not instance.pk or 'content' not in instance.__dict__:
+        # New note, or content was deferred and never assigned
+        return
+    if update_fields is not None and 'content' not in update_fields:
+        return
+    # The instance's loaded values may be stale by now: read the chain's head
+    # under a lock, so concurrent saves version one after the other
+    stored = lock_note(instance.pk, 'content', 'version_count', 'updated_at', 'last_versioned_at', using=using)
+    if stored is None:
+        return
+    old_content = stored.content
+    # Never write back a stale count, even when this save adds no version
+    instance.version_count = stored.version_count
+    instance.last_versioned_at = stored.last_versioned_at
+    if old_content != instance.content:
+        # auto_now sets the new value after pre_save; coalescing needs the stored one
+        instance.updated_at = stored.updated_at
+        editor = instance.edited_by
+        if should_coalesce(instance, editor) and coalesce(instance, old_content, instance.content, editor):
+            return
+        build_version(instance, old_content, instance.content, edited_by=editor).save()
+        if update_fields is not None and 'version_count' not in update_fields:
+            Note.objects.filter(pk=instance.pk).update(
+                version_count=instance.version_count, last_versioned_at=instance.last_versioned_at,
             )
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def invalidate_note_lists(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def invalidate_note_tag_lists(sender, instance, reverse, **kwargs):
+    if reverse:
+        # Changed from the tag's side, which may touch any user's notes
+        invalidate_tags()
+    else:
+        invalidate_user(instance.user_id)
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def pin_note_owner(sender, instance, **kwargs):
+    # Covers writes outside the viewsets, which pin their own writer
+    pin(instance.user_id)
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def pin_retagged_note_owner(sender, instance, reverse, **kwargs):
+    if not reverse:
+        pin(instance.user_id)
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def count_note_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    adjust(m2m_changes(sender, instance, action, reverse, pk_set))
+
+@receiver(pre_delete, sender=Note)
+def uncount_note_tags(sender, instance, **kwargs):
+    # The cascade removes the through rows without an m2m_changed signal
+    adjust(negate(usage_of(Note.tags.through, note_id=instance.pk)))
+
+@receiver(post_save, sender=Tag)
+def rename_tag_usage(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        TagUsage.objects.filter(tag=instance).update(name=instance.name.lower())
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_lists(sender, instance, **kwargs):
+    invalidate_tags()
@@ -0,0 +1,87 @@
+"""
+Per-user tag usage counts, maintained incrementally.
+
+Every write path that adds or removes tags from notes or snippets reports a
+Counter of ``(user_id, tag_id) -> delta`` to :func:`adjust`: m2m_changed and
+pre_delete receivers for ordinary saves, and notes.bulk, notes.retention and
+the workspace import for their bulk writes, which send no signals.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import F
+
+from .models import Tag, TagUsage
+
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+
+
+def adjust(changes):
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    added = {key for key, delta in changes.items() if delta > 0}
+    if added:
+        names = dict(Tag.objects.filter(pk__in={tag_id for _, tag_id in added}).values_list('pk', 'name'))
+        TagUsage.objects.bulk_create([
+            TagUsage(user_id=user_id, tag_id=tag_id, name=names[tag_id].lower())
+            for user_id, tag_id in added if tag_id in names
+        ], ignore_conflicts=True)
+    # Usually a single user gaining or losing a few tags, so this is one UPDATE
+    groups = defaultdict(list)
+    for (user_id, tag_id), delta in changes.items():
+        groups[user_id, delta].append(tag_id)
+    for (user_id, delta), tag_ids in groups.items():
+        TagUsage.objects.filter(user_id=user_id, tag_id__in=tag_ids).update(count=F('count') + delta)
+    removed = {key for key, delta in changes.items() if delta < 0}
+    for user_id in {user_id for user_id, _ in removed}:
+        TagUsage.objects.filter(
+            user_id=user_id, tag_id__in=[tag_id for owner, tag_id in removed if owner == user_id], count__lte=0,
+        ).delete()
+
+
+def owner_field(through):
+    """Name of the through model's foreign key to the note or snippet."""
+    return next(field.name for field in through._meta.fields
+                if field.is_relation and field.related_model is not Tag and not field.primary_key)
+
+
+def usage_of(through, **filters):
+    """Counter of ``(user_id, tag_id)`` over the through rows matching ``filters``."""
+    owner = owner_field(through)
+    return Counter(through.objects.filter(**filters).values_list(f'{owner}__user_id', 'tag_id'))
+
+
+def m2m_changes(through, instance, action, reverse, pk_set):
+    """Usage changes for an m2m_changed signal on a ``tags`` relation.
+
+    Adds are counted after they happen and removals before, so only rows that
+    really appeared or went are counted.
+    """
+    sign = {'post_add': 1, 'pre_remove': -1, 'pre_clear': -1}.get(action)
+    if sign is None or (pk_set is not None and not pk_set):
+        return Counter()
+    owner = owner_field(through)
+    if reverse:
+        filters = {'tag_id': instance.pk}
+        if pk_set is not None:
+            filters[f'{owner}_id__in'] = pk_set
+    else:
+        filters = {f'{owner}_id': instance.pk}
+        if pk_set is not None:
+            filters['tag_id__in'] = pk_set
+    usage = usage_of(through, **filters)
+    return Counter({key: sign * count for key, count in usage.items()})
+
+
+def negate(counter):
+    return Counter({key: -count for key, count in counter.items()})
+
+
+def suggest(user, prefix, limit=SUGGEST_LIMIT):
+    rows = (
+        TagUsage.objects.filter(user=user, name__startswith=prefix.strip().lower())
+        .order_by('-count', 'name')
+        .values_list('tag_id', 'tag__name', 'count')[:limit]
+    )
+    return [{'id': tag_id, 'name': name, 'count': count} for tag_id, name, count in rows]
@@ -1,3 +1,1316 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from snippets.models import CodeSnippet
+from sync.models import Tombstone
+from users.models import UserAccount
+from . import retention, thumbnails, uploads
+from .bulk import apply_operations
+from .cache import invalidate_user
+from .compression import RAW, ZLIB, ZSTD
+from .models import Note, NoteVersion, Tag, TagUsage, UploadSession
+from .replicas import is_pinned, pin_key
+from .retention import purge_trash, thin_versions, trash_cutoff, versions_to_keep
+from .versioning import apply_delta, encode, make_delta, materialize, resolve_content
+from .views import NoteViewSet
+
+
+class NoteSaveQueryTests(TestCase):
+    """Lock in the number of queries each kind of note write costs.
+
+    Writes that touch title, content or the trash flag also cost one search
+    index statement, and content changes read the stored row under a lock.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def setUp(self):
+        created = Note.objects.create(user=self.user, title='Draft', content='first')
+        self.note = Note.objects.get(pk=created.pk)
+
+    def test_create_inserts_the_note_and_its_index_entry(self):
+        with self.assertNumQueries(2):
+            Note.objects.create(user=self.user, title='Another', content='text')
+
+    def test_content_update_adds_the_locked_read_and_version_insert(self):
+        self.note.content = 'second'
+        with self.assertNumQueries(4):
+            self.note.save()
+        version = NoteVersion.objects.get(note=self.note)
+        self.assertEqual(resolve_content(version), 'first')
+
+    def test_favorite_toggle_skips_versioning(self):
+        self.note.favorite = True
+        with self.assertNumQueries(1):
+            self.note.save()
+        self.assertFalse(NoteVersion.objects.exists())
+
+    def test_trash_skips_versioning(self):
+        self.note.deleted = True
+        with self.assertNumQueries(2):
+            self.note.save()
+        self.assertFalse(NoteVersion.objects.exists())
+
+    def test_repeated_saves_track_the_saved_content(self):
+        self.note.content = 'second'
+        self.note.save()
+        self.note.content = 'third'
+        with self.assertNumQueries(4):
+            self.note.save()
+        self.assertEqual(
+            [resolve_content(v) for v in self.note.versions.order_by('seq')],
+            ['first', 'second'],
+        )
+
+    def test_interleaved_saves_version_one_after_the_other(self):
+        # Both loaded before either saves, as two concurrent requests would
+        first, second = Note.objects.get(pk=self.note.pk), Note.objects.get(pk=self.note.pk)
+        first.content = 'from first'
+        first.save()
+        second.content = 'from second'
+        second.save()
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.version_count, 2)
+        versions = list(self.note.versions.order_by('-seq'))
+        self.assertEqual(
+            [version.resolved_content for version in materialize(self.note, versions)],
+            ['from first', 'first'],
+        )
+
+    def test_stale_save_without_content_keeps_the_chain(self):
+        stale = Note.objects.get(pk=self.note.pk)
+        self.note.content = 'second'
+        self.note.save()
+        stale.favorite = True
+        stale.save()
+        stale.refresh_from_db()
+        self.assertEqual((stale.content, stale.version_count, stale.favorite), ('second', 1, True))
+
+    def test_unloaded_instance_falls_back_to_the_stored_row(self):
+        note = Note(pk=self.note.pk, content='replaced')
+        note.save(update_fields=['content'])
+        self.assertEqual(resolve_content(NoteVersion.objects.get(note=note)), 'first')
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.version_count, 1)
+
+
+class NoteListQueryTests(TestCase):
+    """The note list must cost the same number of queries whatever its size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.tags = [Tag.objects.create(name=f'tag-{i}') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_notes(self, count):
+        for i in range(count):
+            note = Note.objects.create(user=self.user, title=f'Note {i}', content='text')
+            note.tags.set(self.tags)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        for url in ['/api/notes/', '/api/notes/?expand=tags', '/api/notes/?page_size=50']:
+            with self.subTest(url=url):
+                Note.objects.all().delete()
+                self.add_notes(1)
+                baseline = self.count_queries(url)
+                self.add_notes(20)
+                self.assertEqual(self.count_queries(url), baseline)
+
+    def test_expand_embeds_tag_names(self):
+        self.add_notes(1)
+        response = self.client.get('/api/notes/?expand=tags')
+        self.assertEqual(
+            sorted(tag['name'] for tag in response.data['results'][0]['tags']),
+            ['tag-0', 'tag-1', 'tag-2'],
+        )
+
+
+class AsyncReadPathTests(TestCase):
+    """The /api/async/ read endpoints must return what the DRF views return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.tag = Tag.objects.create(name='tag')
+        for i in range(3):
+            note = Note.objects.create(user=cls.user, title=f'Note {i}', content='text')
+            note.tags.add(cls.tag)
+
+    def setUp(self):
+        token = AccessToken.for_user(self.user)
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_responses_match_the_sync_views(self):
+        note = Note.objects.first()
+        for sync_url, async_url in [
+            ('/api/notes/?expand=tags', '/api/async/notes/?expand=tags'),
+            ('/api/notes/?deleted=false&tag=%d' % self.tag.pk, '/api/async/notes/?deleted=false&tag=%d' % self.tag.pk),
+            (f'/api/notes/{note.pk}/', f'/api/async/notes/{note.pk}/'),
+        ]:
+            with self.subTest(url=async_url):
+                expected = self.client.get(sync_url)
+                response = self.client.get(async_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertJSONEqual(response.content, expected.json())
+
+    def test_pages_are_read_without_the_sync_paginator(self):
+        expected = self.client.get('/api/notes/?expand=tags').json()
+        with mock.patch('notes.pagination.UpdatedAtCursorPagination.paginate_queryset',
+                        side_effect=AssertionError('sync paginator used')):
+            response = self.client.get('/api/async/notes/?expand=tags')
+        self.assertEqual(response.status_code, 200)
+        self.assertJSONEqual(response.content, expected)
+        self.assertEqual([tag['id'] for tag in response.json()['results'][0]['tags']], [self.tag.pk])
+
+    def test_requires_a_token(self):
+        self.assertEqual(Client().get('/api/async/notes/').status_code, 401)
+
+    def test_other_users_notes_are_not_found(self):
+        other = UserAccount.objects.create_user('other@example.com', 'password')
+        note = Note.objects.create(user=other, title='Private', content='text')
+        self.assertEqual(self.client.get(f'/api/async/notes/{note.pk}/').status_code, 404)
+
+
+class CursorPaginationTests(TestCase):
+    """Lists are paged by keyset, stable across equal ``updated_at`` values."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, client=None):
+        client = client or self.client
+        ids, pages = [], 0
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [row['id'] for row in data['results']]
+            url, pages = data['next'], pages + 1
+        return ids, pages
+
+    def test_lists_are_paged_by_default(self):
+        Note.objects.bulk_create([Note(user=self.user, title=f'Note {i}', content='') for i in range(55)])
+        data = self.client.get('/api/notes/').json()
+        self.assertEqual(len(data['results']), 50)
+        self.assertIsNone(data['previous'])
+        self.assertEqual(len(self.client.get(data['next']).json()['results']), 5)
+        self.assertEqual(len(self.client.get('/api/notes/', {'page_size': 1000}).json()['results']), 55)
+
+    def test_pages_are_newest_first_and_ties_break_on_id(self):
+        notes = [Note.objects.create(user=self.user, title=f'Note {i}', content='') for i in range(8)]
+        now = timezone.now()
+        # Five notes saved in the same instant, straddling page boundaries
+        Note.objects.filter(pk__in=[note.pk for note in notes[1:6]]).update(updated_at=now)
+        Note.objects.filter(pk=notes[7].pk).update(updated_at=now - timedelta(days=1))
+        expected = list(Note.objects.order_by('-updated_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(self.walk('/api/notes/?page_size=3'), (expected, 3))
+
+        token = AccessToken.for_user(self.user)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.walk('/api/async/notes/?page_size=2', client), (expected, 4))
+
+    def test_previous_walks_back_over_ties_without_an_offset(self):
+        Note.objects.bulk_create([Note(user=self.user, title=f'Note {i}', content='') for i in range(7)])
+        # Every note saved in the same instant: only the id orders them
+        Note.objects.update(updated_at=timezone.now())
+        expected = list(Note.objects.order_by('-updated_at', '-id').values_list('pk', flat=True))
+        pages = []
+        url = '/api/notes/?page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertFalse([query for query in queries if 'OFFSET' in query['sql']])
+            pages.append([row['id'] for row in data['results']])
+            url = data['next']
+        self.assertEqual(sum(pages, []), expected)
+
+        back = []
+        while data['previous']:
+            data = self.client.get(data['previous']).json()
+            back.append([row['id'] for row in data['results']])
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/notes/', {'cursor': 'garbage'}).status_code, 404)
+
+    @override_settings(NOTE_VERSION_COALESCE_WINDOW=0)
+    def test_versions_are_paged_newest_first(self):
+        note = Note.objects.create(user=self.user, title='Draft', content='')
+        for i in range(7):
+            note.content = f'edit {i}'
+            note.save()
+        expected = list(note.versions.order_by('-seq').values_list('pk', flat=True))
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(self.walk(f'/api/notes/{note.pk}/versions/?page_size=3'), (expected, 3))
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def test_trashing_stamps_deleted_at_once(self):
+        note = Note.objects.create(user=self.user, title='Draft', content='text')
+        self.assertIsNone(note.deleted_at)
+        note.deleted = True
+        note.save()
+        trashed_at = note.deleted_at
+        self.assertIsNotNone(trashed_at)
+        note.title = 'Renamed in the trash'
+        note.save()
+        self.assertEqual(Note.objects.get(pk=note.pk).deleted_at, trashed_at)
+        note.deleted = False
+        note.save(update_fields=['deleted'])
+        self.assertIsNone(Note.objects.get(pk=note.pk).deleted_at)
+
+    def test_purge_removes_only_expired_trash(self):
+        now = timezone.now()
+        expired = Note.objects.create(user=self.user, title='Old', content='a')
+        expired.content = 'b'
+        expired.save()
+        recent = Note.objects.create(user=self.user, title='Recent', content='a', deleted=True)
+        live = Note.objects.create(user=self.user, title='Live', content='a')
+        Note.objects.filter(pk=expired.pk).update(deleted=True, deleted_at=now - timedelta(days=40))
+
+        stats = purge_trash(trash_cutoff(30, now), batch_size=1)
+
+        self.assertEqual((stats['notes'], stats['versions']), (1, 1))
+        self.assertQuerySetEqual(Note.objects.order_by('pk'), [recent, live])
+        self.assertTrue(Tombstone.objects.filter(kind='note', object_id=expired.pk).exists())
+
+    def test_thinning_keeps_the_policy_and_rebuilds_the_rest(self):
+        now = timezone.now()
+        note = Note.objects.create(user=self.user, title='Draft', content='line 0\n')
+        for i in range(1, 30):
+            note.content += f'line {i}\n'
+            note.save()
+        # One version every 8 hours going back from now
+        versions = list(NoteVersion.objects.filter(note=note).order_by('-seq'))
+        expected = {version.pk: resolve_content(version) for version in versions}
+        for i, version in enumerate(versions):
+            NoteVersion.objects.filter(pk=version.pk).update(created_at=now - timedelta(hours=8 * i))
+        policy = [(timedelta(days=1), None), (None, timedelta(days=2))]
+
+        stats = thin_versions(now=now, policy=policy)
+
+        remaining = list(NoteVersion.objects.filter(note=note).order_by('-seq'))
+        self.assertEqual(stats['versions'], len(versions) - len(remaining))
+        self.assertLess(len(remaining), len(versions))
+        # Three inside the first day, then at most one per two-day window
+        self.assertLessEqual(len(remaining), 3 + (8 * len(versions)) // 48 + 2)
+        note.refresh_from_db()
+        for version in materialize(note, remaining):
+            self.assertEqual(version.resolved_content, expected[version.pk])
+        for version in NoteVersion.objects.filter(note=note):
+            self.assertEqual(resolve_content(version), expected[version.pk])
+
+
+    @override_settings(NOTE_VERSION_COALESCE_WINDOW=0)
+    def test_only_notes_with_something_to_drop_are_thinned(self):
+        now = timezone.now().replace(minute=30, second=0, microsecond=0)
+
+        def note_with_versions(*hours_ago):
+            note = Note.objects.create(user=self.user, title='Note', content='0')
+            for i in range(1, len(hours_ago) + 1):
+                note.content = str(i)
+                note.save()
+            for version, hours in zip(note.versions.order_by('-seq'), hours_ago):
+                NoteVersion.objects.filter(pk=version.pk).update(created_at=now - timedelta(hours=hours))
+            return note
+
+        policy = [(timedelta(days=1), None), (timedelta(days=7), timedelta(hours=1)), (timedelta(days=30), None)]
+        same_hour = note_with_versions(1, 30, 30.2)
+        past_every_tier = note_with_versions(1, 24 * 40)
+        note_with_versions(1, 2, 3)
+        note_with_versions(30, 31, 32)
+        note_with_versions(24 * 40)
+        note_with_versions(24 * 10, 24 * 10.1)
+
+        candidates = set(retention.thinnable_notes(now, policy))
+        expected = {
+            note.pk for note in Note.objects.all()
+            if len(versions_to_keep(list(note.versions.order_by('-seq')), now, policy)) < note.versions.count()
+        }
+        self.assertEqual(candidates, expected)
+        self.assertEqual(candidates, {same_hour.pk, past_every_tier.pk})
+
+        self.assertEqual(thin_versions(now=now, policy=policy)['notes'], 2)
+        self.assertEqual(set(retention.thinnable_notes(now, policy)), set())
+        self.assertEqual(thin_versions(now=now, policy=policy), {})
+
+DELTA_CASES = [
+    ('', ''),
+    ('one\ntwo\n', ''),
+    ('', 'one\ntwo\n'),
+    ('one\ntwo\nthree\n', 'one\nthree\n'),
+    ('one\nthree\n', 'one\ntwo\nthree\n'),
+    ('no trailing newline', 'no trailing newline\nadded'),
+    ('a\r\nb\r\n', 'a\nb\n'),
+    ('naïve café\n☕\n', 'naïve cafe\n☕\n\n'),
+    ('\n'.join(map(str, range(100))), '\n'.join(map(str, range(0, 100, 3)))),
+]
+
+
+@override_settings(NOTE_VERSION_COALESCE_WINDOW=0, NOTE_VERSION_SNAPSHOT_INTERVAL=3)
+class VersionEncodingTests(TestCase):
+    """Reverse diffs must rebuild exactly the content they replaced."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def history(self, count):
+        contents = ['title\n' + ''.join(f'line {j}\n' for j in range(10 + i * 5)) for i in range(count + 1)]
+        note = Note.objects.create(user=self.user, title='Draft', content=contents[0])
+        for content in contents[1:]:
+            note.content = content
+            note.save()
+        # Version n holds the content from before edit n
+        return note, contents[:-1]
+
+    def test_deltas_round_trip(self):
+        frozen = importlib.import_module('notes.migrations.0012_noteversion_size_hash').apply_delta
+        for new, old in DELTA_CASES:
+            with self.subTest(new=new[:20], old=old[:20]):
+                delta = make_delta(new, old)
+                self.assertEqual(apply_delta(new, delta), old)
+                # The data migration's copy reads what the live code writes
+                self.assertEqual(frozen(new, delta), old)
+
+    def test_every_interval_th_version_is_a_snapshot(self):
+        note, contents = self.history(8)
+        versions = list(note.versions.order_by('seq'))
+        self.assertEqual([version.seq for version in versions if not version.is_delta], [3, 6])
+        for version, content in zip(versions, contents):
+            self.assertEqual(resolve_content(NoteVersion.objects.get(pk=version.pk)), content)
+
+    def test_full_copy_when_a_delta_would_be_larger(self):
+        self.assertEqual(encode(1, 'short', 'completely different\n'), ('short', False))
+        old = ''.join(f'line {i}\n' for i in range(50))
+        content, is_delta = encode(1, old, old + 'appended\n')
+        self.assertTrue(is_delta)
+        self.assertLess(len(content), len(old))
+        self.assertEqual(encode(3, old, old + 'appended\n'), (old, False))
+
+    def test_compaction_reencodes_for_the_current_interval(self):
+        note, contents = self.history(8)
+        stored = {version.pk: (version.content, version.is_delta) for version in note.versions.all()}
+
+        with override_settings(NOTE_VERSION_SNAPSHOT_INTERVAL=4):
+            out = StringIO()
+            call_command('compact_note_versions', '--dry-run', stdout=out)
+            self.assertIn('Would re-encode', out.getvalue())
+            self.assertEqual({v.pk: (v.content, v.is_delta) for v in note.versions.all()}, stored)
+
+            call_command('compact_note_versions', stdout=StringIO())
+            versions = list(note.versions.order_by('seq'))
+            self.assertEqual([version.seq for version in versions if not version.is_delta], [4, 8])
+            for version, content in zip(versions, contents):
+                self.assertEqual(resolve_content(NoteVersion.objects.get(pk=version.pk)), content)
+
+            out = StringIO()
+            call_command('compact_note_versions', stdout=out)
+            self.assertIn('Re-encoded 0 versions', out.getvalue())
+
+
+class VersionHistoryTests(TestCase):
+    """The version list is metadata only; diffs are built server-side."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.note = Note.objects.create(user=cls.user, title='Draft', content='the quick fox\n')
+        for content in ['the quick brown fox\n', 'the slow brown fox\njumps\n']:
+            cls.note.content = content
+            cls.note.save()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.versions = list(NoteVersion.objects.filter(note=self.note).order_by('seq'))
+
+    def test_list_carries_size_and_hash_but_no_content(self):
+        response = self.client.get(f'/api/notes/{self.note.pk}/versions/')
+        self.assertEqual(response.status_code, 200)
+        newest = response.json()['results'][0]
+        self.assertNotIn('content', newest)
+        self.assertEqual(newest['size'], len('the quick brown fox\n'))
+        self.assertEqual(len(newest['content_hash']), 64)
+
+    def test_diff_between_two_versions(self):
+        old, new = self.versions
+        url = f'/api/notes/{self.note.pk}/versions/{old.pk}/diff/{new.pk}/'
+
+        unified = self.client.get(url).json()['diff']
+        self.assertIn('-the quick fox', unified)
+        self.assertIn('+the quick brown fox', unified)
+
+        words = self.client.get(url, {'mode': 'word'}).json()['diff']
+        self.assertIn(['insert', 'brown '], words)
+        self.assertEqual(''.join(text for op, text in words if op != 'insert'), 'the quick fox\n')
+
+        self.assertEqual(self.client.get(url, {'mode': 'chars'}).status_code, 400)
+
+    def test_other_users_versions_are_not_found(self):
+        other = UserAccount.objects.create_user('other@example.com', 'password')
+        self.client.force_authenticate(other)
+        old, new = self.versions
+        self.assertEqual(self.client.get(f'/api/notes/{self.note.pk}/versions/').status_code, 404)
+        url = f'/api/notes/{self.note.pk}/versions/{old.pk}/diff/{new.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class VersionCoalescingTests(TestCase):
+    """Autosaves by one user fold into the newest version until a checkpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.note = Note.objects.create(user=self.user, title='Draft', content='start\n')
+
+    def autosave(self, content):
+        response = self.client.patch(f'/api/notes/{self.note.pk}/', {'content': content}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def age(self, **fields):
+        Note.objects.filter(pk=self.note.pk).update(**fields)
+
+    def versions(self):
+        return list(NoteVersion.objects.filter(note=self.note).order_by('-seq'))
+
+    def test_a_burst_of_autosaves_keeps_one_version(self):
+        text = 'start\n'
+        for i in range(20):
+            text += f'line {i}\n'
+            self.autosave(text)
+        versions = self.versions()
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(resolve_content(versions[0]), 'start\n')
+        self.assertEqual(versions[0].edited_by, self.user)
+
+    def test_checkpoints(self):
+        self.autosave('one')
+        self.autosave('two')
+        self.assertEqual(len(self.versions()), 1)
+
+        # A pause longer than the window
+        self.age(updated_at=timezone.now() - timedelta(minutes=10))
+        self.autosave('three')
+        self.assertEqual(len(self.versions()), 2)
+
+        # Typing non-stop past the checkpoint interval
+        self.age(last_versioned_at=timezone.now() - timedelta(hours=1))
+        self.autosave('four')
+        self.assertEqual(len(self.versions()), 3)
+
+        # Another user's edit, and a save with no known editor
+        other = UserAccount.objects.create_user('other@example.com', 'password')
+        self.note.refresh_from_db()
+        self.note.content = 'five\n'
+        self.note.edited_by = other
+        self.note.save()
+        note = Note.objects.get(pk=self.note.pk)
+        note.content = 'six\n'
+        note.save()
+
+        versions = self.versions()
+        self.assertEqual(len(versions), 5)
+        note.refresh_from_db()
+        self.assertEqual(
+            [version.resolved_content for version in materialize(note, versions)],
+            ['five\n', 'four', 'three', 'two', 'start\n'],
+        )
+
+    def test_stale_autosave_coalesces_against_the_stored_content(self):
+        stale = Note.objects.get(pk=self.note.pk)
+        self.autosave('one\n')
+        self.autosave('two\n')
+        stale.content = 'three\n'
+        stale.edited_by = self.user
+        stale.save()
+        versions = self.versions()
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(resolve_content(versions[0]), 'start\n')
+
+    def test_restore_is_its_own_version(self):
+        self.autosave('one')
+        self.autosave('two')
+        first = self.versions()[0]
+        response = self.client.post(f'/api/notes/{self.note.pk}/restore/{first.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.content, 'start\n')
+        self.assertEqual(resolve_content(self.versions()[0]), 'two')
+
+
+class TagUsageTests(TestCase):
+    """Usage counts must match the through tables after every kind of write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+        cls.python, cls.pandas, cls.rust = [Tag.objects.create(name=name) for name in ['Python', 'pandas', 'rust']]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCountsMatch(self):
+        expected = {}
+        for through, owner in [(Note.tags.through, 'note'), (CodeSnippet.tags.through, 'codesnippet')]:
+            for user_id, tag_id in through.objects.values_list(f'{owner}__user_id', 'tag_id'):
+                expected[user_id, tag_id] = expected.get((user_id, tag_id), 0) + 1
+        self.assertEqual(
+            {(usage.user_id, usage.tag_id): usage.count for usage in TagUsage.objects.all()}, expected,
+        )
+
+    def test_counts_follow_every_write_path(self):
+        note = Note.objects.create(user=self.user, title='a')
+        note.tags.set([self.python, self.pandas])
+        note.tags.add(self.python)
+        note.tags.remove(self.rust)
+        snippet = CodeSnippet.objects.create(user=self.user, title='s', code='print()')
+        snippet.tags.add(self.python)
+        self.rust.notes.add(note, Note.objects.create(user=self.other, title='b'))
+        self.assertCountsMatch()
+        self.assertEqual(TagUsage.objects.get(user=self.user, tag=self.python).count, 2)
+
+        self.client.post('/api/notes/bulk/', {'operations': [
+            {'op': 'create', 'title': 'c', 'tags': [self.rust.pk]},
+            {'op': 'tag', 'id': note.pk, 'remove': [self.pandas.pk]},
+        ]}, format='json')
+        self.assertCountsMatch()
+        self.assertFalse(TagUsage.objects.filter(tag=self.pandas).exists())
+
+        self.rust.notes.clear()
+        snippet.delete()
+        note.delete()
+        self.assertCountsMatch()
+
+    def test_suggest_is_scoped_and_ranked(self):
+        for _ in range(2):
+            Note.objects.create(user=self.user, title='a').tags.add(self.pandas)
+        Note.objects.create(user=self.user, title='b').tags.add(self.python)
+        Note.objects.create(user=self.other, title='c').tags.add(self.rust)
+
+        response = self.client.get('/api/tags/suggest/', {'prefix': 'P'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'id': self.pandas.pk, 'name': 'pandas', 'count': 2},
+            {'id': self.python.pk, 'name': 'Python', 'count': 1},
+        ])
+        self.assertEqual(self.client.get('/api/tags/suggest/', {'prefix': 'ru'}).json(), [])
+
+
+class QueryPlanTests(TestCase):
+    """Every query behind the hot endpoints must be answered from an index.
+
+    Each endpoint is requested once while its SQL is recorded, then every
+    SELECT is explained. On PostgreSQL sequential scans are disabled for the
+    EXPLAIN, so a Seq Scan in the plan means no index could serve the query
+    at all; SQLite reports a full table scan as ``SCAN <table>``. Walking a
+    whole index counts as a full scan too.
+    """
+    # Tables that grow with usage; small lookup tables may be scanned
+    HOT_TABLES = {
+        'notes_note', 'notes_noteversion', 'notes_note_tags', 'notes_tagusage',
+        'snippets_codesnippet', 'snippets_codesnippet_tags', 'snippets_snippetbucket', 'sync_tombstone',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        other = UserAccount.objects.create_user('other@example.com', 'password')
+        cls.tag = Tag.objects.create(name='python')
+        for owner in [cls.user, other]:
+            for i in range(30):
+                note = Note.objects.create(user=owner, title=f'Note {i}', content=f'line {i}\n',
+                                           favorite=i % 3 == 0, deleted=i % 5 == 0)
+                note.tags.add(cls.tag)
+                note.content += 'more\n'
+                note.save()
+                snippet = CodeSnippet.objects.create(user=owner, title=f'Snippet {i}', code=f'print({i})')
+                snippet.tags.add(cls.tag)
+        cls.note = Note.objects.filter(user=cls.user).first()
+        cls.snippet = CodeSnippet.objects.filter(user=cls.user).first()
+        cls.version = NoteVersion.objects.filter(note=cls.note).first()
+
+    def setUp(self):
+        # A real token rather than force_authenticate, which the async views don't see
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def recorded_selects(self, action):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            action()
+        return queries
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                with transaction.atomic():
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                    plan = cursor.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                nodes, scans = [plan[0]['Plan']], []
+                while nodes:
+                    node = nodes.pop()
+                    nodes.extend(node.get('Plans', []))
+                    # An index scan with no condition only walks the index in order
+                    if node['Node Type'] == 'Seq Scan' or (
+                            node['Node Type'] in ('Index Scan', 'Index Only Scan') and 'Index Cond' not in node):
+                        scans.append(node['Relation Name'])
+                return scans
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            # Subqueries name their tables by alias, e.g. "notes_note" U0
+            aliases = dict((alias, table) for table, alias in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql))
+            # SCAN reads the whole table or the whole of one of its indexes
+            return [aliases.get(match.group(1), match.group(1)) for *_, detail in cursor.fetchall()
+                    if (match := re.match(r'SCAN (\w+)\b', detail))]
+
+    def test_hot_endpoints_use_indexes(self):
+        urls = [
+            '/api/notes/', '/api/notes/?deleted=false', '/api/notes/?deleted=true',
+            '/api/notes/?favorite=true', f'/api/notes/?tag={self.tag.pk}', f'/api/notes/{self.note.pk}/',
+            '/api/notes/?deleted=false&favorite=true&page_size=10',
+            f'/api/notes/{self.note.pk}/versions/', f'/api/notes/{self.note.pk}/versions/{self.version.pk}/',
+            f'/api/notes/{self.note.pk}/versions/{self.version.pk}/diff/{self.version.pk}/',
+            '/api/snippets/', f'/api/snippets/?tag={self.tag.pk}', f'/api/snippets/{self.snippet.pk}/similar/',
+            '/api/tags/suggest/?prefix=py', '/api/sync/', '/api/search/?q=line', '/api/export/',
+            '/api/async/notes/', f'/api/async/notes/{self.note.pk}/', '/api/async/snippets/',
+            '/api/sync/?' + urlencode({'since': timezone.now().isoformat()}),
+        ]
+        for url in urls:
+            for sql, params in self.recorded_selects(lambda: self.get(url)):
+                self.assertNoFullScans(sql, params, url=url)
+
+    def assertNoFullScans(self, sql, params, **context):
+        scanned = set(self.full_scans(sql, params)) & self.HOT_TABLES
+        with self.subTest(sql=sql, **context):
+            self.assertFalse(scanned, f'full scan of {", ".join(sorted(scanned))}')
+
+
+class BulkOperationTests(TestCase):
+    """Bulk writes cost a fixed number of queries however many notes they touch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+        cls.tags = [Tag.objects.create(name=f'tag-{i}') for i in range(2)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_notes(self, count, **fields):
+        notes = Note.objects.bulk_create([
+            Note(user=self.user, title=f'Note {i}', content='text', **fields) for i in range(count)
+        ])
+        return [note.pk for note in notes]
+
+    def bulk(self, operations, queries=None):
+        context = CaptureQueriesContext(connection) if queries is None else self.assertNumQueries(queries)
+        with context:
+            response = self.client.post('/api/notes/bulk/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], [query['sql'] for query in context.captured_queries]
+
+    def updates(self, statements):
+        return [sql for sql in statements if sql.startswith('UPDATE "notes_note"')]
+
+    # Batches small enough that SQLite doesn't split a statement on its
+    # parameter limit. Each op is the SELECT, UPDATE and search index
+    # statement inside the view's and the batch's savepoints.
+
+    def test_trash_costs_the_same_for_any_number_of_notes(self):
+        for count in (1, 150):
+            with self.subTest(count=count):
+                ids = self.add_notes(count)
+                results, statements = self.bulk([{'op': 'trash', 'id': pk} for pk in ids], queries=7)
+                self.assertEqual({result['status'] for result in results}, {'ok'})
+                self.assertNotIn('"content"', self.updates(statements)[0])
+                self.assertNotIn('"title"', self.updates(statements)[0])
+        self.assertEqual(Note.objects.filter(deleted=True, deleted_at__isnull=False).count(), 151)
+
+    def test_restore_costs_the_same_for_any_number_of_notes(self):
+        for count in (1, 150):
+            with self.subTest(count=count):
+                ids = self.add_notes(count, deleted=True, deleted_at=timezone.now())
+                results, statements = self.bulk([{'op': 'restore', 'id': pk} for pk in ids], queries=7)
+                self.assertEqual({result['status'] for result in results}, {'ok'})
+                self.assertNotIn('"content"', self.updates(statements)[0])
+        self.assertFalse(Note.objects.filter(deleted=True).exists())
+        self.assertFalse(Note.objects.filter(deleted_at__isnull=False).exists())
+
+    def test_tag_costs_the_same_for_any_number_of_notes(self):
+        tag, old = self.tags
+        for count in (1, 150):
+            with self.subTest(count=count):
+                ids = self.add_notes(count)
+                for note in Note.objects.filter(pk__in=ids):
+                    note.tags.add(old)
+                # Notes, tags, touch, current links, unlink, link, then the usage counts
+                results, statements = self.bulk(
+                    [{'op': 'tag', 'id': pk, 'add': [tag.pk], 'remove': [old.pk]} for pk in ids], queries=15,
+                )
+                self.assertEqual({result['status'] for result in results}, {'ok'})
+                self.assertEqual([sql for sql in self.updates(statements) if '"content"' in sql or '"title"' in sql],
+                                 [])
+        self.assertEqual(set(Note.tags.through.objects.values_list('tag_id', flat=True)), {tag.pk})
+        self.assertEqual(list(TagUsage.objects.filter(user=self.user).values_list('tag', 'count')), [(tag.pk, 151)])
+
+    def test_mixed_batch(self):
+        first, second, third = self.add_notes(3)
+        results, statements = self.bulk([
+            {'op': 'create', 'title': 'Created', 'tags': [self.tags[0].pk]},
+            {'op': 'update', 'id': first, 'content': 'edited'},
+            {'op': 'update', 'id': second, 'favorite': True},
+            {'op': 'trash', 'id': third},
+            {'op': 'tag', 'id': second, 'add': [self.tags[1].pk]},
+        ])
+        self.assertEqual([result['status'] for result in results], ['ok'] * 5)
+        # One UPDATE per set of changed fields: content, favorite, trash
+        updates = self.updates(statements)
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(sum('"content"' in sql for sql in updates), 1)
+
+        created = Note.objects.get(title='Created')
+        self.assertEqual(list(created.tags.all()), [self.tags[0]])
+        edited = Note.objects.get(pk=first)
+        self.assertEqual((edited.content, edited.version_count), ('edited', 1))
+        self.assertEqual(resolve_content(edited.versions.get()), 'text')
+        self.assertTrue(Note.objects.get(pk=second).favorite)
+        self.assertEqual(list(Note.objects.get(pk=second).tags.all()), [self.tags[1]])
+        self.assertTrue(Note.objects.get(pk=third).deleted)
+
+    def test_other_users_notes_are_rejected(self):
+        mine = self.add_notes(1)[0]
+        theirs = Note.objects.create(user=self.other, title='Theirs', content='text')
+        results, _ = self.bulk([
+            {'op': 'trash', 'id': mine},
+            {'op': 'trash', 'id': theirs.pk},
+            {'op': 'update', 'id': theirs.pk, 'content': 'mine now'},
+            {'op': 'tag', 'id': mine, 'add': [999999]},
+        ])
+        self.assertEqual([result['status'] for result in results], ['ok', 'error', 'error', 'error'])
+        self.assertEqual(results[1]['errors'], {'id': 'Note not found.'})
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.deleted, theirs.content, theirs.version_count), (False, 'text', 0))
+        self.assertTrue(Note.objects.get(pk=mine).deleted)
+        self.assertFalse(Note.tags.through.objects.exists())
+
+    def test_operation_limits(self):
+        response = self.client.post('/api/notes/bulk/', {'operations': [{'op': 'trash', 'id': 1}] * 1001},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        results, _ = self.bulk([{'op': 'explode', 'id': 1}, {'op': 'update'}])
+        self.assertEqual([result['status'] for result in results], ['error', 'error'])
+
+
+@override_settings(LIST_CACHE_TIMEOUT=300)
+class ListCacheTests(TestCase):
+    """Repeat list requests come from the cache until the user writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        self.note = Note.objects.create(user=self.user, title='First', content='text')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def titles(self, url='/api/notes/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(note['title'] for note in response.data['results'])
+
+    def test_hit_runs_no_queries(self):
+        self.titles()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['First'])
+
+    def test_writes_invalidate_the_list(self):
+        self.assertEqual(self.titles(), ['First'])
+        self.client.post('/api/notes/', {'title': 'Second', 'content': ''}, format='json')
+        self.assertEqual(self.titles(), ['First', 'Second'])
+        self.client.patch(f'/api/notes/{self.note.pk}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(self.titles(), ['Renamed', 'Second'])
+        self.client.delete(f'/api/notes/{self.note.pk}/')
+        self.assertEqual(self.titles('/api/notes/?deleted=true'), ['Renamed'])
+        self.assertEqual(self.titles('/api/notes/?deleted=false'), ['Second'])
+        self.client.post('/api/notes/bulk/', {'operations': [{'op': 'restore', 'id': self.note.pk}]}, format='json')
+        self.assertEqual(self.titles('/api/notes/?deleted=false'), ['Renamed', 'Second'])
+
+    def test_changes_outside_the_api_invalidate_the_list(self):
+        self.titles()
+        Note.objects.create(user=self.user, title='Imported', content='')
+        self.assertEqual(self.titles(), ['First', 'Imported'])
+        self.note.tags.add(Tag.objects.create(name='work'))
+        response = self.client.get('/api/notes/?expand=tags')
+        self.assertEqual([tag['name'] for note in response.data['results'] for tag in note['tags']], ['work'])
+
+    def test_other_users_writes_leave_the_cache_alone(self):
+        other = UserAccount.objects.create_user('other@example.com', 'password')
+        self.titles()
+        Note.objects.create(user=other, title='Theirs', content='')
+        with self.assertNumQueries(0):
+            self.titles()
+
+    @override_settings(LIST_CACHE_TIMEOUT=0)
+    def test_disabled_without_a_shared_cache(self):
+        self.titles()
+        with CaptureQueriesContext(connection) as queries:
+            self.titles()
+        self.assertTrue(queries)
+
+
+class RequestTransactionTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def transaction_depths(self, method, url, **kwargs):
+        """Atomic blocks open around each query, beyond the test's own."""
+        depths = []
+        outer = len(connection.atomic_blocks)
+
+        def record(execute, sql, params, many, context):
+            if 'SAVEPOINT' not in sql:
+                depths.append(len(connection.atomic_blocks) - outer)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = getattr(self.client, method)(url, format='json', **kwargs)
+        return response, set(depths)
+
+    def test_reads_run_outside_a_transaction(self):
+        Note.objects.create(user=self.user, title='Read', content='text')
+        response, depths = self.transaction_depths('get', '/api/notes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depths, {0})
+
+    def test_writes_are_atomic(self):
+        response, depths = self.transaction_depths('post', '/api/notes/', data={'title': 'New', 'content': 'text'})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(0, depths)
+
+    def test_error_response_rolls_back_the_write(self):
+        def save_then_fail(view, serializer):
+            serializer.save(user=self.user)
+            raise ValidationError('Rejected after saving.')
+
+        with mock.patch.object(NoteViewSet, 'perform_create', save_then_fail):
+            response = self.client.post('/api/notes/', {'title': 'New', 'content': 'text'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Note.objects.filter(user=self.user).exists())
+
+
+@skipUnless(settings.REPLICA_DATABASES, 'set DATABASE_REPLICAS to route reads to a replica')
+class ReplicaRoutingTests(TransactionTestCase):
+    """Replicas mirror the primary under test; what's checked is where each read was routed.
+
+    Writes are committed so the mirror connections see them.
+    """
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def setUp(self):
+        self.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def read_aliases(self, method, url, **kwargs):
+        aliases = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                aliases.append(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in self.databases:
+                stack.enter_context(connections[alias].execute_wrapper(record))
+            response = getattr(self.client, method)(url, format='json', **kwargs)
+        self.assertLess(response.status_code, 400)
+        return set(aliases)
+
+    def assertReadsFromReplicas(self, aliases):
+        self.assertTrue(aliases)
+        self.assertLessEqual(aliases, set(settings.REPLICA_DATABASES))
+
+    def test_lists_and_details_read_from_a_replica(self):
+        note = Note.objects.create(user=self.user, title='Read', content='text')
+        cache.delete(pin_key(self.user.pk))
+        self.assertReadsFromReplicas(self.read_aliases('get', '/api/notes/'))
+        self.assertReadsFromReplicas(self.read_aliases('get', f'/api/notes/{note.pk}/'))
+        self.assertReadsFromReplicas(self.read_aliases('get', f'/api/notes/{note.pk}/versions/'))
+        # Other actions stay on the primary
+        self.assertEqual(self.read_aliases('get', '/api/tags/suggest/'), {'default'})
+
+    def test_writer_reads_from_the_primary_until_the_pin_expires(self):
+        self.assertReadsFromReplicas(self.read_aliases('get', '/api/tags/'))
+        self.assertEqual(self.read_aliases('post', '/api/tags/', data={'name': 'python'}), {'default'})
+        self.assertEqual(self.read_aliases('get', '/api/tags/'), {'default'})
+
+        cache.delete(pin_key(self.user.pk))
+        self.assertReadsFromReplicas(self.read_aliases('get', '/api/tags/'))
+
+    def test_writes_outside_the_viewsets_pin_the_owner(self):
+        note = Note.objects.create(user=self.user, title='Note', content='first')
+        cache.delete(pin_key(self.user.pk))
+        note.content = 'second'
+        note.save()
+        self.assertTrue(is_pinned(self.user.pk))
+        self.assertEqual(self.read_aliases('get', f'/api/notes/{note.pk}/versions/'), {'default'})
+
+    def test_bulk_writes_and_retags_pin_the_owner(self):
+        note = Note.objects.create(user=self.user, title='Note', content='text')
+        cache.delete(pin_key(self.user.pk))
+        note.tags.add(Tag.objects.create(name='work'))
+        self.assertTrue(is_pinned(self.user.pk))
+
+        cache.delete(pin_key(self.user.pk))
+        apply_operations(self.user, [{'op': 'trash', 'id': note.pk}])
+        self.assertTrue(is_pinned(self.user.pk))
+
+    def test_list_invalidation_alone_does_not_pin(self):
+        invalidate_user(self.user.pk)
+        self.assertFalse(is_pinned(self.user.pk))
+
+
+@override_settings(TEXT_COMPRESSION_THRESHOLD=64)
+class CompressedTextTests(TestCase):
+    def setUp(self):
+        self.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def stored(self, note):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT content FROM notes_note WHERE id = %s', [note.pk])
+            return bytes(cursor.fetchone()[0])
+
+    def test_long_text_is_compressed_and_reads_back(self):
+        content = 'the same line over and over\n' * 50
+        note = Note.objects.create(user=self.user, title='Long', content=content)
+        stored = self.stored(note)
+        self.assertEqual(stored[0], ZSTD)
+        self.assertLess(len(stored), len(content) // 4)
+        self.assertEqual(Note.objects.get(pk=note.pk).content, content)
+        self.assertEqual(Note.objects.values_list('content', flat=True).get(pk=note.pk), content)
+
+    def test_short_text_is_stored_raw(self):
+        note = Note.objects.create(user=self.user, title='Short', content='héllo')
+        self.assertEqual(self.stored(note), bytes([RAW]) + 'héllo'.encode())
+
+    def test_every_codec_stays_readable(self):
+        content = 'zlib wrote this one\n' * 20
+        with self.settings(TEXT_COMPRESSION_CODEC='zlib'):
+            note = Note.objects.create(user=self.user, title='Old', content=content)
+        self.assertEqual(self.stored(note)[0], ZLIB)
+        self.assertEqual(Note.objects.get(pk=note.pk).content, content)
+
+    def test_command_compresses_existing_rows(self):
+        content = 'written before compression\n' * 20
+        note = Note.objects.create(user=self.user, title='Legacy', content='')
+        version = NoteVersion.objects.create(note=note, content=content)
+        # As the column conversion leaves rows: plain text on SQLite, raw elsewhere
+        legacy = content if connection.vendor == 'sqlite' else connection.Database.Binary(bytes([RAW]) + content.encode())
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE notes_note SET content = %s WHERE id = %s', [legacy, note.pk])
+
+        out = StringIO()
+        call_command('compress_text', '--batch-size', '1', stdout=out)
+        self.assertIn('Note.content: rewrote 1 rows', out.getvalue())
+        self.assertIn('NoteVersion.content: rewrote 0 rows', out.getvalue())
+        self.assertEqual(self.stored(note)[0], ZSTD)
+        note.refresh_from_db()
+        self.assertEqual(note.content, content)
+        self.assertEqual(NoteVersion.objects.get(pk=version.pk).content, content)
+
+        out = StringIO()
+        call_command('compress_text', stdout=out)
+        self.assertIn('Note.content: rewrote 0 rows', out.getvalue())
+
+
+class UploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.session_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.session_dir)
+        override = override_settings(MEDIA_ROOT=self.media_root, UPLOAD_SESSION_DIR=self.session_dir,
+                                     THUMBNAIL_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.data = b'\x89PNG' + bytes(range(256)) * 8
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def upload(self, name='photo.png', data=None):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile(name, data or self.data)})
+
+    def put(self, session_id, offset, data):
+        return self.client.put(f'/api/upload/sessions/{session_id}/', data,
+                               content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def start_session(self, size=None):
+        response = self.client.post('/api/upload/sessions/', {'filename': 'photo.png', 'size': size or len(self.data)})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self.upload('a.png'), self.upload('b.PNG')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data['url'], second.data['url'])
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(self.stored_files(), [f'uploads/{digest[:2]}/{digest}.png'])
+
+    def test_racing_uploads_land_on_the_content_address(self):
+        digest = hashlib.sha256(self.data).hexdigest()
+        # Both writers see no file yet, as two concurrent requests would
+        with mock.patch.object(default_storage, 'exists', return_value=False):
+            paths = {uploads.store(BytesIO(self.data), digest, 'photo.png') for _ in range(2)}
+        self.assertEqual(paths, {f'uploads/{digest[:2]}/{digest}.png'})
+        self.assertEqual(self.stored_files(), sorted(paths))
+        with default_storage.open(paths.pop()) as stored:
+            self.assertEqual(stored.read(), self.data)
+
+    def test_direct_uploads_are_size_limited(self):
+        with self.settings(UPLOAD_MAX_SIZE=len(self.data) - 1):
+            response = self.upload()
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_resumable_upload(self):
+        session_id = self.start_session()
+        half = len(self.data) // 2
+        self.assertEqual(self.put(session_id, 0, self.data[:half]).data['received'], half)
+        # A retried chunk at a stale offset is refused and reports where to resume
+        conflict = self.put(session_id, 0, self.data[:half])
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, half))
+        self.assertEqual(self.client.get(f'/api/upload/sessions/{session_id}/').data['received'], half)
+        self.assertEqual(self.put(session_id, half, self.data[half:]).data['received'], len(self.data))
+
+        response = self.client.post(f'/api/upload/sessions/{session_id}/finalize/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['url'], self.upload().data['url'])
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.session_dir), [])
+
+    def test_chunks_are_read_before_the_session_is_locked(self):
+        session_id = self.start_session()
+        outer = len(connection.atomic_blocks)
+        depths = []
+        receive_chunk = uploads.receive_chunk
+
+        def spy(session, stream):
+            depths.append(len(connection.atomic_blocks) - outer)
+            return receive_chunk(session, stream)
+
+        with mock.patch.object(uploads, 'receive_chunk', spy):
+            self.assertEqual(self.put(session_id, 0, self.data).status_code, 200)
+        self.assertEqual(depths, [0])
+
+    def test_sessions_reject_bad_chunks(self):
+        session_id = self.start_session()
+        self.assertEqual(self.put(session_id, 0, self.data + b'extra').status_code, 400)
+        self.assertEqual(self.client.post(f'/api/upload/sessions/{session_id}/finalize/').status_code, 409)
+        self.assertEqual(UploadSession.objects.get().received, 0)
+        self.assertEqual(os.listdir(self.session_dir), [])
+        with self.settings(UPLOAD_MAX_SIZE=10):
+            self.assertEqual(self.client.post('/api/upload/sessions/', {'filename': 'a.png', 'size': 11}).status_code, 400)
+
+    def test_sessions_are_private_and_never_skip_the_bytes(self):
+        self.upload()
+        response = self.client.post('/api/upload/sessions/', {
+            'filename': 'photo.png', 'size': len(self.data), 'sha256': hashlib.sha256(self.data).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('url', response.data)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.put(response.data['id'], 0, self.data).status_code, 404)
+
+    def test_idle_sessions_and_stray_files_expire(self):
+        idle, active = self.start_session(), self.start_session()
+        self.put(idle, 0, self.data[:10])
+        self.put(active, 0, self.data[:10])
+        stray = os.path.join(self.session_dir, 'gone.part')
+        fresh = os.path.join(self.session_dir, 'new.part')
+        for path in (stray, fresh):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        long_ago = timezone.now() - timedelta(days=2)
+        UploadSession.objects.filter(pk=idle).update(updated_at=long_ago)
+        for path in (stray, os.path.join(self.session_dir, f'{idle}.part')):
+            os.utime(path, (long_ago.timestamp(), long_ago.timestamp()))
+
+        self.assertEqual(uploads.expire_sessions(dry_run=True)['sessions'], 1)
+        self.assertEqual(UploadSession.objects.count(), 2)
+        stats = uploads.expire_sessions()
+        self.assertEqual((stats['sessions'], stats['files']), (1, 2))
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [uuid.UUID(active)])
+        self.assertEqual(sorted(os.listdir(self.session_dir)), sorted([f'{active}.part', 'new.part']))
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, THUMBNAIL_WORKERS=0, THUMBNAIL_WIDTHS=(320, 640))
+        override.enable()
+        self.addCleanup(override.disable)
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), 'teal').save(buffer, 'PNG')
+        self.name = hashlib.sha256(buffer.getvalue()).hexdigest() + '.png'
+        self.path = default_storage.save(thumbnails.source_path(self.name), ContentFile(buffer.getvalue()))
+
+    def image(self, width=None, accept='image/avif,image/webp,*/*'):
+        response = self.client.get(f'/api/images/{self.name}', {'w': width} if width else {}, HTTP_ACCEPT=accept)
+        self.assertEqual(response.status_code, 302)
+        return response['Location'].split('/media/', 1)[1], response['Cache-Control']
+
+    def test_generate_writes_every_width_and_format(self):
+        self.assertEqual(thumbnails.generate(self.path), 2 * len(thumbnails.formats()))
+        for width in (320, 640):
+            for fmt in thumbnails.formats():
+                with default_storage.open(thumbnails.derivative_path(self.path, width, fmt)) as file, \
+                        Image.open(file) as image:
+                    self.assertEqual((image.format, image.size), (fmt.upper(), (width, width // 2)))
+        self.assertEqual(thumbnails.generate(self.path), 0)
+
+    def test_undecodable_images_are_skipped(self):
+        path = default_storage.save(thumbnails.source_path('a' * 64 + '.png'), ContentFile(b'not a png'))
+        with self.assertLogs('notes.thumbnails', 'WARNING'):
+            self.assertEqual(thumbnails.generate(path), 0)
+
+    def test_backfill_skips_uploads_that_are_not_content_addressed(self):
+        # Same stem, different images: keyed by name they would share derivatives
+        for name, color in [('riley.jpg', 'red'), ('riley.png', 'blue')]:
+            buffer = BytesIO()
+            Image.new('RGB', (800, 400), color).save(buffer, 'PNG')
+            default_storage.save(f'uploads/{name}', ContentFile(buffer.getvalue()))
+        out = StringIO()
+        with mock.patch.object(thumbnails, 'make_executor', ThreadPoolExecutor):
+            call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Rendered {} derivatives for 1 images.'.format(2 * len(thumbnails.formats())), out.getvalue())
+        self.assertIn('Skipped 2 images', out.getvalue())
+        _, thumbs = default_storage.listdir(f'thumbs/{self.name[:2]}')
+        self.assertTrue(all(name.startswith(self.name[:64]) for name in thumbs))
+        self.assertFalse(default_storage.exists('thumbs/ri'))
+        self.assertEqual(thumbnails.generate('uploads/riley.jpg'), 0)
+
+    def test_accept_header_picks_the_format(self):
+        thumbnails.generate(self.path)
+        self.assertEqual(self.image(500, 'image/webp,*/*'), (f'thumbs/{self.name[:2]}/{self.name[:64]}-640.webp',
+                                                             'public, max-age=31536000'))
+        if 'avif' in thumbnails.formats():
+            self.assertEqual(self.image(100)[0], f'thumbs/{self.name[:2]}/{self.name[:64]}-320.avif')
+        # Wider than any derivative: the largest one
+        self.assertEqual(self.image(4000, 'image/webp,*/*')[0], f'thumbs/{self.name[:2]}/{self.name[:64]}-640.webp')
+        response = self.client.get(f'/api/images/{self.name}', {'w': 500}, HTTP_ACCEPT='image/webp,*/*')
+        self.assertIn('Accept', response['Vary'])
+
+    def test_falls_back_to_the_original(self):
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            # Not rendered yet: the original, cached briefly, and a render queued
+            self.assertEqual(self.image(500), (self.path, 'public, max-age=60'))
+            schedule.assert_called_once_with(self.path)
+            schedule.reset_mock()
+            # No width, or a client that takes neither format
+            self.assertEqual(self.image(), (self.path, 'public, max-age=31536000'))
+            self.assertEqual(self.image(500, 'image/png,*/*'), (self.path, 'public, max-age=31536000'))
+            schedule.assert_not_called()
+        self.assertEqual(self.client.get(f'/api/images/{"b" * 64}.png').status_code, 404)
+        self.assertEqual(self.client.get('/api/images/../settings.py').status_code, 404)
+
+    @override_settings(THUMBNAIL_WORKERS=3)
+    def test_pool_is_started_once_and_shut_down(self):
+        self.addCleanup(thumbnails.shutdown)
+        with mock.patch.object(thumbnails, 'make_executor') as make_executor:
+            thumbnails.schedule(self.path)
+            thumbnails.schedule(self.path)
+            thumbnails.schedule('uploads/notes.txt')
+            make_executor.assert_called_once_with(3)
+            pool = make_executor.return_value
+            self.assertEqual(pool.submit.call_count, 2)
+            thumbnails.shutdown()
+        pool.shutdown.assert_called_once_with(wait=True, cancel_futures=True)
+        self.assertIsNone(thumbnails._executor)
@@ -0,0 +1,168 @@
+"""
+Resized WebP/AVIF derivatives of uploaded images.
+
+Uploads are content-addressed, so a derivative is keyed by the source hash
+and width alone: ``thumbs/<aa>/<sha256>-<width>.<format>``. Once written it
+never changes. Derivatives are rendered in a process pool so the upload
+request returns as soon as the original is stored; images that predate the
+pipeline are filled in by the ``generate_thumbnails`` command. Files stored
+before uploads were content-addressed (``uploads/<name>``) can't be requested
+through ImageView, so they get no derivatives.
+
+Each server process starts its own pool of THUMBNAIL_WORKERS processes on
+first use and shuts it down at exit. Renders still queued then are dropped;
+``generate_thumbnails`` picks them up.
+"""
+import atexit
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+RASTER_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff', '.avif'}
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60, 'speed': 8},
+}
+SOURCE_NAME = re.compile(r'[0-9a-f]{64}(\.[a-z0-9]{1,10})?')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def formats():
+    """Derivative formats this Pillow build can encode, preferred first."""
+    return [name for name in ('avif', 'webp') if features.check(name)]
+
+
+def is_raster(path):
+    return os.path.splitext(path)[1].lower() in RASTER_EXTENSIONS
+
+
+def source_path(name):
+    """Storage path of an upload from its ``<sha256><ext>`` name, or None."""
+    if not SOURCE_NAME.fullmatch(name):
+        return None
+    return f'uploads/{name[:2]}/{name}'
+
+
+def is_content_addressed(path):
+    return source_path(os.path.basename(path)) == path
+
+
+def renderable(path):
+    return is_raster(path) and is_content_addressed(path)
+
+
+def derivative_path(path, width, fmt):
+    if not is_content_addressed(path):
+        raise ValueError(f'{path} is not a content-addressed upload')
+    digest = os.path.splitext(os.path.basename(path))[0]
+    return f'thumbs/{digest[:2]}/{digest}-{width}.{fmt}'
+
+
+def pick_width(requested):
+    """Smallest configured width covering ``requested``, capped at the largest."""
+    widths = sorted(settings.THUMBNAIL_WIDTHS)
+    return next((width for width in widths if width >= requested), widths[-1])
+
+
+def missing(path):
+    return [
+        (width, fmt)
+        for width in settings.THUMBNAIL_WIDTHS
+        for fmt in formats()
+        if not default_storage.exists(derivative_path(path, width, fmt))
+    ]
+
+
+def generate(path, force=False):
+    """Write every missing derivative of ``path`` and return how many were written."""
+    if not renderable(path):
+        return 0
+    variants = missing(path) if not force else [
+        (width, fmt) for width in settings.THUMBNAIL_WIDTHS for fmt in formats()
+    ]
+    if not variants:
+        return 0
+    try:
+        with default_storage.open(path, 'rb') as source, Image.open(source) as image:
+            largest = max(width for width, _ in variants)
+            # Lets JPEG decode at a reduced scale instead of full resolution
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode.endswith('A') else 'RGB')
+            written = 0
+            # Shrink step by step from the largest width down, each from the last result
+            for width in sorted({width for width, _ in variants}, reverse=True):
+                image.thumbnail((width, image.height))
+                for fmt in (f for w, f in variants if w == width):
+                    buffer = io.BytesIO()
+                    image.save(buffer, **SAVE_OPTIONS[fmt])
+                    target = derivative_path(path, width, fmt)
+                    if default_storage.exists(target):
+                        default_storage.delete(target)
+                    default_storage.save(target, ContentFile(buffer.getvalue()))
+                    written += 1
+            return written
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning('Could not render thumbnails for %s: %s', path, exc)
+        return 0
+
+
+def init_worker():
+    django.setup()
+
+
+def make_executor(workers):
+    # spawn, not fork: forking a threaded server process can deadlock the child
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+    )
+
+
+def log_failure(future):
+    # Renders still queued at shutdown are cancelled, which isn't a failure
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Thumbnail worker failed', exc_info=future.exception())
+
+
+def get_executor():
+    """This process's render pool, started on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = make_executor(settings.THUMBNAIL_WORKERS)
+            atexit.register(shutdown)
+        return _executor
+
+
+def shutdown():
+    """Let running renders finish, drop queued ones and stop the pool."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        atexit.unregister(shutdown)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def schedule(path):
+    """Render derivatives of ``path`` in the background pool, if enabled."""
+    if not settings.THUMBNAIL_WORKERS or not renderable(path):
+        return
+    get_executor().submit(generate, path).add_done_callback(log_failure)
@@ -0,0 +1,64 @@
+"""
+Request transactions for writes only.
+
+ATOMIC_REQUESTS wraps every view in a transaction, reads included, so each
+GET pays for BEGIN and COMMIT and keeps a transaction open while the
+response is serialized. Views using AtomicWritesMixin opt out of that
+wrapper and open the transaction themselves for unsafe methods. Reads run
+in autocommit. Writes stay all-or-nothing, and DRF still rolls back when it
+turns an exception into an error response, because it only checks that a
+transaction is open.
+
+Under PostgreSQL's default READ COMMITTED each statement takes its own
+snapshot either way, so a read with several queries sees no less
+consistent data than it did inside the wrapper. Reads that must agree
+across queries use snapshot() instead.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.decorators import method_decorator
+from rest_framework.permissions import SAFE_METHODS
+
+
+class AtomicWritesMixin:
+    # as_view() copies dispatch's attributes onto the view, where the
+    # request handler looks for the opt-out
+    @method_decorator(transaction.non_atomic_requests)
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def handle_exception(self, exc):
+        if self.request.method not in SAFE_METHODS:
+            return super().handle_exception(exc)
+        # DRF marks any open transaction for rollback on an error response.
+        # A read has none of its own, so leave an enclosing one (a test's,
+        # say) as it was.
+        rollback = {connection.alias: connection.needs_rollback
+                    for connection in connections.all(initialized_only=True) if connection.in_atomic_block}
+        try:
+            return super().handle_exception(exc)
+        finally:
+            for alias, needs_rollback in rollback.items():
+                connections[alias].needs_rollback = needs_rollback
+
+
+@contextmanager
+def snapshot(using=DEFAULT_DB_ALIAS):
+    """A transaction in which every query sees the data as of the first one.
+
+    PostgreSQL needs REPEATABLE READ for that, and it can only be set before
+    the transaction's first query, so inside an enclosing atomic block the
+    block's own isolation applies. SQLite transactions already read from one
+    snapshot.
+    """
+    connection = connections[using]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic(using=using):
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        yield
@@ -0,0 +1,190 @@
+"""
+Content-addressed storage for uploaded images.
+
+Files are stored under ``uploads/<aa>/<sha256><ext>``, so uploading the same
+bytes twice resolves to the same path and the second upload writes nothing.
+Direct uploads are hashed chunk by chunk as they spool to disk; resumable
+uploads append chunks to a part file outside MEDIA_ROOT and are hashed once
+when they are finalized. Either way the bytes are written to a temporary
+file next to their final path and renamed onto it, so concurrent uploads of
+the same content both land on the content address.
+
+Each chunk of a resumable upload is spooled to its own file before the
+session row is locked, so a slow client never holds a lock. Sessions idle
+for UPLOAD_SESSION_EXPIRY are removed, with their files, by
+``manage.py apply_retention``.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils import timezone
+
+from .models import UploadSession
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self):
+        super().__init__(f'Uploads are limited to {settings.UPLOAD_MAX_SIZE} bytes.')
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Spool uploads to a temporary file, hashing them as the chunks arrive.
+
+    Bodies larger than UPLOAD_MAX_SIZE are refused before they are read,
+    or as soon as they pass it when the length isn't declared.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length and content_length > settings.UPLOAD_MAX_SIZE:
+            raise UploadTooLarge()
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.UPLOAD_MAX_SIZE:
+            raise UploadTooLarge()
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+def content_path(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', extension):
+        extension = ''
+    return f'uploads/{digest[:2]}/{digest}{extension}'
+
+
+def store(file, digest, filename):
+    """Save ``file`` under its content address unless it is already there."""
+    path = content_path(digest, filename)
+    if default_storage.exists(path):
+        return path
+    target = default_storage.path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Written aside and renamed into place: a racing upload of the same bytes
+    # replaces the file with identical content, and readers never see a partial file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), prefix='.', delete=False) as temporary:
+        try:
+            file.seek(0)
+            shutil.copyfileobj(file, temporary, CHUNK_SIZE)
+            os.chmod(temporary.name, default_storage.file_permissions_mode or 0o644)
+        except BaseException:
+            os.remove(temporary.name)
+            raise
+    os.replace(temporary.name, target)
+    return path
+
+
+def hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def part_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_DIR, f'{session.pk}.part')
+
+
+def receive_chunk(session, stream):
+    """Spool a request body to a chunk file and return its path.
+
+    Reads from the client, so it runs before the session row is locked; the
+    chunk is appended under the lock by append_chunk().
+    """
+    os.makedirs(settings.UPLOAD_SESSION_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=settings.UPLOAD_SESSION_DIR, prefix=f'{session.pk}.', suffix='.chunk')
+    try:
+        with os.fdopen(fd, 'wb') as chunk_file:
+            written = 0
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                written += len(chunk)
+                if session.received + written > session.size:
+                    raise ValueError('Chunk runs past the declared size.')
+                chunk_file.write(chunk)
+    except BaseException:
+        remove(path)
+        raise
+    return path
+
+
+def append_chunk(session, chunk_path):
+    """Append a spooled chunk to the session's part file and return its length."""
+    with open(part_path(session), 'ab') as part:
+        # Drop anything past the last acknowledged offset, left by an interrupted append
+        part.truncate(session.received)
+        with open(chunk_path, 'rb') as chunk:
+            shutil.copyfileobj(chunk, part, CHUNK_SIZE)
+        return part.tell() - session.received
+
+
+def finalize(session):
+    """Move a complete part file into content-addressed storage."""
+    path = part_path(session)
+    digest = hash_file(path)
+    with open(path, 'rb') as part:
+        stored = store(part, digest, session.filename)
+    os.remove(path)
+    return stored
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard(session):
+    remove(part_path(session))
+
+
+def expire_sessions(now=None, dry_run=False):
+    """Delete sessions idle for UPLOAD_SESSION_EXPIRY and their files.
+
+    Also removes part and chunk files no live session owns, such as those
+    left by a crash between deleting a session and its file.
+    """
+    cutoff = (now or timezone.now()) - settings.UPLOAD_SESSION_EXPIRY
+    expired = UploadSession.objects.filter(updated_at__lt=cutoff)
+    stats = {'sessions': expired.count(), 'files': 0, 'bytes': 0}
+    if not dry_run:
+        expired.delete()
+    live = {str(pk) for pk in UploadSession.objects.filter(updated_at__gte=cutoff).values_list('pk', flat=True)}
+    try:
+        names = os.listdir(settings.UPLOAD_SESSION_DIR)
+    except FileNotFoundError:
+        return stats
+    for name in names:
+        if name.split('.', 1)[0] in live:
+            continue
+        path = os.path.join(settings.UPLOAD_SESSION_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        # Recent files may belong to a session whose row isn't committed yet
+        if stat.st_mtime >= cutoff.timestamp():
+            continue
+        stats['files'] += 1
+        stats['bytes'] += stat.st_size
+        if not dry_run:
+            remove(path)
+    return stats
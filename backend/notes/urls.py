@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path
-from .views import TagViewSet, NoteViewSet,  NoteVersionListView, NoteVersionDetailView, NoteVersionRestoreView,ImageUploadView
+from .views import TagViewSet, NoteViewSet,  NoteVersionListView, NoteVersionDetailView, NoteVersionDiffView, NoteVersionRestoreView,ImageUploadView, ImageView, note_list, note_detail, UploadSessionCreateView, UploadSessionView, UploadSessionFinalizeView
 
 router = DefaultRouter()
 router.register(r'tags', TagViewSet)
@@ -13,6 +13,13 @@ urlpatterns = router.urls
 urlpatterns += [
     path('notes/<int:pk>/versions/', NoteVersionListView.as_view(), name='note-version-list'),
     path('notes/<int:pk>/versions/<int:version_id>/', NoteVersionDetailView.as_view(), name='note-version-detail'),
+    path('notes/<int:pk>/versions/<int:version_id>/diff/<int:other_id>/', NoteVersionDiffView.as_view(), name='note-version-diff'),
     path('notes/<int:pk>/restore/<int:version_id>/', NoteVersionRestoreView.as_view(), name='note-version-restore'),
+    path('async/notes/', note_list, name='async-note-list'),
+    path('async/notes/<int:pk>/', note_detail, name='async-note-detail'),
     path('upload/', ImageUploadView.as_view(), name='image-upload'),
+    path('images/<str:name>', ImageView.as_view(), name='image'),
+    path('upload/sessions/', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('upload/sessions/<uuid:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+    path('upload/sessions/<uuid:session_id>/finalize/', UploadSessionFinalizeView.as_view(), name='upload-session-finalize'),
 ]
\ No newline at end of file
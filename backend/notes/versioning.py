@@ -0,0 +1,212 @@
+"""
+Storage helpers for NoteVersion.
+
+A version row either holds a full copy of the old content (a snapshot) or a
+reverse diff against the content that replaced it. The newest version diffs
+against the live ``Note.content``, every other one against the next version,
+so rebuilding a version walks forward to the nearest snapshot and applies the
+diffs back. Every NOTE_VERSION_SNAPSHOT_INTERVAL-th version is a snapshot,
+which bounds that walk.
+"""
+import difflib
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Note, NoteVersion
+
+
+def snapshot_interval():
+    return max(getattr(settings, 'NOTE_VERSION_SNAPSHOT_INTERVAL', 10), 1)
+
+
+def is_snapshot_seq(seq):
+    return seq % snapshot_interval() == 0
+
+
+def make_delta(new, old):
+    """Return an edit script that rebuilds ``old`` from ``new``.
+
+    The script is a JSON list whose items are either ``[start, end]`` line
+    ranges copied from ``new`` or literal strings.
+    """
+    new_lines = new.splitlines(keepends=True)
+    old_lines = old.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, new_lines, old_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(old_lines[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def apply_delta(new, delta):
+    new_lines = new.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(new_lines[op[0]:op[1]])
+    return ''.join(parts)
+
+
+def encode(seq, old, new):
+    """Return the ``(content, is_delta)`` pair to store for version ``seq``.
+
+    Falls back to a full copy when the diff would not be smaller.
+    """
+    if is_snapshot_seq(seq):
+        return old, False
+    delta = make_delta(new, old)
+    if len(delta) >= len(old):
+        return old, False
+    return delta, True
+
+
+def describe(content):
+    """The ``size`` and ``content_hash`` fields for a version holding ``content``."""
+    data = content.encode()
+    return {'size': len(data), 'content_hash': hashlib.sha256(data).hexdigest()}
+
+
+def build_version(note, old_content, new_content, **fields):
+    """Return an unsaved NoteVersion recording ``old_content``.
+
+    Bumps ``note.version_count`` and ``note.last_versioned_at``; the caller is
+    responsible for saving both.
+    """
+    note.version_count += 1
+    note.last_versioned_at = timezone.now()
+    content, is_delta = encode(note.version_count, old_content, new_content)
+    return NoteVersion(
+        note=note,
+        seq=note.version_count,
+        content=content,
+        is_delta=is_delta,
+        **describe(old_content),
+        **fields,
+    )
+
+
+def lock_note(note_id, *fields, using=None):
+    """Return the stored note with ``fields`` loaded, or None if it's gone.
+
+    Locks the row until the transaction ends, so a concurrent edit can't
+    change the version chain under the caller. Outside a transaction there
+    is nothing to hold the lock, and the row is only read.
+    """
+    using = using or router.db_for_write(Note)
+    notes = Note.objects.using(using)
+    if not transaction.get_autocommit(using):
+        notes = notes.select_for_update()
+    return notes.only(*fields).filter(pk=note_id).first()
+
+
+def should_coalesce(note, editor, now=None):
+    """Whether an edit by ``editor`` may fold into the note's newest version.
+
+    Edits coalesce while the same known user keeps saving less than
+    NOTE_VERSION_COALESCE_WINDOW seconds apart. A new version is forced when
+    that gap is exceeded, once the newest version is
+    NOTE_VERSION_CHECKPOINT_INTERVAL seconds old, or when the note is saved
+    with ``checkpoint`` set. Editors are compared by :func:`coalesce`.
+    """
+    window = settings.NOTE_VERSION_COALESCE_WINDOW
+    if not window or editor is None or note.checkpoint or not note.version_count:
+        return False
+    if note.last_versioned_at is None or note.updated_at is None:
+        return False
+    now = now or timezone.now()
+    return (
+        now - note.updated_at < timedelta(seconds=window)
+        and now - note.last_versioned_at < timedelta(seconds=settings.NOTE_VERSION_CHECKPOINT_INTERVAL)
+    )
+
+
+def coalesce(note, old_content, new_content, editor):
+    """Fold an edit into the newest version and return it, or None if it can't be.
+
+    The newest version keeps the content from before the run of edits; only
+    its diff is re-encoded against ``new_content``, so its size, hash and
+    timestamp stand.
+    """
+    newest = NoteVersion.objects.filter(note_id=note.pk, seq=note.version_count).first()
+    if newest is None or newest.edited_by_id != editor.pk:
+        return None
+    before = apply_delta(old_content, newest.content) if newest.is_delta else newest.content
+    newest.content, newest.is_delta = encode(newest.seq, before, new_content)
+    newest.save(update_fields=['content', 'is_delta'])
+    return newest
+
+
+def resolve_content(version):
+    """Rebuild the full content of a single version."""
+    if hasattr(version, 'resolved_content'):
+        return version.resolved_content
+    if not version.is_delta:
+        return version.content
+    chain = [version]
+    base = None
+    later = (
+        NoteVersion.objects.filter(note_id=version.note_id, seq__gt=version.seq)
+        .order_by('seq')
+        .only('seq', 'content', 'is_delta')
+    )
+    for row in later.iterator(chunk_size=snapshot_interval()):
+        if not row.is_delta:
+            base = row.content
+            break
+        chain.append(row)
+    if base is None:
+        base = version.note.content
+    for row in reversed(chain):
+        base = apply_delta(base, row.content)
+    version.resolved_content = base
+    return base
+
+
+def materialize(note, versions):
+    """Rebuild every version in ``versions`` in one pass.
+
+    ``versions`` must be ordered newest first and start at the newest version
+    of ``note``, without gaps.
+    """
+    content = note.content
+    for version in versions:
+        if version.is_delta:
+            content = apply_delta(content, version.content)
+        else:
+            content = version.content
+        version.resolved_content = content
+    return versions
+
+
+def reencode(note, versions):
+    """Re-encode a materialized chain and return the versions whose rows changed.
+
+    ``versions`` is ordered newest first, as :func:`materialize` takes it, but
+    may have gaps where versions were removed. Besides the usual snapshot
+    seqs, a full copy is forced wherever a rebuild would otherwise apply
+    NOTE_VERSION_SNAPSHOT_INTERVAL or more diffs, so gaps don't lengthen the walk.
+    """
+    changed = []
+    next_content = note.content
+    run = 0
+    for version in versions:
+        content, is_delta = encode(version.seq, version.resolved_content, next_content)
+        if is_delta and run + 1 >= snapshot_interval():
+            content, is_delta = version.resolved_content, False
+        run = run + 1 if is_delta else 0
+        if content != version.content or is_delta != version.is_delta:
+            version.content = content
+            version.is_delta = is_delta
+            changed.append(version)
+        next_content = version.resolved_content
+    return changed
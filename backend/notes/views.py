@@ -4,71 +4,273 @@ from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import login
 from rest_framework import viewsets
-from .models import Tag, Note, NoteVersion
-from .serializers import TagSerializer, NoteSerializer, NoteVersionSerializer
-class TagViewSet(viewsets.ModelViewSet):
+from rest_framework.decorators import action
+from .models import Tag, Note, NoteVersion, UploadSession
+from .serializers import TagSerializer, NoteSerializer, NoteVersionSerializer, NoteVersionListSerializer, UploadSessionSerializer
+from . import thumbnails, uploads
+from .async_api import async_api_view, cached_list, list_data, render
+from .bulk import MAX_OPERATIONS, apply_operations
+from .cache import CachedListMixin
+from .diffs import MODES as DIFF_MODES, version_diff
+from .pagination import UpdatedAtCursorPagination, VersionCursorPagination
+from .replicas import ReplicaReadsMixin
+from .tag_usage import MAX_SUGGEST_LIMIT, SUGGEST_LIMIT, suggest
+from .versioning import resolve_content
+class TagViewSet(ReplicaReadsMixin, CachedListMixin, viewsets.ModelViewSet):
+    list_cache_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """The current user's tags starting with ``?prefix=``, most used first."""
+        try:
+            limit = min(int(request.query_params.get('limit', SUGGEST_LIMIT)), MAX_SUGGEST_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(suggest(request.user, request.query_params.get('prefix', ''), max(limit, 1)))
+
 from rest_framework import permissions
 
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from io import BytesIO
+import os
 
 class ImageUploadView(APIView):
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        file_obj = request.FILES.get('file')
+        # Spool to disk and hash while the body streams in
+        request.upload_handlers = [uploads.HashingFileUploadHandler(request)]
+        try:
+            file_obj = request.FILES.get('file')
+        except uploads.UploadTooLarge as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
         if not file_obj:
             return Response({'error': 'No file provided'}, status=400)
-        # Save the file
-        file_path = default_storage.save(f'uploads/{file_obj.name}', file_obj)
-        file_url = default_storage.url(file_path)
-        return Response({'url': request.build_absolute_uri(file_url)})
+        # Identical bytes map to the same path, so repeats write nothing
+        file_path = uploads.store(file_obj, file_obj.sha256, file_obj.name)
+        thumbnails.schedule(file_path)
+        return Response(upload_urls(request, file_path))
+
+
+def upload_urls(request, file_path):
+    urls = {'url': request.build_absolute_uri(default_storage.url(file_path))}
+    if thumbnails.is_raster(file_path):
+        image = reverse('image', args=[os.path.basename(file_path)])
+        urls['image_url'] = request.build_absolute_uri(image)
+    return urls
+
+
+class ImageView(APIView):
+    """Redirect to the derivative of an upload that best fits ``?w=``.
+
+    Picks AVIF or WebP from the Accept header. Until the derivative has been
+    rendered the original is served, briefly cached, and rendering is queued.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, name):
+        path = thumbnails.source_path(name)
+        if path is None:
+            raise Http404
+        width = request.query_params.get('w', '')
+        accept = request.headers.get('Accept', '')
+        fmt = next((f for f in thumbnails.formats() if f'image/{f}' in accept), None)
+        if width.isdigit() and fmt and thumbnails.is_raster(path):
+            target = thumbnails.derivative_path(path, thumbnails.pick_width(int(width)), fmt)
+            if default_storage.exists(target):
+                return self.redirect(request, target, max_age=365 * 24 * 3600)
+            if not default_storage.exists(path):
+                raise Http404
+            thumbnails.schedule(path)
+            return self.redirect(request, path, max_age=60)
+        if not default_storage.exists(path):
+            raise Http404
+        return self.redirect(request, path, max_age=365 * 24 * 3600)
+
+    def redirect(self, request, path, max_age):
+        response = HttpResponseRedirect(request.build_absolute_uri(default_storage.url(path)))
+        patch_cache_control(response, public=True, max_age=max_age)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """Start a resumable upload: init, PUT chunks, then finalize."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        # No shortcut for content the server already has: answering it would
+        # tell anyone holding a hash whether some user uploaded that file
+        serializer.save(user=self.request.user)
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+class UploadSessionView(APIView):
+    """GET reports the resume offset, PUT appends the body at ``Upload-Offset``.
+
+    A PUT spools its body before taking the session's row lock, which it
+    then holds only to append the chunk and move the offset.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_session(self, request, session_id, lock=False):
+        sessions = UploadSession.objects.filter(user=request.user)
+        if lock:
+            sessions = sessions.select_for_update()
+        return get_object_or_404(sessions, pk=session_id)
+
+    def get(self, request, session_id):
+        return Response(UploadSessionSerializer(self.get_session(request, session_id)).data)
+
+    def put(self, request, session_id):
+        session = self.get_session(request, session_id)
+        offset = request.headers.get('Upload-Offset', '')
+        if not offset.isdigit() or int(offset) != session.received:
+            return self.offset_conflict(session)
+        try:
+            chunk = uploads.receive_chunk(session, request.stream or BytesIO())
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                session = self.get_session(request, session_id, lock=True)
+                # Another request for the same offset may have won the race
+                if int(offset) != session.received:
+                    return self.offset_conflict(session)
+                session.received += uploads.append_chunk(session, chunk)
+                session.save(update_fields=['received', 'updated_at'])
+        finally:
+            uploads.remove(chunk)
+        return Response(UploadSessionSerializer(session).data)
+
+    def offset_conflict(self, session):
+        return Response({'error': 'Offset does not match the bytes received.', 'offset': session.received},
+                        status=status.HTTP_409_CONFLICT)
+
+    def delete(self, request, session_id):
+        session = self.get_session(request, session_id)
+        uploads.discard(session)
+        session.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadSessionFinalizeView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        # Locked, so a retried finalize waits for this one and then finds no session
+        session = get_object_or_404(UploadSession.objects.select_for_update(), pk=session_id, user=request.user)
+        if session.received != session.size:
+            return Response({'error': 'Upload is incomplete.', 'offset': session.received},
+                            status=status.HTTP_409_CONFLICT)
+        file_path = uploads.finalize(session)
+        session.delete()
+        thumbnails.schedule(file_path)
+        return Response(upload_urls(request, file_path))
     
     
-class NoteVersionListView(generics.ListAPIView):
-    serializer_class = NoteVersionSerializer
+class NoteVersionListView(ReplicaReadsMixin, generics.ListAPIView):
+    serializer_class = NoteVersionListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = VersionCursorPagination
 
     def get_queryset(self):
-        note_id = self.kwargs['pk']
-        return NoteVersion.objects.filter(note_id=note_id).order_by('-created_at')
+        return (
+            NoteVersion.objects.filter(note_id=self.kwargs['pk'])
+            .order_by('-seq')
+            .only('id', 'note_id', 'seq', 'created_at', 'edited_by_id', 'size', 'content_hash')
+        )
+
+    def list(self, request, *args, **kwargs):
+        get_object_or_404(Note, pk=self.kwargs['pk'], user=request.user)
+        return super().list(request, *args, **kwargs)
 
-class NoteVersionDetailView(generics.RetrieveAPIView):
+class NoteVersionDetailView(ReplicaReadsMixin, generics.RetrieveAPIView):
     serializer_class = NoteVersionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = NoteVersion.objects.all()
+    lookup_url_kwarg = 'version_id'
+
+    def get_queryset(self):
+        return NoteVersion.objects.filter(
+            note_id=self.kwargs['pk'], note__user=self.request.user
+        ).select_related('note')
+
+class NoteVersionDiffView(ReplicaReadsMixin, APIView):
+    """``?mode=unified`` (default) or ``?mode=word`` diff from version a to b."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, version_id, other_id):
+        mode = request.query_params.get('mode', 'unified')
+        if mode not in DIFF_MODES:
+            return Response({'error': f"mode must be one of {', '.join(DIFF_MODES)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        versions = NoteVersion.objects.filter(note_id=pk, note__user=request.user).select_related('note')
+        # Content is only read on a cache miss
+        versions = {v.pk: v for v in versions.defer('content').filter(pk__in=[version_id, other_id])}
+        if version_id not in versions or other_id not in versions:
+            raise Http404
+        diff = version_diff(versions[version_id], versions[other_id], mode)
+        return Response({'from': version_id, 'to': other_id, 'mode': mode, 'diff': diff})
 
 class NoteVersionRestoreView(generics.GenericAPIView):
     serializer_class = NoteVersionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk, version_id):
-        version = NoteVersion.objects.get(pk=version_id, note_id=pk)
+        version = get_object_or_404(
+            NoteVersion.objects.select_related('note'),
+            pk=version_id, note_id=pk, note__user=request.user,
+        )
         note = version.note
-        note.content = version.content
+        note.content = resolve_content(version)
+        # Keep whatever was being typed before the restore as its own version
+        note.edited_by = request.user
+        note.checkpoint = True
         note.save()
         return Response({'status': 'restored'}, status=status.HTTP_200_OK)
     
-class NoteViewSet(viewsets.ModelViewSet):
+def filter_notes(queryset, params):
+    deleted = params.get('deleted')
+    if deleted == 'true':
+        queryset = queryset.filter(deleted=True)
+    elif deleted == 'false':
+        queryset = queryset.filter(deleted=False)
+    # else: return all notes (including deleted ones)
+    favorite = params.get('favorite')
+    if favorite == 'true':
+        queryset = queryset.filter(favorite=True)
+    elif favorite == 'false':
+        queryset = queryset.filter(favorite=False)
+    tag = params.get('tag')
+    if tag and tag.isdigit():
+        queryset = queryset.filter(tags__id=tag)
+    return queryset
+
+
+class NoteViewSet(ReplicaReadsMixin, CachedListMixin, viewsets.ModelViewSet):
+    list_cache_name = 'notes'
     serializer_class = NoteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UpdatedAtCursorPagination
 
     def get_queryset(self):
-        queryset = Note.objects.filter(user=self.request.user)
-        deleted = self.request.query_params.get('deleted')
-        if deleted == 'true':
-            queryset = queryset.filter(deleted=True)
-        elif deleted == 'false':
-            queryset = queryset.filter(deleted=False)
-        # else: return all notes (including deleted ones)
-        return queryset
+        return filter_notes(Note.objects.filter(user=self.request.user).prefetch_related('tags'),
+                            self.request.query_params)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -76,8 +278,19 @@ class NoteViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         if serializer.instance.user != self.request.user:
             raise serializers.ValidationError('You do not own this note.')
+        serializer.instance.edited_by = self.request.user
         serializer.save()
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list):
+            return Response({'error': 'Expected an "operations" list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > MAX_OPERATIONS:
+            return Response({'error': f'At most {MAX_OPERATIONS} operations per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': apply_operations(request.user, operations)})
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         force = request.query_params.get('force', 'false').lower() == 'true'
@@ -106,4 +319,21 @@ class NoteViewSet(viewsets.ModelViewSet):
 
     
 
-    
\ No newline at end of file
+    
+
+@async_api_view
+async def note_list(request):
+    """Async ``GET /api/notes/``, sharing its filters, paging and cache."""
+    queryset = filter_notes(Note.objects.filter(user=request.user).prefetch_related('tags'),
+                            request.query_params)
+    return await cached_list('notes', request, lambda: list_data(
+        request, queryset, NoteSerializer, NoteViewSet.pagination_class))
+
+
+@async_api_view
+async def note_detail(request, pk):
+    try:
+        note = await Note.objects.prefetch_related('tags').aget(pk=pk, user=request.user)
+    except Note.DoesNotExist:
+        return render({'detail': 'No Note matches the given query.'}, status=404)
+    return render(NoteSerializer(note, context={'request': request}).data)
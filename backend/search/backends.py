@@ -0,0 +1,229 @@
+"""
+Full-text index over notes and code snippets.
+
+The index lives outside the ORM: a weighted tsvector table with a GIN index
+on PostgreSQL and an FTS5 virtual table on SQLite. Receivers in
+search.signals keep it current as notes and snippets are saved.
+"""
+import html
+import re
+from collections import namedtuple
+
+from django.db import connection
+
+TABLE = 'search_entry'
+KINDS = ('note', 'snippet')
+MAX_TERMS = 8
+
+# Control characters wrap matches inside the database so excerpts can be
+# escaped before the <mark> tags go in.
+START_SEL = '\x02'
+STOP_SEL = '\x03'
+
+Entry = namedtuple('Entry', 'kind object_id user_id title keywords body')
+Hit = namedtuple('Hit', 'kind object_id title excerpt rank')
+
+
+def note_entry(note):
+    return Entry('note', note.pk, note.user_id, note.title, '', note.content)
+
+
+def snippet_entry(snippet):
+    return Entry('snippet', snippet.pk, snippet.user_id, snippet.title, snippet.language, snippet.code)
+
+
+def query_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def highlight(text):
+    return (
+        html.escape(text)
+        .replace(START_SEL, '<mark>')
+        .replace(STOP_SEL, '</mark>')
+    )
+
+
+class PostgresBackend:
+    """tsvector column with a GIN index.
+
+    Only the vector is stored; excerpts are built from the source rows of the
+    requested page.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE {TABLE} (
+                    kind varchar(16) NOT NULL,
+                    object_id bigint NOT NULL,
+                    user_id bigint NOT NULL,
+                    document tsvector NOT NULL,
+                    PRIMARY KEY (kind, object_id)
+                )
+            """)
+            cursor.execute(f'CREATE INDEX {TABLE}_document ON {TABLE} USING gin (document)')
+            cursor.execute(f'CREATE INDEX {TABLE}_user_id ON {TABLE} (user_id)')
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def index(self, entries):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f"""
+                INSERT INTO {TABLE} (kind, object_id, user_id, document)
+                VALUES (%s, %s, %s,
+                    setweight(to_tsvector('english', %s), 'A') ||
+                    setweight(to_tsvector('english', %s), 'B') ||
+                    setweight(to_tsvector('english', %s), 'C'))
+                ON CONFLICT (kind, object_id) DO UPDATE
+                SET user_id = EXCLUDED.user_id, document = EXCLUDED.document
+            """, [tuple(entry) for entry in entries])
+
+    def remove(self, kind, object_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = ANY(%s)',
+                [kind, list(object_ids)],
+            )
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLE}')
+
+    def search(self, user_id, terms, limit, offset):
+        from notes.models import Note
+        from snippets.models import CodeSnippet
+
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        options = f'StartSel={START_SEL}, StopSel={STOP_SEL}, MaxWords=30, MinWords=10'
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT kind, object_id, ts_rank(document, q) AS rank
+                FROM {TABLE}, to_tsquery('english', %s) q
+                WHERE user_id = %s AND document @@ q
+                ORDER BY rank DESC, object_id DESC
+                LIMIT %s OFFSET %s
+            """, [tsquery, user_id, limit, offset])
+            hits = cursor.fetchall()
+            # Bodies are compressed at rest, so they're decoded here rather than read in SQL
+            sources = {
+                ('note', pk): row for pk, *row in
+                Note.objects.filter(pk__in=[pk for kind, pk, _ in hits if kind == 'note'])
+                .values_list('pk', 'title', 'content')
+            }
+            sources.update({
+                ('snippet', pk): row for pk, *row in
+                CodeSnippet.objects.filter(pk__in=[pk for kind, pk, _ in hits if kind == 'snippet'])
+                .values_list('pk', 'title', 'code')
+            })
+            hits = [(kind, pk, rank, *sources.get((kind, pk), (None, None))) for kind, pk, rank in hits]
+            if not hits:
+                return []
+            cursor.execute("""
+                SELECT ts_headline('english', body, to_tsquery('english', %s), %s)
+                FROM unnest(%s::text[]) WITH ORDINALITY AS bodies(body, position)
+                ORDER BY position
+            """, [tsquery, options, [body for *_, body in hits]])
+            excerpts = [row[0] for row in cursor.fetchall()]
+        return [Hit(kind, pk, title, excerpt, rank)
+                for (kind, pk, rank, title, _), excerpt in zip(hits, excerpts)]
+
+
+class SqliteBackend:
+    """FTS5 shadow table, mainly so search can be exercised locally.
+
+    The rowid encodes (kind, object_id) so updates and deletes stay indexed
+    lookups, and the owner is an indexed token so matching is scoped to one
+    user's documents.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE {TABLE} USING fts5(
+                    title, keywords, body, owner, tokenize = 'porter unicode61'
+                )
+            """)
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    @staticmethod
+    def rowid(kind, object_id):
+        return object_id * len(KINDS) + KINDS.index(kind)
+
+    def index(self, entries):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {TABLE} (rowid, title, keywords, body, owner) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                [
+                    (self.rowid(e.kind, e.object_id), e.title, e.keywords, e.body, f'u{e.user_id}')
+                    for e in entries
+                ],
+            )
+
+    def remove(self, kind, object_ids):
+        rowids = [self.rowid(kind, object_id) for object_id in object_ids]
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(rowids))})',
+                rowids,
+            )
+
+    def clear(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+
+    def search(self, user_id, terms, limit, offset):
+        phrases = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        match = f'owner:u{user_id} AND {{title keywords body}}:({phrases})'
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT rowid, title,
+                       snippet({TABLE}, 2, %s, %s, '…', 24),
+                       bm25({TABLE}, 10.0, 5.0, 1.0, 0.0) AS rank
+                FROM {TABLE}
+                WHERE {TABLE} MATCH %s
+                ORDER BY rank, rowid DESC
+                LIMIT %s OFFSET %s
+            """, [START_SEL, STOP_SEL, match, limit, offset])
+            hits = []
+            for rowid, title, excerpt, rank in cursor.fetchall():
+                object_id, kind = divmod(rowid, len(KINDS))
+                # bm25 is lower-is-better; flip it so both backends rank high-is-better
+                hits.append(Hit(KINDS[kind], object_id, title, excerpt, -rank))
+            return hits
+
+
+BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+def get_backend(using=connection):
+    """Return the index backend for a connection, or None if unsupported."""
+    backend_class = BACKENDS.get(using.vendor)
+    return backend_class(using) if backend_class else None
+
+
+def index_entries(entries):
+    backend = get_backend()
+    if backend is not None and entries:
+        backend.index(entries)
+
+
+def remove_entries(kind, object_ids):
+    backend = get_backend()
+    if backend is not None and object_ids:
+        backend.remove(kind, object_ids)
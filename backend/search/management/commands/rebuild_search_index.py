@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes.models import Note
+from snippets.models import CodeSnippet
+from search.backends import get_backend, note_entry, snippet_entry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all notes and code snippets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Documents indexed per statement.')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if backend is None:
+            raise CommandError('Full-text search is not supported on this database.')
+        batch_size = options['batch_size']
+
+        sources = [
+            (Note.objects.filter(deleted=False), note_entry),
+            (CodeSnippet.objects.all(), snippet_entry),
+        ]
+        with transaction.atomic():
+            backend.clear()
+            total = 0
+            for queryset, make_entry in sources:
+                batch = []
+                for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+                    batch.append(make_entry(obj))
+                    if len(batch) >= batch_size:
+                        backend.index(batch)
+                        total += len(batch)
+                        batch = []
+                backend.index(batch)
+                total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents.'))
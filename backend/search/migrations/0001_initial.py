@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from search.backends import get_backend
+
+
+def create_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.create()
+
+
+def drop_index(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.drop()
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('notes', '0007_noteversion_unique_seq'),
+        ('snippets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from notes.models import Note
+from snippets.models import CodeSnippet
+from .backends import index_entries, remove_entries, note_entry, snippet_entry
+
+INDEXED_NOTE_FIELDS = {'title', 'content', 'deleted'}
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # Fixture loading; rebuild_search_index covers loaded rows
+        return
+    # Only Note.save() works out what changed; saves that bypass it reindex
+    changed = getattr(instance, 'changed_fields', None)
+    if not created and changed is not None and not changed & INDEXED_NOTE_FIELDS:
+        return
+    if instance.deleted:
+        # Trashed notes drop out of search until they are restored
+        remove_entries('note', [instance.pk])
+    else:
+        index_entries([note_entry(instance)])
+
+@receiver(post_delete, sender=Note)
+def unindex_note(sender, instance, **kwargs):
+    remove_entries('note', [instance.pk])
+
+@receiver(post_save, sender=CodeSnippet)
+def index_snippet(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_entries([snippet_entry(instance)])
+
+@receiver(post_delete, sender=CodeSnippet)
+def unindex_snippet(sender, instance, **kwargs):
+    remove_entries('snippet', [instance.pk])
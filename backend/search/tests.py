@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+from django.core import serializers
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from notes.models import Note
+from snippets.models import CodeSnippet
+from users.models import UserAccount
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get('/api/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def hits(self, query):
+        return [(hit['type'], hit['id']) for hit in self.search(query)['results']]
+
+    def test_title_matches_rank_above_body_matches(self):
+        body = Note.objects.create(user=self.user, title='Weekly plan', content='Move the cluster to kubernetes.')
+        title = Note.objects.create(user=self.user, title='Kubernetes upgrade', content='Read the changelog.')
+        self.assertEqual(self.hits('kubernetes'), [('note', title.pk), ('note', body.pk)])
+
+    def test_snippets_match_on_language(self):
+        snippet = CodeSnippet.objects.create(user=self.user, title='Deploy', code='kubectl apply', language='bash')
+        Note.objects.create(user=self.user, title='Deploy', content='by hand')
+        self.assertEqual(self.hits('bash'), [('snippet', snippet.pk)])
+
+    def test_every_term_must_match_and_prefixes_count(self):
+        both = Note.objects.create(user=self.user, title='Release', content='Go through the checklist')
+        Note.objects.create(user=self.user, title='Release', content='party')
+        self.assertEqual(self.hits('releas check'), [('note', both.pk)])
+
+    def test_excerpt_is_escaped_and_highlighted(self):
+        Note.objects.create(user=self.user, title='Markup', content='Use <b>bold</b> for the rocket launch')
+        excerpt = self.search('rocket')['results'][0]['excerpt']
+        self.assertIn('&lt;b&gt;bold&lt;/b&gt;', excerpt)
+        self.assertIn('<mark>rocket</mark>', excerpt)
+        self.assertNotIn('<b>', excerpt)
+
+    def test_users_only_find_their_own_notes(self):
+        mine = Note.objects.create(user=self.user, title='Secret plan', content='')
+        Note.objects.create(user=self.other, title='Secret plan', content='')
+        CodeSnippet.objects.create(user=self.other, title='Secret plan', code='', language='')
+        self.assertEqual(self.hits('secret'), [('note', mine.pk)])
+
+    def test_trashed_and_deleted_notes_drop_out(self):
+        note = Note.objects.create(user=self.user, title='Groceries', content='')
+        snippet = CodeSnippet.objects.create(user=self.user, title='Groceries script', code='', language='')
+        note.deleted = True
+        note.save()
+        self.assertEqual(self.hits('groceries'), [('snippet', snippet.pk)])
+        note.deleted = False
+        note.save()
+        self.assertEqual(set(self.hits('groceries')), {('note', note.pk), ('snippet', snippet.pk)})
+
+        self.client.post('/api/notes/bulk/', {'operations': [{'op': 'trash', 'id': note.pk}]}, format='json')
+        self.assertEqual(self.hits('groceries'), [('snippet', snippet.pk)])
+        note.delete()
+        snippet.delete()
+        self.assertEqual(self.hits('groceries'), [])
+
+    def test_edits_are_reindexed(self):
+        note = Note.objects.create(user=self.user, title='Draft', content='apples')
+        note.content = 'oranges'
+        note.save()
+        self.assertEqual(self.hits('apples'), [])
+        self.assertEqual(self.hits('oranges'), [('note', note.pk)])
+
+    def test_saves_that_bypass_note_save(self):
+        note = Note.objects.create(user=self.user, title='Fixture row', content='')
+        fixture = os.path.join(tempfile.mkdtemp(), 'notes.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(fixture))
+        with open(fixture, 'w') as file:
+            file.write(serializers.serialize('json', [note]).replace('Fixture row', 'Loaded row'))
+        # loaddata saves with raw=True; loaded rows wait for rebuild_search_index
+        call_command('loaddata', fixture, verbosity=0)
+        self.assertEqual(Note.objects.get(pk=note.pk).title, 'Loaded row')
+        self.assertEqual(self.hits('loaded'), [])
+
+        note = Note.objects.get(pk=note.pk)
+        note.title = 'Renamed row'
+        note.save_base()
+        self.assertEqual(self.hits('renamed'), [('note', note.pk)])
+
+    def test_pagination(self):
+        notes = [Note.objects.create(user=self.user, title=f'Topic {i}', content='') for i in range(5)]
+        seen = []
+        data = self.search('topic', page_size=2)
+        self.assertIsNone(data['previous'])
+        pages = 1
+        while True:
+            seen += [hit['id'] for hit in data['results']]
+            if not data['next']:
+                break
+            self.assertLessEqual(len(data['results']), 2)
+            data = self.client.get(data['next']).data
+            self.assertIsNotNone(data['previous'])
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(seen), sorted(note.pk for note in notes))
@@ -0,0 +1,58 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from notes.transactions import AtomicWritesMixin
+from .backends import get_backend, highlight, query_terms
+
+
+def positive_int(value, default, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    if value < 1:
+        return default
+    return min(value, maximum) if maximum else value
+
+
+class SearchView(AtomicWritesMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
+    max_page_size = 50
+
+    def get(self, request):
+        backend = get_backend()
+        if backend is None:
+            return Response({'error': 'Search is not available on this database.'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        terms = query_terms(request.query_params.get('q', ''))
+        page = positive_int(request.query_params.get('page'), 1)
+        page_size = positive_int(request.query_params.get('page_size'), self.page_size, self.max_page_size)
+        if not terms:
+            return Response({'next': None, 'previous': None, 'results': []})
+
+        # Fetch one extra row to know whether there is a next page without counting
+        hits = backend.search(request.user.pk, terms, page_size + 1, (page - 1) * page_size)
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, 'page', page + 1) if len(hits) > page_size else None
+        if page == 1:
+            previous_url = None
+        elif page == 2:
+            previous_url = remove_query_param(url, 'page')
+        else:
+            previous_url = replace_query_param(url, 'page', page - 1)
+
+        results = [
+            {
+                'type': hit.kind,
+                'id': hit.object_id,
+                'title': hit.title,
+                'excerpt': highlight(hit.excerpt or ''),
+                'rank': hit.rank,
+            }
+            for hit in hits[:page_size]
+        ]
+        return Response({'next': next_url, 'previous': previous_url, 'results': results})
@@ -0,0 +1,119 @@
+"""
+Server-side syntax highlighting for snippets.
+
+Rendering is a pure function of the code, the language, the style and the
+Pygments version, so its output is stored once per hash of those inputs in
+SnippetHighlight. A snippet whose key hasn't changed never re-renders, and a
+Pygments upgrade or style change shows up as stale keys for
+``highlight_snippets`` to refresh.
+"""
+import hashlib
+import json
+import re
+
+import pygments
+from django.conf import settings
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+# Enough text to recognise a language; scanning all of a large file is slow
+GUESS_SAMPLE = 10000
+
+# Pygments' own guess_lexer mostly keys off shebangs and modelines, so short
+# snippets come out as obscure formats. Score common languages by telltale
+# constructs instead; a language's score is the number of patterns that match.
+SIGNATURES = {
+    'python': [r'^\s*(def|class)\s+\w+.*:\s*$', r'^\s*(import \w+|from [\w.]+ import )',
+               r'\bself\.', r'^\s*(elif|except|with)\b.*:\s*$', r'\b(None|True|False)\b', r'\bprint\('],
+    'javascript': [r'\b(const|let|var)\s+\w+\s*=', r'=>', r'\bfunction\b', r'console\.\w+\(',
+                   r'\brequire\(', r'\bimport .* from [\'"]'],
+    'typescript': [r':\s*(string|number|boolean|any|void|unknown)\b', r'^\s*(export\s+)?(interface|type)\s+\w+',
+                   r'\b(public|private|readonly)\s+\w+:', r'\bas const\b'],
+    'go': [r'^package \w+', r'\bfunc\b', r':=', r'\bfmt\.'],
+    'rust': [r'\bfn\s+\w+', r'\blet mut\b', r'\w+!\(', r'\bimpl\b'],
+    'java': [r'\bpublic\s+(static\s+)?(class|void|final)\b', r'System\.out\.', r'\bnew \w+\('],
+    'cpp': [r'#include\s*<', r'\bstd::', r'\bprintf\(', r'\bint main\('],
+    'bash': [r'^#!.*\b(ba)?sh\b', r'^\s*(echo|export|sudo|cd)\b', r'\$\{?\w+', r'^\s*(fi|done|esac)\b'],
+    'sql': [r'(?i)\bselect\b.+\bfrom\b', r'(?i)\b(insert into|update \w+ set|delete from|create table)\b',
+            r'(?i)\bwhere\b'],
+    'css': [r'^\s*[.#@]?[\w-]+[^{;]*\{', r'^\s*[\w-]+\s*:\s*[^;]+;', r'@media\b'],
+    'ruby': [r'^\s*def \w+[^:]*$', r'^\s*end\s*$', r'\bputs\b', r'\.each do\b'],
+    'php': [r'<\?php', r'\$\w+\s*=', r'\becho\b'],
+    'yaml': [r'^[\w-]+:(\s|$)', r'^\s*-\s+\w'],
+}
+COMPILED_SIGNATURES = {
+    language: [re.compile(pattern, re.MULTILINE) for pattern in patterns]
+    for language, patterns in SIGNATURES.items()
+}
+
+
+def detect_language(code):
+    """Best-matching Pygments alias for ``code``, or None."""
+    sample = code[:GUESS_SAMPLE].strip()
+    if not sample:
+        return None
+    if sample[0] in '{[':
+        try:
+            json.loads(code)
+            return 'json'
+        except ValueError:
+            pass
+    if sample.startswith('<') and re.search(r'(?i)<!doctype html|</\w+>', sample):
+        return 'html'
+    scores = {
+        language: sum(1 for pattern in patterns if pattern.search(sample))
+        for language, patterns in COMPILED_SIGNATURES.items()
+    }
+    # Type annotations on top of JavaScript constructs make it TypeScript
+    if scores['typescript']:
+        scores['typescript'] += scores['javascript']
+    language, score = max(scores.items(), key=lambda item: item[1])
+    return language if score else None
+
+
+def highlight_key(code, language, style=None):
+    style = style or settings.SNIPPET_HIGHLIGHT_STYLE
+    source = '\0'.join([pygments.__version__, style, language.strip().lower(), code])
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def get_lexer(code, language):
+    """Lexer for ``language``, or one guessed from the code when it is blank or unknown."""
+    if language.strip():
+        try:
+            return get_lexer_by_name(language.strip().lower())
+        except ClassNotFound:
+            pass
+    return get_lexer_by_name(detect_language(code) or 'text')
+
+
+def render(code, language, style=None):
+    """Return ``(key, language, html)`` for one snippet.
+
+    The HTML uses inline styles so clients need no stylesheet.
+    """
+    style = style or settings.SNIPPET_HIGHLIGHT_STYLE
+    lexer = get_lexer(code, language)
+    formatter = HtmlFormatter(style=style, noclasses=True, cssclass='highlight')
+    html = pygments.highlight(code, lexer, formatter)
+    return highlight_key(code, language, style), lexer.aliases[0] if lexer.aliases else lexer.name, html
+
+
+def render_many(items, style):
+    """``render`` for a batch of ``(code, language)`` pairs, for worker processes."""
+    return [render(code, language, style) for code, language in items]
+
+
+def highlight_for(code, language):
+    """Stored highlight for ``code``, rendering and saving it on a miss."""
+    from .models import SnippetHighlight
+
+    key = highlight_key(code, language)
+    highlight = SnippetHighlight.objects.filter(pk=key).first()
+    if highlight is None:
+        key, detected, html = render(code, language)
+        highlight = SnippetHighlight(key=key, language=detected, html=html)
+        # Another save may have rendered the same code meanwhile
+        SnippetHighlight.objects.bulk_create([highlight], ignore_conflicts=True)
+    return highlight
@@ -0,0 +1,80 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from snippets.highlighting import highlight_key, render_many
+from snippets.models import CodeSnippet, SnippetHighlight, update_derived
+
+
+class Command(BaseCommand):
+    help = (
+        'Render missing or stale syntax highlights for code snippets, '
+        'spreading the Pygments work over several processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Rendering processes (default: one per CPU).')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Snippets read, rendered and written per batch.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete highlights no snippet refers to any more.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        workers = options['workers']
+        style = settings.SNIPPET_HIGHLIGHT_STYLE
+        rows = CodeSnippet.objects.order_by('pk').values_list('pk', 'code', 'language', 'highlight_id')
+        self.updated = self.rendered = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            batch = []
+            for pk, code, language, highlight_id in rows.iterator(chunk_size=batch_size):
+                # Keys are cheap to compute, so only stale snippets reach the pool
+                key = highlight_key(code, language, style)
+                if key != highlight_id:
+                    batch.append((pk, key, code, language))
+                if len(batch) >= batch_size:
+                    in_flight.append(self.submit(executor, batch, style))
+                    batch = []
+                # Keep a couple of batches per worker queued, not the whole table
+                while len(in_flight) > workers * 2:
+                    self.write(*in_flight.popleft(), batch_size)
+            if batch:
+                in_flight.append(self.submit(executor, batch, style))
+            while in_flight:
+                self.write(*in_flight.popleft(), batch_size)
+
+        pruned = 0
+        if options['prune']:
+            pruned, _ = SnippetHighlight.objects.exclude(
+                pk__in=CodeSnippet.objects.filter(highlight__isnull=False).values('highlight_id')
+            ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {self.updated} snippets, rendered {self.rendered} highlights, pruned {pruned}.'
+        ))
+
+    def submit(self, executor, batch, style):
+        existing = set(SnippetHighlight.objects.filter(
+            pk__in={key for _, key, _, _ in batch}
+        ).values_list('pk', flat=True))
+        missing = {key: (code, language) for _, key, code, language in batch if key not in existing}
+        return batch, executor.submit(render_many, list(missing.values()), style)
+
+    def write(self, batch, future, batch_size):
+        highlights = [
+            SnippetHighlight(key=key, language=language, html=html)
+            for key, language, html in future.result()
+        ]
+        SnippetHighlight.objects.bulk_create(highlights, ignore_conflicts=True, batch_size=batch_size)
+        update_derived(
+            [CodeSnippet(pk=pk, highlight_id=key) for pk, key, _, _ in batch], ['highlight'],
+            batch_size=batch_size,
+        )
+        self.rendered += len(highlights)
+        self.updated += len(batch)
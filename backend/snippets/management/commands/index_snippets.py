@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from snippets.models import CodeSnippet, update_derived
+from snippets.similarity import index_snippets
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute MinHash signatures and LSH buckets for snippets that have none, '
+        'a batch at a time with NumPy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Snippets signed and written per transaction.')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-index every snippet, e.g. after changing the LSH parameters.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        snippets = CodeSnippet.objects.order_by('pk').only('id', 'user_id', 'code')
+        if not options['force']:
+            snippets = snippets.filter(minhash__isnull=True)
+        indexed = 0
+        last_pk = 0
+        while True:
+            # Keyset pages, since indexed snippets drop out of the filter
+            batch = list(snippets.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                index_snippets(batch)
+                update_derived(batch, ['minhash'], batch_size=batch_size)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} snippets.'))
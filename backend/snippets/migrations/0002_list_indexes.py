@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0008_list_indexes'),
+        ('snippets', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='codesnippet',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='snippet_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0002_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnippetHighlight',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('language', models.CharField(max_length=100)),
+                ('html', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='codesnippet',
+            name='highlight',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='snippets.snippethighlight'),
+        ),
+    ]
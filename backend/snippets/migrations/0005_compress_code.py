@@ -0,0 +1,19 @@
+from django.db import migrations
+
+import notes.compression
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0015_compress_content'),
+        ('snippets', '0004_snippet_minhash'),
+    ]
+
+    operations = [
+        notes.compression.CompressTextColumn(
+            model_name='codesnippet',
+            name='code',
+            field=notes.compression.CompressedTextField(),
+        ),
+    ]
@@ -1,16 +1,61 @@
 from django.db import models
 
 from django.conf import settings
+from notes.compression import CompressedTextField
 from notes.models import Tag
 
+class SnippetHighlight(models.Model):
+    """Pygments output, keyed by a hash of everything that determines it.
+
+    Snippets with identical code share one row.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    language = models.CharField(max_length=100)
+    html = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.language} {self.key[:12]}"
+
 class CodeSnippet(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='snippets')
     title = models.CharField(max_length=200)
-    code = models.TextField()
+    code = CompressedTextField()
     language = models.CharField(max_length=100, blank=True)
     tags = models.ManyToManyField(Tag, related_name='snippets', blank=True)
+    highlight = models.ForeignKey(SnippetHighlight, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name='+', editable=False)
+    # Packed MinHash signature of the code, see snippets.similarity
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='snippet_user_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
+
+def update_derived(snippets, fields, batch_size=None):
+    """Write ``fields`` computed from the snippets' code back in bulk.
+
+    bulk_update leaves updated_at alone, since the snippet itself didn't
+    change: sync clients and the recent lists don't see it as edited.
+    """
+    CodeSnippet.objects.bulk_update(snippets, fields, batch_size=batch_size)
+
+class SnippetBucket(models.Model):
+    """One LSH band of a snippet's MinHash signature.
+
+    Snippets of the same user that share a key are near-duplicate candidates.
+    """
+    snippet = models.ForeignKey(CodeSnippet, on_delete=models.CASCADE, related_name='buckets')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'key'], name='snippetbucket_user_key_idx'),
+        ]
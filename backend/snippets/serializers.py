@@ -1,8 +1,11 @@
 from rest_framework import serializers
+from metrics.middleware import TimedSerializerMixin
 from notes.models import Tag
+from notes.serializers import ExpandTagsMixin
+from .highlighting import render
 from .models import CodeSnippet
 
-class CodeSnippetSerializer(serializers.ModelSerializer):
+class CodeSnippetSerializer(TimedSerializerMixin, ExpandTagsMixin, serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     createdAt = serializers.DateTimeField(source='created_at', read_only=True)
@@ -11,3 +14,19 @@ class CodeSnippetSerializer(serializers.ModelSerializer):
     class Meta:
         model = CodeSnippet
         fields = ['id', 'user', 'title', 'code', 'language', 'tags', 'createdAt', 'updatedAt']
+
+    def render_html(self):
+        request = self.context.get('request')
+        return request is not None and request.query_params.get('render') == 'html'
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.render_html():
+            # Views select_related('highlight') for ?render=html
+            highlight = instance.highlight
+            if highlight is None:
+                # Saved before highlighting existed and not backfilled yet
+                _, data['detectedLanguage'], data['html'] = render(instance.code, instance.language)
+            else:
+                data['detectedLanguage'], data['html'] = highlight.language, highlight.html
+        return data
@@ -0,0 +1,71 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from notes.cache import invalidate_tags, invalidate_user
+from notes.replicas import pin
+from notes.tag_usage import adjust, m2m_changes, negate, usage_of
+from .highlighting import highlight_for, highlight_key
+from .models import CodeSnippet, SnippetBucket
+from .similarity import band_keys, signature
+
+@receiver(pre_save, sender=CodeSnippet)
+def highlight_snippet(sender, instance, raw=False, **kwargs):
+    # The key is the highlight's primary key, so unchanged code costs no query
+    if raw or instance.highlight_id == highlight_key(instance.code, instance.language):
+        return
+    instance.highlight = highlight_for(instance.code, instance.language)
+
+@receiver(pre_save, sender=CodeSnippet)
+def sign_snippet(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    minhash = signature(instance.code)
+    stored = instance.__dict__.get('minhash')
+    # Buckets are rewritten after the save, and only when the signature moved
+    instance.minhash_changed = instance._state.adding or (
+        minhash != (bytes(stored) if stored is not None else None)
+    )
+    instance.minhash = minhash
+
+@receiver(post_save, sender=CodeSnippet)
+def bucket_snippet(sender, instance, created, raw=False, **kwargs):
+    if raw or not getattr(instance, 'minhash_changed', False):
+        return
+    if not created:
+        SnippetBucket.objects.filter(snippet=instance).delete()
+    if instance.minhash is not None:
+        SnippetBucket.objects.bulk_create([
+            SnippetBucket(snippet=instance, user_id=instance.user_id, key=key)
+            for key in band_keys(instance.minhash)
+        ])
+
+@receiver(post_save, sender=CodeSnippet)
+@receiver(post_delete, sender=CodeSnippet)
+def invalidate_snippet_lists(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+@receiver(m2m_changed, sender=CodeSnippet.tags.through)
+def invalidate_snippet_tag_lists(sender, instance, reverse, **kwargs):
+    if reverse:
+        # Changed from the tag's side, which may touch any user's snippets
+        invalidate_tags()
+    else:
+        invalidate_user(instance.user_id)
+
+@receiver(post_save, sender=CodeSnippet)
+@receiver(post_delete, sender=CodeSnippet)
+def pin_snippet_owner(sender, instance, **kwargs):
+    pin(instance.user_id)
+
+@receiver(m2m_changed, sender=CodeSnippet.tags.through)
+def pin_retagged_snippet_owner(sender, instance, reverse, **kwargs):
+    if not reverse:
+        pin(instance.user_id)
+
+@receiver(m2m_changed, sender=CodeSnippet.tags.through)
+def count_snippet_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    adjust(m2m_changes(sender, instance, action, reverse, pk_set))
+
+@receiver(pre_delete, sender=CodeSnippet)
+def uncount_snippet_tags(sender, instance, **kwargs):
+    # The cascade removes the through rows without an m2m_changed signal
+    adjust(negate(usage_of(CodeSnippet.tags.through, codesnippet_id=instance.pk)))
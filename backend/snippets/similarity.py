@@ -0,0 +1,161 @@
+"""
+Near-duplicate detection for snippets with MinHash and LSH banding.
+
+A snippet's code is split into tokens, and every run of SHINGLE_SIZE tokens
+is hashed. The MinHash signature keeps, for each of NUM_PERM hash
+permutations, the smallest permuted shingle hash; the share of equal entries
+between two signatures estimates the Jaccard similarity of their shingle
+sets. Signatures are cut into BANDS bands of ROWS entries and each band is
+stored as a SnippetBucket key, so snippets sharing any band are found with
+an index lookup instead of a scan of the user's snippets. With 32 bands of
+4 rows, pairs above roughly 0.5 similarity are very likely to share one.
+
+Changing any of these constants changes every signature; run
+``manage.py index_snippets --force`` afterwards.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+MAX_HASH = np.uint64((1 << 32) - 1)
+# Permutations are multiply-shift hashes, (a * h + b) mod 2**64 >> 32, which
+# need no 64-bit division. Fixed seed: signatures must stay comparable.
+_generator = np.random.RandomState(1)
+PERM_A = _generator.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+PERM_B = _generator.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+SHIFT = np.uint64(32)
+
+# Most shingles hashed per NumPy pass; keeps the (shingles x NUM_PERM) matrix in cache
+CHUNK_SHINGLES = 512
+
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+
+def shingle_hashes(code):
+    """32-bit hashes of the distinct token shingles in ``code``."""
+    tokens = TOKEN.findall(code)
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {' '.join(tokens)} if tokens else set()
+    else:
+        shingles = {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+def signatures(codes):
+    """MinHash signatures for many snippets at once, as a ``(len(codes), NUM_PERM)`` array.
+
+    Rows for code without tokens are left at MAX_HASH; :func:`signature` and
+    :func:`index_snippets` store None for those snippets instead.
+    """
+    hashes = [shingle_hashes(code) for code in codes]
+    result = np.full((len(hashes), NUM_PERM), MAX_HASH, dtype=np.uint64)
+    group, size = [], 0
+    for index, values in enumerate(hashes):
+        if not len(values):
+            continue
+        if len(values) > CHUNK_SHINGLES:
+            # A long snippet on its own, folded into its row a chunk at a time
+            row = result[index]
+            for start in range(0, len(values), CHUNK_SHINGLES):
+                np.minimum(row, _permute(values[start:start + CHUNK_SHINGLES]).min(axis=0), out=row)
+            continue
+        if size + len(values) > CHUNK_SHINGLES:
+            _min_hash(hashes, group, result)
+            group, size = [], 0
+        group.append(index)
+        size += len(values)
+    if group:
+        _min_hash(hashes, group, result)
+    return result
+
+
+def _permute(values):
+    # Every shingle under every permutation in one pass; uint64 arithmetic wraps
+    permuted = np.outer(values, PERM_A)
+    permuted += PERM_B
+    permuted >>= SHIFT
+    return permuted
+
+
+def _min_hash(hashes, group, result):
+    values = np.concatenate([hashes[index] for index in group])
+    starts = np.cumsum([0] + [len(hashes[index]) for index in group[:-1]])
+    result[group] = np.minimum.reduceat(_permute(values), starts, axis=0)
+
+
+def signature(code):
+    """Stored form of ``code``'s signature, or None when it has no tokens."""
+    if not TOKEN.search(code):
+        return None
+    return pack(signatures([code])[0])
+
+
+def pack(row):
+    return row.astype('<u4').tobytes()
+
+
+def unpack(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
+
+
+def band_keys(data):
+    """One signed 64-bit bucket key per band of a packed signature."""
+    data = bytes(data)
+    size = ROWS * 4
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + data[band * size:(band + 1) * size],
+                                       digest_size=8).digest(), 'big', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def index_snippets(snippets):
+    """Set ``minhash`` on ``snippets`` and replace their buckets.
+
+    For bulk paths that skip the model signals; the caller saves ``minhash``.
+    """
+    from .models import SnippetBucket
+
+    rows = signatures([snippet.code for snippet in snippets])
+    buckets = []
+    for snippet, row in zip(snippets, rows):
+        snippet.minhash = pack(row) if TOKEN.search(snippet.code) else None
+        if snippet.minhash is not None:
+            buckets += [SnippetBucket(snippet_id=snippet.pk, user_id=snippet.user_id, key=key)
+                        for key in band_keys(snippet.minhash)]
+    SnippetBucket.objects.filter(snippet__in=[snippet.pk for snippet in snippets]).delete()
+    SnippetBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+def similar_snippets(snippet, threshold=None, limit=10):
+    """The owner's other snippets whose estimated similarity to ``snippet`` reaches ``threshold``.
+
+    Returns ``(similarity, snippet)`` pairs, most similar first.
+    """
+    from .models import CodeSnippet, SnippetBucket
+
+    if snippet.minhash is None:
+        return []
+    threshold = settings.SNIPPET_SIMILARITY_THRESHOLD if threshold is None else threshold
+    candidates = (
+        SnippetBucket.objects.filter(user_id=snippet.user_id, key__in=band_keys(snippet.minhash))
+        .exclude(snippet_id=snippet.pk)
+        .values('snippet_id')
+    )
+    own = unpack(snippet.minhash)
+    matches = []
+    for other in CodeSnippet.objects.filter(pk__in=candidates).only('id', 'title', 'language', 'minhash'):
+        similarity = float(np.mean(unpack(other.minhash) == own))
+        if similarity >= threshold:
+            matches.append((similarity, other))
+    matches.sort(key=lambda match: (-match[0], match[1].pk))
+    return matches[:limit]
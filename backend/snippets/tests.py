@@ -1,3 +1,143 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from notes.models import Tag
+from users.models import UserAccount
+from .models import CodeSnippet, SnippetBucket, SnippetHighlight
+from . import similarity
+from .similarity import PERM_A, PERM_B, SHIFT, pack, shingle_hashes, signature, signatures
+
+
+class SnippetListQueryTests(TestCase):
+    """The snippet list must cost the same number of queries whatever its size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.tags = [Tag.objects.create(name=f'tag-{i}') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_snippets(self, count):
+        for i in range(count):
+            snippet = CodeSnippet.objects.create(user=self.user, title=f'Snippet {i}', code='print(1)')
+            snippet.tags.set(self.tags)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_grow_with_rows(self):
+        for url in ['/api/snippets/', '/api/snippets/?expand=tags', '/api/snippets/?render=html']:
+            with self.subTest(url=url):
+                CodeSnippet.objects.all().delete()
+                self.add_snippets(1)
+                baseline = self.count_queries(url)
+                self.add_snippets(20)
+                self.assertEqual(self.count_queries(url), baseline)
+
+
+class SnippetHighlightTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+
+    def test_identical_code_shares_one_rendering(self):
+        first = CodeSnippet.objects.create(user=self.user, title='a', code='def f(x):\n    return x\n')
+        second = CodeSnippet.objects.create(user=self.user, title='b', code='def f(x):\n    return x\n')
+        self.assertEqual(first.highlight_id, second.highlight_id)
+        self.assertEqual(SnippetHighlight.objects.count(), 1)
+        self.assertEqual(first.highlight.language, 'python')
+
+    def test_unchanged_code_is_not_rendered_again(self):
+        snippet = CodeSnippet.objects.create(user=self.user, title='a', code='SELECT 1 FROM t', language='sql')
+        snippet.title = 'renamed'
+        with CaptureQueriesContext(connection) as queries:
+            snippet.save()
+        self.assertFalse(any('snippets_snippethighlight' in query['sql'] for query in queries))
+
+    def test_render_html_is_opt_in(self):
+        CodeSnippet.objects.create(user=self.user, title='a', code='x = 1', language='python')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertNotIn('html', client.get('/api/snippets/').data['results'][0])
+        data = client.get('/api/snippets/?render=html').data['results'][0]
+        self.assertIn('<div class="highlight"', data['html'])
+        self.assertEqual(data['detectedLanguage'], 'python')
+
+
+FETCH = """
+import requests
+
+def fetch(url, retries=3):
+    for attempt in range(retries):
+        response = requests.get(url, timeout=10)
+        if response.ok:
+            return response.json()
+    raise RuntimeError(f'giving up on {url}')
+"""
+
+
+class SnippetSimilarityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+        cls.original = CodeSnippet.objects.create(user=cls.user, title='fetch', code=FETCH)
+        CodeSnippet.objects.create(user=cls.user, title='unrelated', code='SELECT id, name FROM users WHERE active')
+        CodeSnippet.objects.create(user=cls.other, title='theirs', code=FETCH)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_creating_a_near_duplicate_warns_and_links_both(self):
+        response = self.client.post('/api/snippets/', {
+            'title': 'fetch again', 'code': FETCH.replace('retries=3', 'retries=5'), 'tags': [],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([match['id'] for match in response.data['likelyDuplicates']], [self.original.pk])
+
+        similar = self.client.get(f'/api/snippets/{self.original.pk}/similar/').json()
+        self.assertEqual([match['id'] for match in similar], [response.data['id']])
+        self.assertGreater(similar[0]['similarity'], 0.8)
+
+        response = self.client.post('/api/snippets/', {'title': 'new', 'code': 'fn main() {}', 'tags': []},
+                                    format='json')
+        self.assertNotIn('likelyDuplicates', response.data)
+
+    def test_batch_signatures_match_single_ones(self):
+        codes = [FETCH, 'x = 1', '', 'SELECT 1'] * 3
+        batch = signatures(codes)
+        for code, row in zip(codes, batch):
+            if code:
+                self.assertEqual(pack(row), signature(code))
+
+    def test_long_snippets_are_hashed_a_chunk_at_a_time(self):
+        long_code = '\n'.join(f'value_{i} = compute({i}, {i * 7})' for i in range(200))
+        codes = [FETCH, long_code, 'x = 1', long_code[:500]]
+        with mock.patch.object(similarity, 'CHUNK_SHINGLES', 64), \
+                mock.patch.object(similarity, '_permute', wraps=similarity._permute) as permute:
+            batch = signatures(codes)
+        self.assertLessEqual(max(len(call.args[0]) for call in permute.call_args_list), 64)
+        for code, row in zip(codes, batch):
+            expected = ((shingle_hashes(code)[:, None] * PERM_A + PERM_B) >> SHIFT).min(axis=0)
+            self.assertTrue((row == expected).all())
 
-# Create your tests here.
+    def test_index_command_fills_missing_signatures(self):
+        CodeSnippet.objects.update(minhash=None)
+        SnippetBucket.objects.all().delete()
+        call_command('index_snippets', batch_size=2, stdout=StringIO())
+        self.assertFalse(CodeSnippet.objects.filter(minhash__isnull=True).exists())
+        similar = self.client.get(f'/api/snippets/{self.original.pk}/similar/').json()
+        self.assertEqual(similar, [])
@@ -1,7 +1,11 @@
 from rest_framework.routers import DefaultRouter
-from .views import CodeSnippetViewSet
+from django.urls import path
+from .views import CodeSnippetViewSet, snippet_list, snippet_detail
 
 router = DefaultRouter()
 router.register(r'snippets', CodeSnippetViewSet, basename='codesnippet')
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path('async/snippets/', snippet_list, name='async-snippet-list'),
+    path('async/snippets/<int:pk>/', snippet_detail, name='async-snippet-detail'),
+]
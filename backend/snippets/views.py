@@ -1,13 +1,73 @@
+from django.conf import settings
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from notes.async_api import async_api_view, cached_list, list_data, render
+from notes.cache import CachedListMixin
+from notes.pagination import UpdatedAtCursorPagination
+from notes.replicas import ReplicaReadsMixin
 from .models import CodeSnippet
 from .serializers import CodeSnippetSerializer
+from .similarity import similar_snippets
 
-class CodeSnippetViewSet(viewsets.ModelViewSet):
+def filter_snippets(queryset, params):
+    if params.get('render') == 'html':
+        queryset = queryset.select_related('highlight')
+    tag = params.get('tag')
+    if tag and tag.isdigit():
+        queryset = queryset.filter(tags__id=tag)
+    return queryset
+
+
+class CodeSnippetViewSet(ReplicaReadsMixin, CachedListMixin, viewsets.ModelViewSet):
+    list_cache_name = 'snippets'
     serializer_class = CodeSnippetSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = UpdatedAtCursorPagination
 
     def get_queryset(self):
-        return CodeSnippet.objects.filter(user=self.request.user)
+        return filter_snippets(CodeSnippet.objects.filter(user=self.request.user).prefetch_related('tags'),
+                               self.request.query_params)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        snippet = serializer.save(user=self.request.user)
+        self.duplicates = similar_snippets(snippet, threshold=settings.SNIPPET_DUPLICATE_THRESHOLD, limit=3)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        # The snippet is saved anyway; the client decides whether to keep both
+        if self.duplicates:
+            response.data['likelyDuplicates'] = similar_data(self.duplicates)
+        return response
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """The user's snippets most like this one, with estimated similarity."""
+        return Response(similar_data(similar_snippets(self.get_object())))
+
+
+def similar_data(matches):
+    return [
+        {'id': snippet.pk, 'title': snippet.title, 'language': snippet.language,
+         'similarity': round(similarity, 3)}
+        for similarity, snippet in matches
+    ]
+
+
+@async_api_view
+async def snippet_list(request):
+    """Async ``GET /api/snippets/``, sharing its filters, paging and cache."""
+    queryset = filter_snippets(CodeSnippet.objects.filter(user=request.user).prefetch_related('tags'),
+                               request.query_params)
+    return await cached_list('snippets', request, lambda: list_data(
+        request, queryset, CodeSnippetSerializer, CodeSnippetViewSet.pagination_class))
+
+
+@async_api_view
+async def snippet_detail(request, pk):
+    try:
+        queryset = filter_snippets(CodeSnippet.objects.prefetch_related('tags'), request.query_params)
+        snippet = await queryset.aget(pk=pk, user=request.user)
+    except CodeSnippet.DoesNotExist:
+        return render({'detail': 'No CodeSnippet matches the given query.'}, status=404)
+    return render(CodeSnippetSerializer(snippet, context={'request': request}).data)
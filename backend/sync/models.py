@@ -0,0 +1,28 @@
+from django.db import models
+from django.conf import settings
+
+class Tombstone(models.Model):
+    KIND_CHOICES = [
+        ('note', 'Note'),
+        ('snippet', 'Code snippet'),
+        ('tag', 'Tag'),
+    ]
+
+    # Tags are shared, so their tombstones have no user. No database constraint:
+    # deleting a user cascades to their notes, whose tombstones are written
+    # while the user row is on its way out.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             db_constraint=False, related_name='+')
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            # For apply_retention's purge, which spans users and the user-less tag tombstones
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at {self.deleted_at}"
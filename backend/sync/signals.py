@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from notes.models import Note, Tag
+from notes.tag_usage import owner_field
+from snippets.models import CodeSnippet
+from .models import Tombstone
+
+@receiver(post_delete, sender=Note)
+def record_note_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(user_id=instance.user_id, kind='note', object_id=instance.pk)
+
+@receiver(post_delete, sender=CodeSnippet)
+def record_snippet_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(user_id=instance.user_id, kind='snippet', object_id=instance.pk)
+
+@receiver(post_delete, sender=Tag)
+def record_tag_deletion(sender, instance, **kwargs):
+    Tombstone.objects.create(kind='tag', object_id=instance.pk)
+
+@receiver(m2m_changed, sender=Note.tags.through)
+@receiver(m2m_changed, sender=CodeSnippet.tags.through)
+def touch_retagged(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tag links have no timestamp of their own; bumping the note or snippet is
+    # what lets ?since= pick the change up
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear') or (pk_set is not None and not pk_set):
+        return
+    model = sender._meta.get_field(owner_field(sender)).related_model
+    now = timezone.now()
+    if reverse:
+        if action == 'post_clear':
+            return
+        # Cleared from the tag's side: the links are still there before the clear
+        owners = model.objects.filter(pk__in=pk_set) if pk_set is not None else model.objects.filter(tags=instance)
+    else:
+        if action == 'pre_clear':
+            return
+        owners = model.objects.filter(pk=instance.pk)
+        instance.updated_at = now
+    owners.update(updated_at=now)
@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from notes.models import Note, Tag
+from notes.retention import purge_tombstones, tombstone_cutoff
+from snippets.models import CodeSnippet
+from users.models import UserAccount
+from .models import Tombstone
+
+
+@override_settings(SYNC_CURSOR_LAG_SECONDS=0)
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.work = Tag.objects.create(name='work')
+        self.note = Note.objects.create(user=self.user, title='Plan', content='text')
+        self.note.tags.add(self.work)
+        self.snippet = CodeSnippet.objects.create(user=self.user, title='Hello', code='print(1)', language='python')
+        theirs = Note.objects.create(user=self.other, title='Theirs', content='')
+        theirs.tags.add(Tag.objects.create(name='private'))
+
+    def sync(self, since=None):
+        response = self.client.get('/api/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, data, kind):
+        return sorted(row['id'] for row in data[kind])
+
+    def test_initial_sync_returns_only_the_users_data(self):
+        data = self.sync()
+        self.assertEqual(self.ids(data, 'notes'), [self.note.pk])
+        self.assertEqual(self.ids(data, 'snippets'), [self.snippet.pk])
+        self.assertEqual([tag['name'] for tag in data['tags']], ['work'])
+        self.assertEqual(data['deleted'], {'notes': [], 'snippets': [], 'tags': []})
+
+    def test_incremental_sync_returns_only_changes(self):
+        cursor = self.sync()['cursor']
+        data = self.sync(cursor)
+        self.assertEqual((data['notes'], data['snippets'], data['tags']), ([], [], []))
+
+        self.note.title = 'Renamed'
+        self.note.save()
+        added = Note.objects.create(user=self.user, title='New', content='')
+        Note.objects.create(user=self.other, title='Not mine', content='')
+        data = self.sync(cursor)
+        self.assertEqual(self.ids(data, 'notes'), sorted([self.note.pk, added.pk]))
+        self.assertEqual(data['snippets'], [])
+        self.assertEqual(self.sync(data['cursor'])['notes'], [])
+
+    def test_trashed_and_deleted_rows(self):
+        cursor = self.sync()['cursor']
+        self.note.deleted = True
+        self.note.save()
+        data = self.sync(cursor)
+        self.assertEqual([(row['id'], row['deleted']) for row in data['notes']], [(self.note.pk, True)])
+
+        cursor = data['cursor']
+        note_id, snippet_id = self.note.pk, self.snippet.pk
+        self.note.delete()
+        self.snippet.delete()
+        Note.objects.get(user=self.other).delete()
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted'], {'notes': [note_id], 'snippets': [snippet_id], 'tags': []})
+
+    def test_tag_changes_are_synced(self):
+        cursor = self.sync()['cursor']
+        home = Tag.objects.create(name='home')
+        self.note.tags.add(home)
+        self.snippet.tags.add(self.work)
+        data = self.sync(cursor)
+        self.assertEqual(data['notes'][0]['tags'], [self.work.pk, home.pk])
+        self.assertEqual(data['snippets'][0]['tags'], [self.work.pk])
+        # The client has never seen the new tag
+        self.assertEqual([tag['name'] for tag in data['tags']], ['work', 'home'])
+
+        cursor = data['cursor']
+        self.note.tags.remove(home)
+        data = self.sync(cursor)
+        self.assertEqual(data['notes'][0]['tags'], [self.work.pk])
+
+        cursor = data['cursor']
+        self.work.notes.clear()
+        data = self.sync(cursor)
+        self.assertEqual((self.ids(data, 'notes'), data['notes'][0]['tags']), ([self.note.pk], []))
+
+    def test_renamed_tags_are_synced(self):
+        cursor = self.sync()['cursor']
+        self.work.name = 'job'
+        self.work.save()
+        Tag.objects.filter(name='private').update(name='secret')
+        self.assertEqual([tag['name'] for tag in self.sync(cursor)['tags']], ['job'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/sync/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def walk(self, page):
+        """Follow ``next`` from ``page`` to the last page; return every page."""
+        pages = [page]
+        while pages[-1]['next']:
+            response = self.client.get(pages[-1]['next'])
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+        return pages
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_initial_sync_is_paged(self):
+        notes = [self.note] + [Note.objects.create(user=self.user, title=f'Note {i}', content='') for i in range(3)]
+        pages = self.walk(self.sync())
+        # Four notes, one snippet and one tag, two rows a page
+        self.assertEqual(len(pages), 3)
+        self.assertEqual([page['cursor'] is None for page in pages], [True, True, False])
+        self.assertEqual(sorted(row['id'] for page in pages for row in page['notes']),
+                         sorted(note.pk for note in notes))
+        self.assertEqual([row['id'] for page in pages for row in page['snippets']], [self.snippet.pk])
+        self.assertEqual([tag['name'] for page in pages for tag in page['tags']], ['work'])
+
+    @override_settings(SYNC_PAGE_SIZE=1)
+    def test_edits_made_while_paging_come_back_next_time(self):
+        first = self.sync()
+        self.assertEqual([row['id'] for row in first['notes']], [self.note.pk])
+        self.note.title = 'Edited meanwhile'
+        self.note.save()
+        cursor = self.walk(first)[-1]['cursor']
+        self.assertEqual([row['title'] for row in self.sync(cursor)['notes']], ['Edited meanwhile'])
+
+    def test_invalid_page(self):
+        self.assertEqual(self.client.get('/api/sync/', {'page': 'garbage'}).status_code, 400)
+
+    def test_expired_cursor_requires_a_full_sync(self):
+        since = (tombstone_cutoff() - timedelta(minutes=1)).isoformat().replace('+00:00', 'Z')
+        response = self.client.get('/api/sync/', {'since': since})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.data['resync'])
+
+    def test_tombstones_past_the_oldest_cursor_are_purged(self):
+        note_id, snippet_id = self.note.pk, self.snippet.pk
+        self.note.delete()
+        self.snippet.delete()
+        Tombstone.objects.filter(kind='note', object_id=note_id).update(
+            deleted_at=tombstone_cutoff() - timedelta(days=1))
+        self.assertEqual(purge_tombstones(tombstone_cutoff(), dry_run=True), 1)
+        self.assertEqual(purge_tombstones(tombstone_cutoff(), batch_size=1), 1)
+        self.assertEqual(list(Tombstone.objects.values_list('kind', 'object_id')), [('snippet', snippet_id)])
+        # The oldest cursor still accepted sees every deletion that is left
+        since = (tombstone_cutoff() + timedelta(minutes=1)).isoformat().replace('+00:00', 'Z')
+        self.assertEqual(self.sync(since)['deleted']['snippets'], [snippet_id])
@@ -0,0 +1,136 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from notes.models import Note, Tag
+from notes.retention import tombstone_cutoff
+from notes.serializers import NoteSerializer, TagSerializer
+from notes.transactions import AtomicWritesMixin
+from snippets.models import CodeSnippet
+from snippets.serializers import CodeSnippetSerializer
+from .models import Tombstone
+
+
+# Rows are paged kind by kind, in this order, by primary key
+KINDS = ('notes', 'snippets', 'tags')
+
+
+def format_cursor(moment):
+    # UTC with a Z suffix so the cursor needs no escaping in a query string
+    return moment.isoformat().replace('+00:00', 'Z')
+
+
+def encode_page(cursor, kind, after):
+    return base64.urlsafe_b64encode(f'{format_cursor(cursor)}|{kind}|{after}'.encode()).decode()
+
+
+def decode_page(token):
+    """Return ``(cursor, kind, after)`` from a ``page`` token, or None."""
+    try:
+        cursor, kind, after = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        cursor, after = parse_datetime(cursor), int(after)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if cursor is None or kind not in KINDS:
+        return None
+    return cursor, kind, after
+
+
+class SyncView(AtomicWritesMixin, APIView):
+    """Return what changed for the current user since ``?since=<cursor>``.
+
+    Without a cursor the full state is returned. Tags are the ones on the
+    user's notes and snippets; incrementally, those changed since the cursor
+    plus any on the returned rows. Retagging a note or snippet bumps its
+    ``updated_at``. Trashed notes come back as regular rows with ``deleted``
+    set; hard deletes come back as ids under ``deleted``. Clients should
+    treat every row as an upsert.
+
+    Responses hold at most SYNC_PAGE_SIZE rows. While ``next`` is set the
+    client follows it and ``cursor`` is null; the last page carries the
+    cursor for the next sync. It was fixed when the first page was served
+    and trails that time by SYNC_CURSOR_LAG_SECONDS, so rows written while
+    the pages were read, or by transactions still open then, come back next
+    time. Tombstones are kept for SYNC_TOMBSTONE_RETENTION_DAYS; an older
+    cursor gets 410 and the client must start over with a full sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = parse_datetime(since)
+            except ValueError:
+                since = None
+            if since is None:
+                return Response({'error': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+            if since < tombstone_cutoff():
+                return Response({'error': 'Cursor has expired; a full sync is required.', 'resync': True},
+                                status=status.HTTP_410_GONE)
+
+        token = request.query_params.get('page')
+        if token:
+            page = decode_page(token)
+            if page is None:
+                return Response({'error': 'Invalid page.'}, status=status.HTTP_400_BAD_REQUEST)
+            cursor, kind, after = page
+        else:
+            lag = timedelta(seconds=getattr(settings, 'SYNC_CURSOR_LAG_SECONDS', 5))
+            cursor, kind, after = timezone.now() - lag, KINDS[0], 0
+
+        querysets = {
+            'notes': Note.objects.filter(user=request.user).prefetch_related('tags'),
+            'snippets': CodeSnippet.objects.filter(user=request.user).prefetch_related('tags'),
+            # Tags are shared; TagUsage lists the ones this user's rows carry
+            'tags': Tag.objects.filter(usage__user=request.user),
+        }
+        if since:
+            querysets = {name: queryset.filter(updated_at__gt=since) for name, queryset in querysets.items()}
+
+        rows = {name: [] for name in KINDS}
+        budget = settings.SYNC_PAGE_SIZE
+        next_page = None
+        for name in KINDS[KINDS.index(kind):]:
+            start = after if name == kind else 0
+            rows[name] = list(querysets[name].filter(pk__gt=start).order_by('pk')[:budget + 1])
+            if len(rows[name]) > budget:
+                rows[name] = rows[name][:budget]
+                next_page = encode_page(cursor, name, rows[name][-1].pk if rows[name] else start)
+                break
+            budget -= len(rows[name])
+
+        tags = rows['tags']
+        if since:
+            # A row may have gained a tag the client has never seen
+            linked = {tag.pk for row in rows['notes'] + rows['snippets'] for tag in row.tags.all()}
+            linked -= {tag.pk for tag in tags}
+            if linked:
+                tags = sorted(tags + list(Tag.objects.filter(pk__in=linked)), key=lambda tag: tag.pk)
+
+        deleted = {'notes': [], 'snippets': [], 'tags': []}
+        if since and not token:
+            tombstones = Tombstone.objects.filter(
+                Q(user=request.user) | Q(user__isnull=True), deleted_at__gt=since
+            )
+            for name, object_id in tombstones.values_list('kind', 'object_id'):
+                deleted[f'{name}s'].append(object_id)
+
+        context = {'request': request}
+        return Response({
+            'cursor': None if next_page else format_cursor(cursor),
+            'next': replace_query_param(request.build_absolute_uri(), 'page', next_page) if next_page else None,
+            'notes': NoteSerializer(rows['notes'], many=True, context=context).data,
+            'snippets': CodeSnippetSerializer(rows['snippets'], many=True, context=context).data,
+            'tags': TagSerializer(tags, many=True).data,
+            'deleted': deleted,
+        })
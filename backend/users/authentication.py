@@ -1,22 +1,131 @@
+import time
+
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def user_generation_key(user_id):
+    return f'auth-user-gen:{user_id}'
+
+
+def cached_user_key(user_id, token_id, generation):
+    return f'auth-user:{user_id}:{generation}:{token_id}'
+
+
+def invalidate_cached_user(user_id):
+    """Drop every cached copy of a user, whichever token it was cached under."""
+    def bump():
+        try:
+            cache.incr(user_generation_key(user_id))
+        except ValueError:
+            cache.set(user_generation_key(user_id), time.time_ns(), timeout=None)
+
+    # Again on commit, in case a request re-cached the old row in between
+    bump()
+    transaction.on_commit(bump)
 
 
 class CustomJWTAuthentication(JWTAuthentication):
+    def get_validated_request_token(self, request):
+        header = self.get_header(request)
+
+        if header is None:
+            raw_token = request.COOKIES.get(settings.AUTH_COOKIE)
+        else:
+            raw_token = self.get_raw_token(header)
+
+        if raw_token is None:
+            return None
+
+        return self.get_validated_token(raw_token)
+
     def authenticate(self, request):
         try:
-            header = self.get_header(request)
+            validated_token = self.get_validated_request_token(request)
+            if validated_token is None:
+                return None
 
-            if header is None:
-                raw_token = request.COOKIES.get(settings.AUTH_COOKIE)
-            else:
-                raw_token = self.get_raw_token(header)
+            return self.get_user(validated_token), validated_token
+        except:
+            return None
 
-            if raw_token is None:
+    async def aauthenticate(self, request):
+        """Async counterpart of :meth:`authenticate` for plain async views."""
+        try:
+            # Token parsing and signature checks are CPU-only, so they run inline
+            validated_token = self.get_validated_request_token(request)
+            if validated_token is None:
                 return None
 
-            validated_token = self.get_validated_token(raw_token)
-
-            return self.get_user(validated_token), validated_token
+            return await self.aget_user(validated_token), validated_token
         except:
             return None
+
+    def cache_identity(self, validated_token):
+        """``(user id, token id)`` to cache the user under, or None when it isn't cached."""
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        token_id = validated_token.get(api_settings.JTI_CLAIM)
+        if not settings.AUTH_USER_CACHE_TTL or user_id is None or token_id is None:
+            return None
+        return user_id, token_id
+
+    def user_lookup(self, validated_token):
+        try:
+            return {api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    def check_user(self, user, validated_token):
+        """JWTAuthentication.get_user's checks, shared by the sync and async paths."""
+        if user is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
+
+    def get_user(self, validated_token):
+        # Cache the resolved user for AUTH_USER_CACHE_TTL seconds, keyed by
+        # user id, token and a generation that saving the user bumps.
+        identity = self.cache_identity(validated_token)
+        key = None
+        if identity is not None:
+            generation_key = user_generation_key(identity[0])
+            cache.add(generation_key, time.time_ns(), timeout=None)
+            key = cached_user_key(*identity, cache.get(generation_key))
+            user = cache.get(key)
+            if user is not None:
+                return user
+
+        users = self.user_model.objects.filter(**self.user_lookup(validated_token))
+        user = self.check_user(users.first(), validated_token)
+        if key is not None:
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user
+
+    async def aget_user(self, validated_token):
+        """Async :meth:`get_user`, sharing its cache entries."""
+        identity = self.cache_identity(validated_token)
+        key = None
+        if identity is not None:
+            generation_key = user_generation_key(identity[0])
+            await cache.aadd(generation_key, time.time_ns(), timeout=None)
+            key = cached_user_key(*identity, await cache.aget(generation_key))
+            user = await cache.aget(key)
+            if user is not None:
+                return user
+
+        users = self.user_model.objects.filter(**self.user_lookup(validated_token))
+        user = self.check_user(await users.afirst(), validated_token)
+        if key is not None:
+            await cache.aset(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user
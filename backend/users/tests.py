@@ -1,3 +1,79 @@
 from django.test import TestCase
 
 # Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import Client, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import CustomJWTAuthentication
+from .models import UserAccount
+
+
+# Lists read from a replica when DATABASE_REPLICAS is set, and a replica
+# can't see this test's uncommitted rows
+@override_settings(AUTH_USER_CACHE_TTL=60, REPLICA_DATABASES=[])
+class CachedUserTests(TestCase):
+    """A cached user must never outlive a change to the account."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserAccount.objects.create_user('owner@example.com', 'password')
+        self.authentication = CustomJWTAuthentication()
+        self.token = self.authentication.get_validated_token(str(AccessToken.for_user(self.user)))
+        self.paths = {
+            'sync': self.authentication.get_user,
+            'async': async_to_sync(self.authentication.aget_user),
+        }
+
+    def test_repeat_lookups_come_from_the_cache(self):
+        for name, get_user in self.paths.items():
+            with self.subTest(name):
+                cache.clear()
+                get_user(self.token)
+                with self.assertNumQueries(0):
+                    self.assertEqual(get_user(self.token), self.user)
+
+    def test_both_paths_share_entries(self):
+        self.paths['sync'](self.token)
+        with self.assertNumQueries(0):
+            self.paths['async'](self.token)
+
+    def test_deactivation_takes_effect_immediately(self):
+        for name, get_user in self.paths.items():
+            with self.subTest(name):
+                self.user.is_active = True
+                self.user.save()
+                get_user(self.token)
+                self.user.is_active = False
+                self.user.save()
+                with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+                    get_user(self.token)
+
+    def test_password_change_drops_the_cached_user(self):
+        for name, get_user in self.paths.items():
+            with self.subTest(name):
+                get_user(self.token)
+                self.user.set_password(f'changed-{name}')
+                self.user.save()
+                with self.assertNumQueries(1):
+                    self.assertEqual(get_user(self.token).password, self.user.password)
+
+    def test_deleted_user_is_rejected(self):
+        for get_user in self.paths.values():
+            get_user(self.token)
+        self.user.delete()
+        for name, get_user in self.paths.items():
+            with self.subTest(name), self.assertRaisesMessage(AuthenticationFailed, 'User not found'):
+                get_user(self.token)
+
+    def test_deactivated_user_gets_401(self):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        for url in ['/api/notes/', '/api/async/notes/']:
+            self.assertEqual(client.get(url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        for url in ['/api/notes/', '/api/async/notes/']:
+            with self.subTest(url):
+                self.assertEqual(client.get(url).status_code, 401)
@@ -0,0 +1,48 @@
+import resource
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.transfer import export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream a user's workspace to NDJSON and report throughput and peak memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        started = time.perf_counter()
+        lines = size = 0
+        try:
+            for line in export_lines(user, chunk_size=options['chunk_size']):
+                output.write(line)
+                lines += 1
+                size += len(line)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        report(self.stderr, 'Exported', lines, size, time.perf_counter() - started)
+
+
+def report(stream, verb, lines, size, elapsed):
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stream.write(
+        f'{verb} {lines} records ({size / 2**20:.1f} MiB) in {elapsed:.1f}s: '
+        f'{lines / max(elapsed, 1e-9):.0f} records/s, '
+        f'{size / 2**20 / max(elapsed, 1e-9):.1f} MiB/s, peak RSS {peak:.0f} MiB'
+    )
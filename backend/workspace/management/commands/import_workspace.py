@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from workspace.transfer import WorkspaceImporter, WorkspaceImportError
+from .export_workspace import report
+
+
+class Command(BaseCommand):
+    help = (
+        "Import an NDJSON workspace export into a user's account in batches, "
+        "reporting throughput and peak memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows inserted per batch; each batch commits on its own.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        importer = WorkspaceImporter(user, batch_size=options['batch_size'])
+        started = time.perf_counter()
+        size = 0
+        try:
+            with open(options['path'], 'rb') as source:
+                for line in source:
+                    size += len(line)
+                    importer.feed(line)
+            counts = importer.finish()
+        except WorkspaceImportError as exc:
+            raise CommandError(f'{exc}. Earlier batches were committed.')
+        report(self.stderr, 'Imported', importer.line_number, size, time.perf_counter() - started)
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{count} {kind}' for kind, count in sorted(counts.items())) or 'Nothing to import.'
+        ))
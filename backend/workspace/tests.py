@@ -0,0 +1,75 @@
+import json
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from notes.models import Note, Tag
+from notes.versioning import resolve_content
+from snippets.models import CodeSnippet
+from users.models import UserAccount
+
+
+def history(note):
+    # The export writes times to the millisecond
+    return [
+        (resolve_content(version), version.created_at.replace(microsecond=version.created_at.microsecond // 1000 * 1000))
+        for version in note.versions.order_by('-seq')
+    ]
+
+
+@override_settings(NOTE_VERSION_COALESCE_WINDOW=0, NOTE_VERSION_SNAPSHOT_INTERVAL=3)
+class WorkspaceTransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = UserAccount.objects.create_user('owner@example.com', 'password')
+        cls.other = UserAccount.objects.create_user('other@example.com', 'password')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def export(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/export/')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_(self, user, body):
+        self.client.force_authenticate(user)
+        return self.client.generic('POST', '/api/import/', body, content_type='application/x-ndjson')
+
+    def test_round_trip_keeps_content_history_and_tags(self):
+        work, home = Tag.objects.create(name='work'), Tag.objects.create(name='home')
+        note = Note.objects.create(user=self.owner, title='Plan', content='one\n')
+        for i in range(2, 9):
+            note.content += f'line {i}\n'
+            note.save()
+        note.tags.set([work, home])
+        Note.objects.create(user=self.owner, title='Old', content='gone', deleted=True)
+        snippet = CodeSnippet.objects.create(user=self.owner, title='Hello', code='print(1)', language='python')
+        snippet.tags.set([work])
+
+        response = self.import_(self.other, self.export(self.owner))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['imported'], {'notes': 2, 'versions': 7, 'snippets': 1})
+
+        copy = Note.objects.get(user=self.other, title='Plan')
+        self.assertEqual(copy.content, note.content)
+        self.assertEqual(copy.version_count, 7)
+        self.assertEqual(history(copy), history(note))
+        self.assertEqual(sorted(copy.tags.values_list('name', flat=True)), ['home', 'work'])
+        self.assertTrue(Note.objects.get(user=self.other, title='Old').deleted)
+        snippet_copy = CodeSnippet.objects.get(user=self.other)
+        self.assertEqual((snippet_copy.code, snippet_copy.language), ('print(1)', 'python'))
+        self.assertEqual(list(snippet_copy.tags.values_list('name', flat=True)), ['work'])
+
+    def test_overlong_tag_names_are_rejected(self):
+        lines = [
+            {'type': 'workspace', 'version': 1},
+            {'type': 'note', 'title': 'A', 'content': 'a', 'tags': ['x' * 51],
+             'created_at': '2024-01-01T00:00:00Z'},
+        ]
+        response = self.import_(self.other, '\n'.join(json.dumps(line) for line in lines))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('longer than 50 characters', response.data['error'])
+        self.assertFalse(Note.objects.filter(user=self.other).exists())
+        self.assertFalse(Tag.objects.exists())
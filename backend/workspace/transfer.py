@@ -0,0 +1,286 @@
+"""
+Export and import of a user's whole workspace as NDJSON.
+
+The export is one JSON record per line: a ``workspace`` header, the user's
+tags, every note followed by its versions (newest first, fully rebuilt), then
+every snippet. Both directions stream: the export reads with
+``.iterator(chunk_size=...)`` and the import buffers at most one batch of
+rows before bulk-inserting it, so memory stays flat however large the
+workspace is.
+
+The export reads from a single snapshot. Versions are rebuilt backwards
+from the note's content, so an autosave landing between reading a note and
+reading its versions would otherwise export a history that no longer
+leads to the exported content.
+"""
+import json
+from collections import Counter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from notes.cache import invalidate_user
+from notes.models import Note, NoteVersion, Tag
+from notes.replicas import pin
+from notes.tag_usage import adjust
+from notes.transactions import snapshot
+from notes.versioning import apply_delta, describe, encode
+from search.backends import index_entries, note_entry, snippet_entry
+from snippets.models import CodeSnippet
+from snippets.similarity import index_snippets
+
+FORMAT_VERSION = 1
+TAG_NAME_MAX_LENGTH = Tag._meta.get_field('name').max_length
+
+
+class WorkspaceImportError(ValueError):
+    pass
+
+
+def parse_timestamp(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise WorkspaceImportError(f'invalid timestamp {value!r}')
+    return parsed
+
+
+def check_tag_names(names):
+    for name in names:
+        if not isinstance(name, str) or not name:
+            raise WorkspaceImportError(f'invalid tag name {name!r}')
+        if len(name) > TAG_NAME_MAX_LENGTH:
+            raise WorkspaceImportError(f'tag name {name!r} is longer than {TAG_NAME_MAX_LENGTH} characters')
+    return names
+
+
+def dump(record):
+    return (json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n').encode()
+
+
+def export_lines(user, chunk_size=1000):
+    """Yield the user's workspace as NDJSON-encoded lines."""
+    with snapshot():
+        yield dump({
+            'type': 'workspace',
+            'version': FORMAT_VERSION,
+            'exported_at': timezone.now(),
+        })
+
+        tag_names = (
+            Tag.objects.filter(notes__user=user).values_list('name', flat=True)
+            .union(Tag.objects.filter(snippets__user=user).values_list('name', flat=True))
+        )
+        for name in tag_names:
+            yield dump({'type': 'tag', 'name': name})
+
+        # Walk notes and versions side by side, both ordered by note id, so each
+        # note's history can be rebuilt from its live content without a query per note.
+        notes = Note.objects.filter(user=user).order_by('pk').prefetch_related('tags')
+        versions = (
+            NoteVersion.objects.filter(note__user=user)
+            .order_by('note_id', '-seq')
+            .values_list('note_id', 'content', 'is_delta', 'created_at')
+            .iterator(chunk_size=chunk_size)
+        )
+        pending = next(versions, None)
+        for note in notes.iterator(chunk_size=chunk_size):
+            yield dump({
+                'type': 'note',
+                'id': note.pk,
+                'title': note.title,
+                'content': note.content,
+                'tags': [tag.name for tag in note.tags.all()],
+                'created_at': note.created_at,
+                'updated_at': note.updated_at,
+                'deleted': note.deleted,
+                'deleted_at': note.deleted_at,
+                'favorite': note.favorite,
+            })
+            content = note.content
+            while pending is not None and pending[0] <= note.pk:
+                note_id, stored, is_delta, created_at = pending
+                if note_id == note.pk:
+                    content = apply_delta(content, stored) if is_delta else stored
+                    yield dump({'type': 'version', 'note': note.pk, 'content': content, 'created_at': created_at})
+                pending = next(versions, None)
+
+        snippets = CodeSnippet.objects.filter(user=user).order_by('pk').prefetch_related('tags')
+        for snippet in snippets.iterator(chunk_size=chunk_size):
+            yield dump({
+                'type': 'snippet',
+                'id': snippet.pk,
+                'title': snippet.title,
+                'code': snippet.code,
+                'language': snippet.language,
+                'tags': [tag.name for tag in snippet.tags.all()],
+                'created_at': snippet.created_at,
+                'updated_at': snippet.updated_at,
+            })
+
+
+class WorkspaceImporter:
+    """Bulk-insert an export stream into ``user``'s workspace.
+
+    Feed it lines with :meth:`feed` and call :meth:`finish` at the end. Rows
+    are written in batches of ``batch_size``, each in its own transaction.
+    Creation times are kept; ``updated_at`` is the import time so syncing
+    clients pick the rows up.
+    """
+
+    def __init__(self, user, batch_size=1000):
+        self.user = user
+        self.batch_size = batch_size
+        self.tag_names = set()
+        self.tag_ids = {}
+        self.notes = []         # (Note, tag names, [(content, created_at)] newest first)
+        self.pending_versions = 0
+        self.snippets = []      # (CodeSnippet, tag names)
+        self.counts = Counter()
+        self.line_number = 0
+
+    def feed(self, line):
+        self.line_number += 1
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+            kind = record['type']
+            if kind == 'version':
+                if not self.notes:
+                    raise WorkspaceImportError('version record before any note')
+                self.notes[-1][2].append((record['content'], parse_timestamp(record['created_at'])))
+                self.pending_versions += 1
+                return
+            # Anything but a version closes the previous note, so a full batch can go out
+            if len(self.notes) >= self.batch_size or self.pending_versions >= self.batch_size:
+                self.flush_notes()
+            if kind == 'workspace':
+                if record.get('version') != FORMAT_VERSION:
+                    raise WorkspaceImportError(f"unsupported format version {record.get('version')!r}")
+            elif kind == 'tag':
+                self.tag_names.update(check_tag_names([record['name']]))
+            elif kind == 'note':
+                note = Note(
+                    user=self.user,
+                    title=record['title'],
+                    content=record['content'],
+                    deleted=record.get('deleted', False),
+                    favorite=record.get('favorite', False),
+                    created_at=parse_timestamp(record['created_at']),
+                )
+                if record.get('deleted_at'):
+                    note.deleted_at = parse_timestamp(record['deleted_at'])
+                # Older exports carry no trash time; count it from the import
+                note.stamp_deleted_at()
+                self.notes.append((note, check_tag_names(record.get('tags', [])), []))
+            elif kind == 'snippet':
+                self.flush_notes()
+                snippet = CodeSnippet(
+                    user=self.user,
+                    title=record['title'],
+                    code=record['code'],
+                    language=record.get('language', ''),
+                    created_at=parse_timestamp(record['created_at']),
+                )
+                self.snippets.append((snippet, check_tag_names(record.get('tags', []))))
+                if len(self.snippets) >= self.batch_size:
+                    self.flush_snippets()
+            else:
+                raise WorkspaceImportError(f'unknown record type {kind!r}')
+        except (KeyError, TypeError, ValueError) as exc:
+            message = exc.args[0] if isinstance(exc, WorkspaceImportError) else f'invalid record ({exc!r})'
+            raise WorkspaceImportError(f'Line {self.line_number}: {message}') from exc
+
+    def finish(self):
+        self.flush_notes()
+        self.flush_snippets()
+        self.resolve_tags(self.tag_names)
+        if self.counts:
+            invalidate_user(self.user.pk)
+            pin(self.user.pk)
+        return dict(self.counts)
+
+    def resolve_tags(self, names):
+        missing = {name for name in names if name not in self.tag_ids}
+        if not missing:
+            return
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        self.tag_ids.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+
+    def flush_notes(self):
+        if not self.notes:
+            return
+        self.resolve_tags(self.tag_names | {name for _, tags, _ in self.notes for name in tags})
+        notes = [note for note, _, _ in self.notes]
+        with transaction.atomic():
+            for note, _, versions in self.notes:
+                note.version_count = len(versions)
+            created_at = [note.created_at for note in notes]
+            Note.objects.bulk_create(notes, batch_size=self.batch_size)
+            # auto_now_add overwrote the exported creation times
+            for note, value in zip(notes, created_at):
+                note.created_at = value
+            Note.objects.bulk_update(notes, ['created_at'], batch_size=self.batch_size)
+
+            versions = []
+            for note, _, records in self.notes:
+                next_content = note.content
+                for seq, (old_content, created) in zip(range(len(records), 0, -1), records):
+                    content, is_delta = encode(seq, old_content, next_content)
+                    versions.append(NoteVersion(
+                        note=note, seq=seq, content=content, is_delta=is_delta, created_at=created,
+                        **describe(old_content),
+                    ))
+                    next_content = old_content
+            created_at = [version.created_at for version in versions]
+            NoteVersion.objects.bulk_create(versions, batch_size=self.batch_size)
+            for version, value in zip(versions, created_at):
+                version.created_at = value
+            NoteVersion.objects.bulk_update(versions, ['created_at'], batch_size=self.batch_size)
+
+            Through = Note.tags.through
+            rows = Through.objects.bulk_create([
+                Through(note_id=note.pk, tag_id=self.tag_ids[name])
+                for note, tags, _ in self.notes for name in set(tags)
+            ], batch_size=self.batch_size)
+            adjust(Counter((self.user.pk, row.tag_id) for row in rows))
+            index_entries([note_entry(note) for note in notes if not note.deleted])
+
+        self.counts['notes'] += len(notes)
+        self.counts['versions'] += len(versions)
+        self.notes = []
+        self.pending_versions = 0
+
+    def flush_snippets(self):
+        if not self.snippets:
+            return
+        self.resolve_tags(self.tag_names | {name for _, tags in self.snippets for name in tags})
+        snippets = [snippet for snippet, _ in self.snippets]
+        with transaction.atomic():
+            created_at = [snippet.created_at for snippet in snippets]
+            CodeSnippet.objects.bulk_create(snippets, batch_size=self.batch_size)
+            for snippet, value in zip(snippets, created_at):
+                snippet.created_at = value
+            index_snippets(snippets)
+            CodeSnippet.objects.bulk_update(snippets, ['created_at', 'minhash'], batch_size=self.batch_size)
+
+            Through = CodeSnippet.tags.through
+            rows = Through.objects.bulk_create([
+                Through(codesnippet_id=snippet.pk, tag_id=self.tag_ids[name])
+                for snippet, tags in self.snippets for name in set(tags)
+            ], batch_size=self.batch_size)
+            adjust(Counter((self.user.pk, row.tag_id) for row in rows))
+            index_entries([snippet_entry(snippet) for snippet in snippets])
+
+        self.counts['snippets'] += len(snippets)
+        self.snippets = []
+
+
+def import_lines(user, lines, batch_size=1000):
+    importer = WorkspaceImporter(user, batch_size=batch_size)
+    for line in lines:
+        importer.feed(line)
+    return importer.finish()
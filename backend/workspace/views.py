@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from notes.transactions import AtomicWritesMixin
+
+from .transfer import WorkspaceImportError, export_lines, import_lines
+
+
+class ExportView(AtomicWritesMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        response = StreamingHttpResponse(export_lines(request.user), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="workspace.ndjson"'
+        return response
+
+
+class ImportView(APIView):
+    """Import an NDJSON export sent as the raw request body.
+
+    The body is read line by line rather than parsed up front. Unlike the
+    import_workspace command, an API import is all-or-nothing.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        try:
+            with transaction.atomic():
+                counts = import_lines(request.user, request.stream or [])
+        except WorkspaceImportError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'imported': counts}, status=status.HTTP_201_CREATED)
@@ -1,9 +1,10 @@
 "use client"
 
-import React, { useEffect, useState } from "react";
+import React, { useState } from "react";
 import Link from "next/link";
 import { FaPlus, FaSearch } from "react-icons/fa";
 import { getErrorMessage } from "@/utils/getErrorMessage";
+import usePagedList from "@/hooks/use-paged-list";
 
 interface Note {
   id: number;
@@ -20,40 +21,15 @@ interface Note {
 const tags = ["React", "Python", "Regex", "All"];
 
 const Page = () => {
-  const [notes, setNotes] = useState<Note[]>([]);
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [noteToDelete, setNoteToDelete] = useState<Note | null>(null);
   const [deleting, setDeleting] = useState(false);
 
-  useEffect(() => {
-    const fetchNotes = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const res = await fetch("http://localhost:8000/api/notes/?deleted=false", {
-          credentials: "include",
-        });
-        if (!res.ok) throw new Error("Failed to fetch notes");
-        const data = await res.json();
-        // Sort: favorites first, then by updated_at desc
-        data.sort((a: Note, b: Note) => {
-          if (a.favorite && !b.favorite) return -1;
-          if (!a.favorite && b.favorite) return 1;
-          return new Date(b.updated_at).getTime() - new Date(a.updated_at).getTime();
-        });
-        setNotes(data);
-      } catch (err) {
-        setError(getErrorMessage(err));
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchNotes();
-  }, []);
-
-  const pinnedNotes = notes.filter(note => note.favorite);
-  const recentNotes = notes.slice(0, 3);
+  // Each section asks the server for just what it shows
+  const pinned = usePagedList<Note>(["http://localhost:8000/api/notes/?deleted=false&favorite=true"]);
+  const recent = usePagedList<Note>(["http://localhost:8000/api/notes/?deleted=false&page_size=3"]);
+  const pinnedNotes = pinned.items;
+  const recentNotes = recent.items;
 
   return (
     <div className="min-h-screen bg-background text-foreground">
@@ -80,10 +56,10 @@ const Page = () => {
         {/* Pinned Notes */}
         <section className="mb-8">
           <h2 className="text-lg font-semibold mb-2">Pinned Notes</h2>
-          {loading ? (
+          {pinned.loading ? (
             <div>Loading...</div>
-          ) : error ? (
-            <div className="text-red-500">{error}</div>
+          ) : pinned.error ? (
+            <div className="text-red-500">{pinned.error}</div>
           ) : pinnedNotes.length === 0 ? (
             <div className="text-muted-foreground">No pinned notes.</div>
           ) : (
@@ -96,6 +72,15 @@ const Page = () => {
               ))}
             </div>
           )}
+          {pinned.hasMore && (
+            <button
+              className="mt-4 px-3 py-1 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 hover:bg-zinc-300 dark:hover:bg-zinc-600 disabled:opacity-60 border border-zinc-300 dark:border-zinc-600 shadow"
+              onClick={pinned.loadMore}
+              disabled={pinned.loadingMore}
+            >
+              {pinned.loadingMore ? "Loading..." : "Load more"}
+            </button>
+          )}
         </section>
 
         {/* Tags */}
@@ -112,10 +97,10 @@ const Page = () => {
         {/* Recent Notes */}
         <section>
           <h2 className="text-lg font-semibold mb-2">Recent Notes</h2>
-          {loading ? (
+          {recent.loading ? (
             <div>Loading...</div>
-          ) : error ? (
-            <div className="text-red-500">{error}</div>
+          ) : recent.error ? (
+            <div className="text-red-500">{recent.error}</div>
           ) : recentNotes.length === 0 ? (
             <div className="text-muted-foreground">No recent notes.</div>
           ) : (
@@ -169,17 +154,7 @@ const Page = () => {
                       body: JSON.stringify({ deleted: true }),
                     });
                     // Refresh notes
-                    const res = await fetch("http://localhost:8000/api/notes/?deleted=false", {
-                      credentials: "include",
-                    });
-                    if (!res.ok) throw new Error("Failed to fetch notes");
-                    const data = await res.json();
-                    data.sort((a: Note, b: Note) => {
-                      if (a.favorite && !b.favorite) return -1;
-                      if (!a.favorite && b.favorite) return 1;
-                      return new Date(b.updated_at).getTime() - new Date(a.updated_at).getTime();
-                    });
-                    setNotes(data);
+                    await Promise.all([pinned.reload(), recent.reload()]);
                     setNoteToDelete(null);
                   } catch (err) {
                     setError(getErrorMessage(err));
@@ -6,11 +6,16 @@ import StarterKit from "@tiptap/starter-kit";
 import Underline from "@tiptap/extension-underline";
 import Image from "@tiptap/extension-image";
 import ResizeImage from "tiptap-extension-resize-image";
+import { fetchPage } from "@/utils/fetchPage";
 
-type NoteVersion = {
+type NoteVersionSummary = {
   id: number;
-  content: string;
   created_at: string;
+  size: number;
+};
+
+type NoteVersion = NoteVersionSummary & {
+  content: string;
 };
 
 interface Note {
@@ -35,20 +40,34 @@ export default function NoteDetailPage() {
   const lastAutoSavedContent = useRef<string>("");
 
   const [showHistory, setShowHistory] = useState(false);
-  const [historyVersions, setHistoryVersions] = useState<NoteVersion[]>([]);
+  const [historyVersions, setHistoryVersions] = useState<NoteVersionSummary[]>([]);
+  const [historyNext, setHistoryNext] = useState<string | null>(null);
   const [viewingVersion, setViewingVersion] = useState<NoteVersion | null>(null);
 
+  // Newest versions first; older ones are fetched on demand
+  const loadHistory = (url: string, previous: NoteVersionSummary[]) =>
+    fetchPage<NoteVersionSummary>(url, { credentials: 'include' })
+      .then(page => {
+        setHistoryVersions([...previous, ...page.results]);
+        setHistoryNext(page.next);
+      })
+      .catch(() => {
+        setHistoryVersions(previous);
+        setHistoryNext(null);
+      });
+
   useEffect(() => {
     if (showHistory && note?.id) {
-      fetch(`http://localhost:8000/api/notes/${note.id}/versions/`, {
-        credentials: 'include',
-      })
-        .then(res => res.json())
-        .then(data => setHistoryVersions(data))
-        .catch(() => setHistoryVersions([]));
+      loadHistory(`http://localhost:8000/api/notes/${note.id}/versions/`, []);
     }
   }, [showHistory, note?.id]);
 
+  // The history list only carries metadata; content is fetched per version
+  const fetchVersion = (versionId: number): Promise<NoteVersion> =>
+    fetch(`http://localhost:8000/api/notes/${note?.id}/versions/${versionId}/`, {
+      credentials: 'include',
+    }).then(res => res.json());
+
   const [attachments, setAttachments] = useState([
     // Example mock attachments
     { id: 1, name: 'image1.png', url: '#', type: 'image/png' },
@@ -316,12 +335,15 @@ export default function NoteDetailPage() {
                 <li key={v.id} className="flex items-center justify-between bg-zinc-50 dark:bg-zinc-800 px-3 py-2 rounded">
                   <span className="text-sm">{new Date(v.created_at).toLocaleString()}</span>
                   <div className="flex gap-2">
-                    <button className="px-2 py-1 rounded bg-blue-200 dark:bg-blue-700 text-blue-900 dark:text-blue-100 text-xs" onClick={() => setViewingVersion(v)}>View</button>
-                    <button className="px-2 py-1 rounded bg-green-200 dark:bg-green-700 text-green-900 dark:text-green-100 text-xs" onClick={() => { editor?.commands.setContent(v.content); setShowHistory(false); }}>Restore</button>
+                    <button className="px-2 py-1 rounded bg-blue-200 dark:bg-blue-700 text-blue-900 dark:text-blue-100 text-xs" onClick={() => fetchVersion(v.id).then(setViewingVersion)}>View</button>
+                    <button className="px-2 py-1 rounded bg-green-200 dark:bg-green-700 text-green-900 dark:text-green-100 text-xs" onClick={() => fetchVersion(v.id).then(full => { editor?.commands.setContent(full.content); setShowHistory(false); })}>Restore</button>
                   </div>
                 </li>
               ))}
             </ul>
+            {historyNext && (
+              <button className="mt-4 px-3 py-1 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 text-xs" onClick={() => loadHistory(historyNext, historyVersions)}>Load older versions</button>
+            )}
           </div>
         </div>
       )}
@@ -11,6 +11,7 @@ interface Tag {
 import { Dialog,  DialogContent, DialogTitle, DialogTrigger } from "@/components/ui/dialog";
 import { NoteForm } from "@/components/notes/NoteForm";
 import { getErrorMessage } from "@/utils/getErrorMessage";
+import usePagedList from "@/hooks/use-paged-list";
 
 interface Note {
   id: number;
@@ -59,11 +60,6 @@ export default function NotesPage() {
   const [search, setSearch] = useState("");
   const [filterTag, setFilterTag] = useState<number | null>(null);
   const [filterDate, setFilterDate] = useState<string>("");
-  // Pagination state
-  const [currentPage, setCurrentPage] = useState(1);
-  const notesPerPage = 12;
-  const [notes, setNotes] = useState<Note[]>([]);
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [creating, setCreating] = useState(false);
   const [open, setOpen] = useState(false);
@@ -74,31 +70,22 @@ export default function NotesPage() {
   // Tag state
   const [allTags, setAllTags] = useState<Tag[]>([]);
 
-  const fetchNotes = async () => {
-    setLoading(true);
-    setError(null);
-    try {
-      const res = await fetch("http://localhost:8000/api/notes/?deleted=false", {
-        credentials: "include",
-      });
-      if (!res.ok) throw new Error("Failed to fetch notes");
-      const data = await res.json();
-      // Sort: favorites first, then by updated_at desc
-      data.sort((a: Note, b: Note) => {
-        if (a.favorite && !b.favorite) return -1;
-        if (!a.favorite && b.favorite) return 1;
-        return new Date(b.updated_at).getTime() - new Date(a.updated_at).getTime();
-      });
-      setNotes(data);
-    } catch (err: unknown) {
-      setError(getErrorMessage(err));
-    } finally {
-      setLoading(false);
-    }
-  };
+  // Favorites first, then the rest; each is newest first on the server
+  const tagParam = filterTag ? `&tag=${filterTag}` : "";
+  const {
+    items: notes,
+    loading,
+    loadingMore,
+    error: loadError,
+    hasMore,
+    loadMore,
+    reload: fetchNotes,
+  } = usePagedList<Note>([
+    `http://localhost:8000/api/notes/?deleted=false&favorite=true${tagParam}`,
+    `http://localhost:8000/api/notes/?deleted=false&favorite=false${tagParam}`,
+  ]);
 
   useEffect(() => {
-    fetchNotes();
     // Fetch tags
     const fetchTags = async () => {
 
@@ -158,11 +145,9 @@ export default function NotesPage() {
       note.title.toLowerCase().includes(search.toLowerCase()) ||
       note.content.toLowerCase().includes(search.toLowerCase()) ||
       (note.tags && allTags.filter(t => note.tags.includes(t.id)).some(t => t.name.toLowerCase().includes(search.toLowerCase())));
-    // Filter by tag
-    const matchesTag = !filterTag || note.tags.includes(filterTag);
     // Filter by date
     const matchesDate = !filterDate || note.created_at.slice(0, 10) === filterDate;
-    return matchesSearch && matchesTag && matchesDate;
+    return matchesSearch && matchesDate;
   });
 
   return (
@@ -278,8 +263,8 @@ export default function NotesPage() {
         <div className="w-full">
           {loading ? (
             <div>Loading notes...</div>
-          ) : error ? (
-            <div className="text-red-600">{error}</div>
+          ) : loadError ? (
+            <div className="text-red-600">{loadError}</div>
           ) : notes.length === 0 ? (
             <div className="text-muted-foreground text-sm">No notes yet. Create your first note above!</div>
           ) : (
@@ -287,7 +272,7 @@ export default function NotesPage() {
               <ul
                 className="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6 w-full px-2 md:px-6 lg:px-8"
               >
-                {filteredNotes.slice((currentPage - 1) * notesPerPage, currentPage * notesPerPage).map((note) => (
+                {filteredNotes.map((note) => (
                     <li key={note.id}>
                       <Link href={`/notes/${note.id}`}>
                         <div
@@ -364,22 +349,14 @@ export default function NotesPage() {
                     </li>
                   ))}
               </ul>
-              {Math.ceil(filteredNotes.length / notesPerPage) > 1 && (
-                <div className="flex justify-between mt-12 mb-4">
-                  <button
-                    className="px-3 py-1 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 hover:bg-zinc-300 dark:hover:bg-zinc-600 disabled:opacity-60 border border-zinc-300 dark:border-zinc-600 shadow"
-                    onClick={() => setCurrentPage((p) => Math.max(1, p - 1))}
-                    disabled={currentPage === 1}
-                  >
-                    Prev
-                  </button>
-                  <span className="px-2 py-1 text-sm">Page {currentPage} of {Math.ceil(filteredNotes.length / notesPerPage)}</span>
+              {hasMore && (
+                <div className="flex justify-center mt-12 mb-4">
                   <button
                     className="px-3 py-1 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 hover:bg-zinc-300 dark:hover:bg-zinc-600 disabled:opacity-60 border border-zinc-300 dark:border-zinc-600 shadow"
-                    onClick={() => setCurrentPage((p) => Math.min(Math.ceil(notes.length / notesPerPage), p + 1))}
-                    disabled={currentPage === Math.ceil(notes.length / notesPerPage)}
+                    onClick={loadMore}
+                    disabled={loadingMore}
                   >
-                    Next
+                    {loadingMore ? "Loading..." : "Load more"}
                   </button>
                 </div>
               )}
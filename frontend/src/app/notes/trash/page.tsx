@@ -1,8 +1,9 @@
 "use client";
 
-import React, { useEffect, useState } from "react";
+import React, { useState } from "react";
 import { Dialog, DialogContent, DialogTitle } from "@/components/ui/dialog";
 import { getErrorMessage } from "@/utils/getErrorMessage";
+import usePagedList from "@/hooks/use-paged-list";
 import { Toast } from "@/components/ui/Toast";
 import { EmptyState } from "@/components/ui/EmptyState";
 
@@ -17,8 +18,6 @@ interface Note {
 
 export default function TrashPage() {
   // State
-  const [notes, setNotes] = useState<Note[]>([]);
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [noteToRestore, setNoteToRestore] = useState<Note | null>(null);
   const [noteToDelete, setNoteToDelete] = useState<Note | null>(null);
@@ -26,26 +25,16 @@ export default function TrashPage() {
   // Toast state
   const [toast, setToast] = useState<{ message: string; type?: "success" | "error" | "info" } | null>(null);
 
-  // Fetch trashed notes
-  const fetchTrashedNotes = async () => {
-    setLoading(true);
-    setError(null);
-    try {
-      const res = await fetch("http://localhost:8000/api/notes/?deleted=true", { credentials: "include" });
-      if (!res.ok) throw new Error("Failed to fetch trashed notes");
-      const data = await res.json();
-      setNotes(data);
-    } catch (err: unknown) {
-      setError(getErrorMessage(err));
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  useEffect(() => {
-    fetchTrashedNotes();
-  }, []);
-
+  // Trashed notes, a page at a time
+  const {
+    items: notes,
+    loading,
+    loadingMore,
+    error: loadError,
+    hasMore,
+    loadMore,
+    reload: fetchTrashedNotes,
+  } = usePagedList<Note>(["http://localhost:8000/api/notes/?deleted=true"]);
 
   // Permanently delete note
   const handleDeleteForever = async (note: Note) => {
@@ -105,6 +94,8 @@ export default function TrashPage() {
       <div className="bg-card rounded-lg shadow p-6 flex flex-col gap-2">
         {loading ? (
           <div>Loading trashed notes...</div>
+        ) : loadError ? (
+          <div className="text-red-600">{loadError}</div>
         ) : notes.length === 0 ? (
           <EmptyState
             title="No notes in Trash"
@@ -162,6 +153,15 @@ export default function TrashPage() {
             ))}
           </ul>
         )}
+        {hasMore && (
+          <button
+            className="self-center mt-4 px-3 py-1 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 hover:bg-zinc-300 dark:hover:bg-zinc-600 disabled:opacity-60 border border-zinc-300 dark:border-zinc-600 shadow"
+            onClick={loadMore}
+            disabled={loadingMore}
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        )}
       </div>
       {/* Restore Dialog */}
       <Dialog open={!!noteToRestore} onOpenChange={(v) => { if (!v) setNoteToRestore(null); }}>
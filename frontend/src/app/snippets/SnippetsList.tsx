@@ -28,6 +28,9 @@ interface SnippetsListProps {
   onSelect: (id: number) => void;
   onNew: () => void;
   onToggleMenu: () => void;
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 export default function SnippetsList({
@@ -36,6 +39,9 @@ export default function SnippetsList({
   onSelect,
   onNew,
   onToggleMenu,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
 }: SnippetsListProps) {
   return (
     <aside className="w-72 bg-zinc-50 dark:bg-zinc-900 border-r border-zinc-200 dark:border-zinc-800 h-full flex flex-col">
@@ -97,6 +103,15 @@ export default function SnippetsList({
             ))}
           </ul>
         )}
+        {hasMore && onLoadMore && (
+          <button
+            className="w-full px-3 py-2 rounded bg-zinc-200 dark:bg-zinc-700 text-zinc-900 dark:text-zinc-100 hover:bg-zinc-300 dark:hover:bg-zinc-600 disabled:opacity-60 text-sm"
+            onClick={onLoadMore}
+            disabled={loadingMore}
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        )}
       </div>
     </aside>
   );
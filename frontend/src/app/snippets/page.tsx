@@ -7,7 +7,7 @@ import SnippetsList from "./SnippetsList";
 import SnippetEditor from "./SnippetEditor";
 import { PanelLeftOpen } from "lucide-react";
 import { Accordion, AccordionItem, AccordionTrigger, AccordionContent } from "@/components/ui/accordion";
-import { useGetSnippetsQuery, useCreateSnippetMutation, useUpdateSnippetMutation, useDeleteSnippetMutation } from "@/redux/services/snippetsApiSlice";
+import { useGetSnippetsInfiniteQuery, useCreateSnippetMutation, useUpdateSnippetMutation, useDeleteSnippetMutation } from "@/redux/services/snippetsApiSlice";
 
 export default function SnippetsPage() {
   const [selectedId, setSelectedId] = useState<number | null>(null);
@@ -17,7 +17,8 @@ export default function SnippetsPage() {
   const panelRef = useRef<HTMLDivElement>(null);
   const [showCreateModal, setShowCreateModal] = useState(false);
 
-  const { data: rawSnippets = [], isLoading, isError, refetch } = useGetSnippetsQuery();
+  const { data, isLoading, isError, refetch, hasNextPage, fetchNextPage, isFetchingNextPage } = useGetSnippetsInfiniteQuery();
+  const rawSnippets = React.useMemo(() => data?.pages.flatMap(page => page.results) ?? [], [data]);
   const [createSnippet] = useCreateSnippetMutation();
   const [updateSnippet] = useUpdateSnippetMutation();
   const [deleteSnippet] = useDeleteSnippetMutation();
@@ -87,6 +88,9 @@ export default function SnippetsPage() {
             onSelect={handleSelect}
             onNew={handleNew}
             onToggleMenu={() => setShowMenu(false)}
+            hasMore={hasNextPage}
+            loadingMore={isFetchingNextPage}
+            onLoadMore={() => fetchNextPage()}
           />
           {isLoading && <div className="p-4 text-zinc-500">Loading snippets...</div>}
           {isError && <div className="p-4 text-red-500">Failed to load snippets.</div>}
@@ -0,0 +1,62 @@
+import { useCallback, useEffect, useRef, useState } from "react";
+import { fetchPage } from "@/utils/fetchPage";
+import { getErrorMessage } from "@/utils/getErrorMessage";
+
+// Loads a cursor-paginated list one page at a time. `urls` are read in order,
+// so a list split server-side (e.g. favorites, then the rest) keeps that order.
+export default function usePagedList<T>(urls: string[]) {
+  const key = urls.join(" ");
+  const [items, setItems] = useState<T[]>([]);
+  const [pending, setPending] = useState<string[]>([]);
+  const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [error, setError] = useState<string | null>(null);
+  // Bumped on reload so a page still in flight from before is dropped
+  const generation = useRef(0);
+
+  const load = useCallback(async (queue: string[], previous: T[], current: number) => {
+    let results = previous;
+    // Skip past empty sources so the first render isn't an empty list
+    do {
+      const [url, ...rest] = queue;
+      const page = await fetchPage<T>(url, { credentials: "include" });
+      if (current !== generation.current) return;
+      results = [...results, ...page.results];
+      queue = page.next ? [page.next, ...rest] : rest;
+    } while (results.length === previous.length && queue.length > 0);
+    setItems(results);
+    setPending(queue);
+  }, []);
+
+  const reload = useCallback(async () => {
+    const current = ++generation.current;
+    setLoading(true);
+    setError(null);
+    try {
+      await load(key.split(" "), [], current);
+    } catch (err: unknown) {
+      if (current === generation.current) setError(getErrorMessage(err));
+    } finally {
+      if (current === generation.current) setLoading(false);
+    }
+  }, [key, load]);
+
+  const loadMore = useCallback(async () => {
+    if (pending.length === 0) return;
+    const current = generation.current;
+    setLoadingMore(true);
+    try {
+      await load(pending, items, current);
+    } catch (err: unknown) {
+      if (current === generation.current) setError(getErrorMessage(err));
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [pending, items, load]);
+
+  useEffect(() => {
+    reload();
+  }, [reload]);
+
+  return { items, loading, loadingMore, error, hasMore: pending.length > 0, loadMore, reload };
+}
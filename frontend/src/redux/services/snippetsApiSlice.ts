@@ -1,10 +1,16 @@
 import { apiSlice } from "./apiSlice";
 import type { Snippet } from "@/app/snippets/SnippetsList";
+import type { Page } from "@/utils/fetchPage";
 
 export const snippetsApiSlice = apiSlice.injectEndpoints({
   endpoints: (builder) => ({
-    getSnippets: builder.query<Snippet[], void>({
-      query: () => "/snippets/",
+    getSnippets: builder.infiniteQuery<Page<Snippet>, void, string | null>({
+      // The list is cursor-paginated: each page's `next` link is the next page param
+      infiniteQueryOptions: {
+        initialPageParam: null,
+        getNextPageParam: (lastPage) => lastPage.next,
+      },
+      query: ({ pageParam }) => pageParam ?? "/snippets/",
       providesTags: ["Snippets"],
     }),
     createSnippet: builder.mutation<Snippet, Partial<Snippet>>({
@@ -33,4 +39,4 @@ export const snippetsApiSlice = apiSlice.injectEndpoints({
   }),
 });
 
-export const { useGetSnippetsQuery, useCreateSnippetMutation, useUpdateSnippetMutation, useDeleteSnippetMutation } = snippetsApiSlice;
+export const { useGetSnippetsInfiniteQuery, useCreateSnippetMutation, useUpdateSnippetMutation, useDeleteSnippetMutation } = snippetsApiSlice;
@@ -0,0 +1,12 @@
+// List endpoints are cursor-paginated: one page of results plus the `next` link.
+export interface Page<T> {
+  results: T[];
+  next: string | null;
+  previous: string | null;
+}
+
+export async function fetchPage<T>(url: string, init?: RequestInit): Promise<Page<T>> {
+  const res = await fetch(url, init);
+  if (!res.ok) throw new Error(`Request failed with status ${res.status}`);
+  return res.json();
+}